@@ -0,0 +1,17 @@
+-- Turn the analytics table into a daily per-user rollup maintained by analytics_rollup.py
+-- After applying, build rollups for existing data with:
+--   python analytics_rollup.py backfill
+
+ALTER TABLE analytics ADD COLUMN jobs_created INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE analytics ADD COLUMN jobs_completed INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE analytics ADD COLUMN jobs_failed INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE analytics ADD COLUMN jobs_cancelled INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE analytics ADD COLUMN jobs_timed INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE analytics ADD COLUMN job_duration_seconds FLOAT NOT NULL DEFAULT 0;
+ALTER TABLE analytics ADD COLUMN lead_scores INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE analytics ADD COLUMN lead_score_total FLOAT NOT NULL DEFAULT 0;
+
+-- One row per user and day: the upsert target. Existing rows were never written by the
+-- application; the backfill rebuilds the table.
+DELETE FROM analytics;
+CREATE UNIQUE INDEX uq_analytics_user_date ON analytics (user_id, date);
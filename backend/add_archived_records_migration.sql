@@ -0,0 +1,13 @@
+-- Hot/cold archive (archive.py): aged rows moved out of the primary tables, stored compressed
+CREATE TABLE archived_records (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    source_table VARCHAR(100) NOT NULL,
+    source_id INTEGER NOT NULL,
+    user_id INTEGER NULL,
+    record_created_at DATETIME NULL,
+    payload LONGBLOB NOT NULL,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX ix_archived_records_lookup ON archived_records (source_table, user_id, record_created_at);
+-- Each source row is archived once, even when several app workers run the archiver
+CREATE UNIQUE INDEX uq_archived_records_source ON archived_records (source_table, source_id);
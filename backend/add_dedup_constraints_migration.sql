@@ -0,0 +1,40 @@
+-- Add natural-key unique indexes used for ON CONFLICT lead deduplication (MySQL 8.0.13+)
+-- Existing duplicates are removed first, keeping the oldest row per key.
+-- New PostgreSQL / SQLite databases get the indexes from the models (Base.metadata.create_all);
+-- existing ones need the same cleanup and `CREATE UNIQUE INDEX uq_leads_user_email ON leads (user_id, LOWER(email))`.
+
+-- Social media leads: one row per (user_id, profile_url)
+DELETE FROM social_media_leads WHERE profile_url IS NOT NULL AND id NOT IN (
+    SELECT id FROM (
+        SELECT MIN(id) AS id FROM social_media_leads WHERE profile_url IS NOT NULL GROUP BY user_id, profile_url
+    ) AS keep
+);
+CREATE UNIQUE INDEX uq_social_media_leads_user_profile ON social_media_leads (user_id, profile_url);
+
+-- Leads: one row per (user_id, lower(email))
+-- Map every duplicate lead to the lead that is kept (a plain table: MySQL can't reopen a temporary one in a join)
+CREATE TABLE lead_dedup AS
+SELECT l.id AS dup_id, k.keep_id
+FROM leads l
+JOIN (
+    SELECT user_id, LOWER(email) AS email_key, MIN(id) AS keep_id
+    FROM leads WHERE email IS NOT NULL GROUP BY user_id, LOWER(email)
+) AS k ON l.user_id = k.user_id AND LOWER(l.email) = k.email_key
+WHERE l.id <> k.keep_id;
+
+-- lead_scores.lead_id is unique: drop a duplicate's score if the kept lead has one,
+-- or if an older duplicate of the same lead has one, then move the rest to the kept lead
+DELETE s FROM lead_scores s
+JOIN lead_dedup d ON s.lead_id = d.dup_id
+JOIN lead_scores kept ON kept.lead_id = d.keep_id;
+DELETE s FROM lead_scores s
+JOIN lead_dedup d ON s.lead_id = d.dup_id
+JOIN lead_dedup older ON older.keep_id = d.keep_id AND older.dup_id < d.dup_id
+JOIN lead_scores older_score ON older_score.lead_id = older.dup_id;
+UPDATE lead_scores s JOIN lead_dedup d ON s.lead_id = d.dup_id SET s.lead_id = d.keep_id;
+
+DELETE l FROM leads l JOIN lead_dedup d ON l.id = d.dup_id;
+DROP TABLE lead_dedup;
+
+-- Functional key parts need double parentheses
+CREATE UNIQUE INDEX uq_leads_user_email ON leads (user_id, (LOWER(email)));
@@ -0,0 +1,21 @@
+-- Background export jobs (export_jobs.py); files live under EXPORT_DIR
+CREATE TABLE export_jobs (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    user_id INTEGER NOT NULL,
+    kind VARCHAR(50) NOT NULL,
+    format VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    rows_total INTEGER NULL,
+    rows_written INTEGER DEFAULT 0,
+    file_path VARCHAR(500) NULL,
+    file_size BIGINT NULL,
+    error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    heartbeat_at DATETIME NULL,
+    completed_at DATETIME NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+CREATE INDEX ix_export_jobs_user_id ON export_jobs (user_id);
+-- The worker polls for pending exports
+CREATE INDEX ix_export_jobs_status ON export_jobs (status);
@@ -0,0 +1,16 @@
+-- Analytics goals (enhanced_analytics /api/analytics/goals)
+CREATE TABLE goals (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    user_id INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    target FLOAT NOT NULL,
+    current FLOAT DEFAULT 0,
+    goal_type VARCHAR(50) NOT NULL,
+    period VARCHAR(20) NOT NULL,
+    deadline DATETIME NULL,
+    description TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+CREATE INDEX ix_goals_user_id ON goals (user_id);
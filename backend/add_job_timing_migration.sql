@@ -0,0 +1,11 @@
+-- Job lifecycle columns maintained by job_lifecycle.py on status changes
+ALTER TABLE jobs ADD COLUMN started_at DATETIME NULL;
+ALTER TABLE jobs ADD COLUMN duration_ms INTEGER NULL;
+
+-- Existing finished jobs: time them from creation, as the rollup backfill does
+UPDATE jobs
+SET duration_ms = TIMESTAMPDIFF(MICROSECOND, created_at, completed_at) DIV 1000
+WHERE completed_at IS NOT NULL AND duration_ms IS NULL;
+
+-- Per-user aggregates (queries.job_totals) filter by user and split by status
+ALTER TABLE jobs ADD INDEX idx_jobs_user_status (user_id, status);
@@ -0,0 +1,22 @@
+-- Per-query yield statistics maintained by query_stats.py when jobs finish
+-- After applying, build stats for existing jobs with:
+--   python query_stats.py backfill
+
+CREATE TABLE query_stats (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    user_id INTEGER NOT NULL,  -- 0: all users
+    query_key VARCHAR(255) NOT NULL,
+    query_text VARCHAR(500),
+    runs INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    results FLOAT NOT NULL DEFAULT 0,
+    new_businesses FLOAT NOT NULL DEFAULT 0,
+    runtime_ms FLOAT NOT NULL DEFAULT 0,
+    timed_runs INTEGER NOT NULL DEFAULT 0,
+    last_run_at DATETIME NULL
+);
+CREATE UNIQUE INDEX uq_query_stats_user_query ON query_stats (user_id, query_key);
+CREATE INDEX ix_query_stats_top ON query_stats (user_id, successes, runs);
+
+-- New-business detection looks up earlier results by name
+CREATE INDEX ix_job_results_business_name ON job_results (business_name);
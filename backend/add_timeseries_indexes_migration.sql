@@ -0,0 +1,4 @@
+-- Time-series buckets (timeseries.py) range-scan a user's rows by timestamp
+ALTER TABLE jobs ADD INDEX ix_jobs_user_created (user_id, created_at);
+ALTER TABLE jobs ADD INDEX ix_jobs_user_completed (user_id, completed_at);
+ALTER TABLE leads ADD INDEX ix_leads_user_created (user_id, created_at);
@@ -15,6 +15,7 @@ import logging
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 from system import get_system_health as system_health_api, get_performance_metrics as system_performance_api
+from archive import fetch_archived, count_archived
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -312,11 +313,15 @@ def get_audit_logs(
     page_size: int = Query(20, ge=1, le=100, description="Number of logs per page."),
     action: Optional[str] = Query(None, description="Filter logs by action type."),
     admin_email: Optional[str] = Query(None, description="Filter logs by admin email (partial match)."),
-    target_type: Optional[str] = Query(None, description="Filter logs by target type.")
+    target_type: Optional[str] = Query(None, description="Filter logs by target type."),
+    include_archive: bool = Query(False, description="Continue into archived audit logs after the live ones. Can't be combined with filters.")
 ):
     """Get a paginated list of admin audit logs. Admin access required."""
     if not check_permission(user, "admin", "read", db):
         raise HTTPException(status_code=403, detail="Admin access required")
+    if include_archive and (action or admin_email or target_type):
+        # Archived rows are compressed payloads, so the filters can't be applied to them in SQL
+        raise HTTPException(status_code=400, detail="include_archive can't be combined with action, admin_email or target_type filters")
     print(f"📋 [ADMIN] Getting audit logs - Page: {page}, Page Size: {page_size}")
     
     query = db.query(AuditLogs)
@@ -333,23 +338,46 @@ def get_audit_logs(
     total = query.count()
     print(f"📊 [ADMIN] Total audit logs found: {total}")
     
-    logs = query.order_by(AuditLogs.created_at.desc()).offset((page-1)*page_size).limit(page_size).all()
+    offset = (page-1)*page_size
+    logs = query.order_by(AuditLogs.created_at.desc()).offset(offset).limit(page_size).all()
     print(f"📋 [ADMIN] Retrieved {len(logs)} audit logs for page {page}")
     
+    results = [
+        {
+            "id": log.id,
+            "admin_email": log.admin_email,
+            "action": log.action,
+            "target_type": log.target_type,
+            "target_id": log.target_id,
+            "target_email": log.target_email,
+            "details": json.loads(log.details) if log.details else None,
+            "created_at": log.created_at.isoformat() if log.created_at else None
+        }
+        for log in logs
+    ]
+    
+    if include_archive:
+        # Archived logs are all older than live ones: page through live rows first, then the archive
+        archive_offset = max(offset - total, 0)
+        remaining = page_size - len(results)
+        if remaining > 0:
+            for log in fetch_archived(db, "audit_logs", offset=archive_offset, limit=remaining):
+                details = log.get("details")
+                results.append({
+                    "id": log["id"],
+                    "admin_email": log.get("admin_email"),
+                    "action": log.get("action"),
+                    "target_type": log.get("target_type"),
+                    "target_id": log.get("target_id"),
+                    "target_email": log.get("target_email"),
+                    "details": json.loads(details) if details else None,
+                    "created_at": log.get("created_at")
+                })
+        total += count_archived(db, "audit_logs")
+        print(f"📦 [ADMIN] Included archived audit logs - Total with archive: {total}")
+    
     return {
-        "results": [
-            {
-                "id": log.id,
-                "admin_email": log.admin_email,
-                "action": log.action,
-                "target_type": log.target_type,
-                "target_id": log.target_id,
-                "target_email": log.target_email,
-                "details": json.loads(log.details) if log.details else None,
-                "created_at": log.created_at.isoformat() if log.created_at else None
-            }
-            for log in logs
-        ],
+        "results": results,
         "total": total
     }
 
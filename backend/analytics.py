@@ -2,12 +2,13 @@ import threading
 from fastapi import APIRouter, Depends, HTTPException, Request, Body, Path
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Any, Dict, List
 from models import Users, CustomDashboards
 from database import get_db
 from auth import get_current_user
 from tenant_utils import get_tenant_record_or_403
 from audit import audit_log
+from dashboard_engine import evaluate
 
 # Thread-safe cache for per-user analytics
 _analytics_cache = {}
@@ -32,6 +33,10 @@ class DashboardOut(BaseModel):
 class DeleteDashboardResponse(BaseModel):
     status: str
 
+class DashboardEvaluation(BaseModel):
+    widgets: Dict[str, Dict[str, Any]] = Field(..., description="Result per widget ID (an error for invalid widget specs).")
+    sources: int = Field(..., description="Number of shared data sources queried.")
+
 @router.get("/", response_model=List[DashboardOut], summary="List dashboards", description="List all custom dashboards for the current user.")
 def list_dashboards(db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
     dashboards = db.query(CustomDashboards).filter(CustomDashboards.user_id == user.id).all()
@@ -57,6 +62,17 @@ def create_dashboard(data: DashboardIn, db: Session = Depends(get_db), user: Use
         updated_at=str(dashboard.updated_at) if dashboard.updated_at else None
     )
 
+@router.post("/evaluate", response_model=DashboardEvaluation, summary="Evaluate dashboard config", description="Evaluate the widgets of an unsaved dashboard configuration.")
+def evaluate_dashboard_config(config: dict = Body(..., description="Dashboard configuration object."), db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
+    return evaluate(db, user.id, config)
+
+@router.get("/{dash_id}/evaluate", response_model=DashboardEvaluation, summary="Evaluate dashboard", description="Evaluate every widget of a custom dashboard in one request.")
+def evaluate_dashboard(dash_id: int = Path(..., description="ID of the dashboard."), db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
+    dashboard = db.query(CustomDashboards).filter(CustomDashboards.id == dash_id, CustomDashboards.user_id == user.id).first()
+    if not dashboard:
+        raise HTTPException(status_code=404, detail="Dashboard not found")
+    return evaluate(db, user.id, dashboard.config)
+
 @router.put("/{dash_id}", response_model=DashboardOut, summary="Update dashboard", description="Update a custom dashboard by ID.")
 def update_dashboard(dash_id: int = Path(..., description="ID of the dashboard."), data: DashboardIn = Body(...), db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
     dashboard = db.query(CustomDashboards).filter(CustomDashboards.id == dash_id, CustomDashboards.user_id == user.id).first()
@@ -0,0 +1,407 @@
+"""
+Columnar analytics engine for LeadTap Platform
+Periodically exports incremental Parquet snapshots of jobs, leads, job_results and
+bulk_whatsapp_messages, and answers heavy report queries (trends, per-query performance)
+with embedded DuckDB over those files instead of scanning the primary database.
+DuckDB is optional: without it, or while snapshots are stale, reports run live.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, func, select
+from sqlalchemy.orm import Session
+
+from analytics_rollup import parse_queries
+from cache import cache_manager
+from config import settings
+from database import SessionLocal
+from models import BulkWhatsAppCampaigns, BulkWhatsAppMessages, JobResults, Jobs, Leads
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+logger = logging.getLogger("analytics_engine")
+
+# Rows changed this long before the last watermark are exported again, so a transaction
+# that committed late with an older timestamp isn't missed (views keep the newest copy)
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# One worker exports at a time
+EXPORT_LOCK_MS = 30 * 60 * 1000
+
+# Per-table snapshot definitions. Columns are (name, expression); "user_id" is always
+# present so reports filter by owner. "watermark" selects changed rows: an updated-at
+# expression, or "id" for append-only tables. Large text columns are left out.
+SNAPSHOT_TABLES: Dict[str, Dict[str, Any]] = {
+    "jobs": {
+        "columns": [
+            ("id", Jobs.id), ("user_id", Jobs.user_id), ("status", Jobs.status), ("queries", Jobs.queries),
+            ("results_count", Jobs.results_count), ("created_at", Jobs.created_at), ("updated_at", Jobs.updated_at),
+            ("started_at", Jobs.started_at), ("completed_at", Jobs.completed_at), ("duration_ms", Jobs.duration_ms),
+        ],
+        "watermark": func.coalesce(Jobs.updated_at, Jobs.created_at),
+    },
+    "leads": {
+        "columns": [
+            ("id", Leads.id), ("user_id", Leads.user_id), ("status", Leads.status), ("source", Leads.source),
+            ("score", Leads.score), ("created_at", Leads.created_at), ("updated_at", Leads.updated_at),
+        ],
+        "watermark": func.coalesce(Leads.updated_at, Leads.created_at),
+    },
+    "job_results": {
+        "columns": [
+            ("id", JobResults.id), ("job_id", JobResults.job_id), ("user_id", Jobs.user_id), ("category", JobResults.category),
+            ("rating", JobResults.rating), ("reviews_count", JobResults.reviews_count), ("created_at", JobResults.created_at),
+        ],
+        "join": (Jobs, JobResults.job_id == Jobs.id),
+        "watermark": "id",
+    },
+    "bulk_whatsapp_messages": {
+        "columns": [
+            ("id", BulkWhatsAppMessages.id), ("campaign_id", BulkWhatsAppMessages.campaign_id),
+            ("user_id", BulkWhatsAppCampaigns.user_id), ("status", BulkWhatsAppMessages.status),
+            ("retry_count", BulkWhatsAppMessages.retry_count), ("sent_at", BulkWhatsAppMessages.sent_at),
+            ("delivered_at", BulkWhatsAppMessages.delivered_at), ("read_at", BulkWhatsAppMessages.read_at),
+            ("created_at", BulkWhatsAppMessages.created_at), ("updated_at", BulkWhatsAppMessages.updated_at),
+        ],
+        "join": (BulkWhatsAppCampaigns, BulkWhatsAppMessages.campaign_id == BulkWhatsAppCampaigns.id),
+        "watermark": func.coalesce(BulkWhatsAppMessages.updated_at, BulkWhatsAppMessages.created_at),
+    },
+}
+
+def _naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _duckdb_type(name: str, expression) -> str:
+    if name == "queries":
+        return "VARCHAR[]"
+    column_type = expression.type
+    if isinstance(column_type, Boolean):
+        return "BOOLEAN"
+    if isinstance(column_type, Integer):
+        return "BIGINT"
+    if isinstance(column_type, Float):
+        return "DOUBLE"
+    if isinstance(column_type, DateTime):
+        return "TIMESTAMP"
+    return "VARCHAR"
+
+def _snapshot_value(name: str, value: Any) -> Any:
+    if name == "queries":
+        return [str(query) for query in parse_queries(value)]
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return _naive_utc(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+def _quote(path: str) -> str:
+    return "'" + path.replace("'", "''") + "'"
+
+class AnalyticsEngine:
+    """Parquet snapshots plus DuckDB queries over them.
+
+    Each export appends one part file per table with the rows changed since that table's
+    watermark; table views keep the newest copy of each id, and compact() folds the parts
+    into one once there are more than ANALYTICS_SNAPSHOT_MAX_PARTS. Rows deleted or
+    archived in the primary database stay in the snapshots, so reports keep history."""
+
+    def __init__(self, directory: str = None, session_factory=SessionLocal):
+        self.directory = directory or settings.ANALYTICS_ENGINE_DIR
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+
+    # --- Manifest ---
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {"tables": {}, "exported_at": None}
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        temporary = self.manifest_path + ".tmp"
+        with open(temporary, "w") as handle:
+            json.dump(manifest, handle, indent=2)
+        os.replace(temporary, self.manifest_path)
+
+    def _table_dir(self, table: str) -> str:
+        return os.path.join(self.directory, table)
+
+    def _parts(self, table: str) -> List[str]:
+        try:
+            names = sorted(name for name in os.listdir(self._table_dir(table)) if name.endswith(".parquet"))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self._table_dir(table), name) for name in names]
+
+    def lag_seconds(self) -> Optional[float]:
+        """Seconds since the last completed export (None if never exported)"""
+        exported_at = self.manifest().get("exported_at")
+        if not exported_at:
+            return None
+        return (datetime.now(timezone.utc) - datetime.fromisoformat(exported_at)).total_seconds()
+
+    @property
+    def available(self) -> bool:
+        """Whether reports can be answered from snapshots right now"""
+        if duckdb is None or not settings.ANALYTICS_ENGINE_ENABLED:
+            return False
+        lag = self.lag_seconds()
+        return lag is not None and lag <= settings.ANALYTICS_ENGINE_MAX_LAG_SECONDS
+
+    # --- Export ---
+
+    def _changed_rows(self, db: Session, table: str, state: Dict[str, Any]):
+        spec = SNAPSHOT_TABLES[table]
+        names = [name for name, _ in spec["columns"]]
+        stmt = select(*(expression for _, expression in spec["columns"]))
+        if "join" in spec:
+            stmt = stmt.join(*spec["join"])
+        if isinstance(spec["watermark"], str):
+            id_column = spec["columns"][0][1]
+            stmt = stmt.where(id_column > state.get("watermark", 0)).order_by(id_column)
+            watermark_index = 0
+        else:
+            stmt = stmt.add_columns(spec["watermark"])
+            if state.get("watermark"):
+                since = datetime.fromisoformat(state["watermark"]) - WATERMARK_OVERLAP
+                stmt = stmt.where(spec["watermark"] >= _naive_utc(since))
+            watermark_index = len(names)
+        rows = db.execute(stmt.execution_options(yield_per=settings.ANALYTICS_SNAPSHOT_BATCH_SIZE))
+        return names, rows, watermark_index
+
+    def export_table(self, db: Session, table: str, state: Dict[str, Any]) -> int:
+        """Write one part with the table's changed rows. Returns the row count."""
+        spec = SNAPSHOT_TABLES[table]
+        names, rows, watermark_index = self._changed_rows(db, table, state)
+        columns = ", ".join(f'"{name}" {_duckdb_type(name, expression)}' for name, expression in spec["columns"])
+        placeholders = ", ".join("?" for _ in names)
+        con = duckdb.connect()
+        try:
+            con.execute(f"CREATE TABLE batch ({columns})")
+            exported, latest, batch = 0, None, []
+            for row in rows:
+                batch.append([_snapshot_value(name, value) for name, value in zip(names, row)])
+                mark = row[watermark_index]
+                if isinstance(mark, datetime):
+                    mark = mark.replace(tzinfo=timezone.utc) if mark.tzinfo is None else mark
+                if mark is not None and (latest is None or mark > latest):
+                    latest = mark
+                if len(batch) >= settings.ANALYTICS_SNAPSHOT_BATCH_SIZE:
+                    con.executemany(f"INSERT INTO batch VALUES ({placeholders})", batch)
+                    exported += len(batch)
+                    batch = []
+            if batch:
+                con.executemany(f"INSERT INTO batch VALUES ({placeholders})", batch)
+                exported += len(batch)
+            if exported or not self._parts(table):  # an empty first part still gives the view its schema
+                sequence = state.get("parts", 0) + 1
+                os.makedirs(self._table_dir(table), exist_ok=True)
+                path = os.path.join(self._table_dir(table), f"part-{sequence:08d}.parquet")
+                con.execute(f"COPY batch TO {_quote(path + '.tmp')} (FORMAT PARQUET, COMPRESSION ZSTD)")
+                os.replace(path + ".tmp", path)  # readers glob *.parquet: never a partial file
+                state["parts"] = sequence
+            if latest is not None:
+                state["watermark"] = latest if isinstance(spec["watermark"], str) else latest.isoformat()
+            state["rows_exported"] = state.get("rows_exported", 0) + exported
+            return exported
+        finally:
+            con.close()
+
+    def compact(self, table: str) -> bool:
+        """Fold a table's parts into one (newest copy of each row). False if nothing to do."""
+        parts = self._parts(table)
+        if len(parts) < 2:
+            return False
+        manifest = self.manifest()
+        state = manifest["tables"].setdefault(table, {})
+        sequence = state.get("parts", 0) + 1
+        path = os.path.join(self._table_dir(table), f"part-{sequence:08d}.parquet")
+        con = duckdb.connect()
+        try:
+            con.execute(f"CREATE VIEW source AS {self._view_sql(parts)}")
+            con.execute(f"COPY (SELECT * FROM source) TO {_quote(path + '.tmp')} (FORMAT PARQUET, COMPRESSION ZSTD)")
+        finally:
+            con.close()
+        os.replace(path + ".tmp", path)
+        for old in parts:
+            os.remove(old)
+        state["parts"] = sequence
+        self._save_manifest(manifest)
+        return True
+
+    def export_snapshots(self) -> Dict[str, int]:
+        """Export every table once. Returns rows exported per table."""
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed")
+        token = cache_manager.acquire_lock("analytics_engine:export", EXPORT_LOCK_MS)
+        if token is None:
+            logger.info("Analytics snapshot export already running on another worker")
+            return {}
+        try:
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                manifest = self.manifest()
+                results = {}
+                db = self.session_factory()
+                try:
+                    for table in SNAPSHOT_TABLES:
+                        started = time.time()
+                        state = manifest["tables"].setdefault(table, {})
+                        results[table] = self.export_table(db, table, state)
+                        logger.info(f"Exported {results[table]} {table} rows in {time.time() - started:.2f}s")
+                finally:
+                    db.close()
+                manifest["exported_at"] = datetime.now(timezone.utc).isoformat()
+                self._save_manifest(manifest)
+                for table in SNAPSHOT_TABLES:
+                    if len(self._parts(table)) > settings.ANALYTICS_SNAPSHOT_MAX_PARTS:
+                        self.compact(table)
+                return results
+        finally:
+            cache_manager.release_lock("analytics_engine:export", token)
+
+    # --- Queries ---
+
+    @staticmethod
+    def _view_sql(parts: Sequence[str]) -> str:
+        files = "[" + ", ".join(_quote(part) for part in parts) + "]"
+        return (
+            f"SELECT * EXCLUDE (filename) FROM read_parquet({files}, filename = true, union_by_name = true) "
+            "QUALIFY row_number() OVER (PARTITION BY id ORDER BY filename DESC) = 1"
+        )
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        """Run SQL against views named after the snapshot tables"""
+        con = duckdb.connect()
+        try:
+            for table in SNAPSHOT_TABLES:
+                parts = self._parts(table)
+                if not parts:
+                    raise RuntimeError(f"No snapshot of {table} yet")
+                con.execute(f"CREATE VIEW {table} AS {self._view_sql(parts)}")
+            return con.execute(sql, [_naive_utc(value) if isinstance(value, datetime) else value for value in params]).fetchall()
+        finally:
+            con.close()
+
+    # --- Reports (same shapes as the live fallbacks in enhanced_analytics) ---
+
+    def daily_counts(self, table: str, user_id: int, since: datetime) -> List[Dict[str, Any]]:
+        rows = self.query(
+            f"SELECT CAST(created_at AS DATE) AS day, count(*) FROM {table} "
+            "WHERE user_id = ? AND created_at >= ? GROUP BY day ORDER BY day",
+            [user_id, since],
+        )
+        return [{"date": str(day), "count": count} for day, count in rows]
+
+    def message_trends(self, user_id: int, since: datetime) -> List[Dict[str, Any]]:
+        rows = self.query(
+            "SELECT CAST(created_at AS DATE) AS day, count(*), "
+            "count(*) FILTER (WHERE status IN ('sent', 'delivered', 'read')), "
+            "count(*) FILTER (WHERE status IN ('delivered', 'read')), "
+            "count(*) FILTER (WHERE status = 'read'), "
+            "count(*) FILTER (WHERE status = 'failed') "
+            "FROM bulk_whatsapp_messages WHERE user_id = ? AND created_at >= ? GROUP BY day ORDER BY day",
+            [user_id, since],
+        )
+        return [
+            {"date": str(day), "count": count, "sent": sent, "delivered": delivered, "read": read, "failed": failed}
+            for day, count, sent, delivered, read, failed in rows
+        ]
+
+    def query_performance(self, user_id: int, since: datetime, limit: int) -> List[Dict[str, Any]]:
+        rows = self.query(
+            "WITH job_queries AS ("
+            "  SELECT id, status, results_count, duration_ms, unnest(queries) AS query"
+            "  FROM jobs WHERE user_id = ? AND created_at >= ?"
+            "), ratings AS ("
+            "  SELECT job_id, avg(rating) AS rating FROM job_results WHERE user_id = ? GROUP BY job_id"
+            ") "
+            "SELECT query, count(*) AS jobs, count(*) FILTER (WHERE status = 'completed'), "
+            "coalesce(sum(results_count) FILTER (WHERE status = 'completed'), 0), "
+            "avg(duration_ms) FILTER (WHERE status = 'completed'), avg(ratings.rating) "
+            "FROM job_queries LEFT JOIN ratings ON ratings.job_id = job_queries.id "
+            "GROUP BY query ORDER BY jobs DESC, query LIMIT ?",
+            [user_id, since, user_id, limit],
+        )
+        return [
+            {
+                "query": query,
+                "jobs": jobs,
+                "completed_jobs": completed,
+                "success_rate": round(completed / jobs * 100, 2) if jobs else 0,
+                "results": int(results),
+                "average_duration_ms": round(duration, 1) if duration is not None else None,
+                "average_rating": round(rating, 2) if rating is not None else None,
+            }
+            for query, jobs, completed, results, duration, rating in rows
+        ]
+
+    def status(self) -> Dict[str, Any]:
+        manifest = self.manifest()
+        return {
+            "installed": duckdb is not None,
+            "enabled": settings.ANALYTICS_ENGINE_ENABLED,
+            "available": self.available,
+            "exported_at": manifest.get("exported_at"),
+            "tables": {table: {**manifest["tables"].get(table, {}), "part_files": len(self._parts(table))} for table in SNAPSHOT_TABLES},
+        }
+
+class SnapshotWorker:
+    """Background thread that exports snapshots periodically"""
+
+    def __init__(self, engine: AnalyticsEngine, interval_seconds: int = None):
+        self.engine = engine
+        self.interval_seconds = interval_seconds or settings.ANALYTICS_SNAPSHOT_INTERVAL_SECONDS
+        self.running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        if duckdb is None:
+            logger.warning("duckdb is not installed; analytics reports will run against the primary database")
+            return
+        if not self.running:
+            self.running = True
+            self._stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="analytics-snapshots")
+            self.thread.daemon = True
+            self.thread.start()
+            logger.info("Analytics snapshot worker started")
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join()
+        logger.info("Analytics snapshot worker stopped")
+
+    def _run(self):
+        while self.running:
+            try:
+                self.engine.export_snapshots()
+            except Exception:
+                logger.exception("Error exporting analytics snapshots")
+            self._stop_event.wait(self.interval_seconds)
+
+analytics_engine = AnalyticsEngine()
+snapshot_worker = SnapshotWorker(analytics_engine)
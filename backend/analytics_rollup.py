@@ -0,0 +1,315 @@
+"""
+Daily analytics rollups for LeadTap Platform
+Keeps one Analytics row per user and day up to date from job, lead and lead score writes,
+inside the same transaction as the write, so analytics endpoints sum a few rollup rows
+instead of scanning every job the user ever ran.
+Run `python analytics_rollup.py backfill [user_id]` once to build rollups for existing data.
+"""
+
+import json
+import logging
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, delete, event, func, inspect, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+
+from job_lifecycle import duration_ms
+from models import Analytics, JobStatus, Jobs, LeadScores, LeadStatus, Leads
+
+logger = logging.getLogger("analytics_rollup")
+
+# Additive rollup columns; every event is a delta to some of these
+ROLLUP_COUNTERS = (
+    "queries_run",
+    "jobs_created",
+    "jobs_completed",
+    "jobs_failed",
+    "jobs_cancelled",
+    "jobs_timed",
+    "job_duration_seconds",
+    "leads_generated",
+    "conversions",
+    "lead_scores",
+    "lead_score_total",
+)
+
+TERMINAL_COUNTERS = {
+    JobStatus.COMPLETED: "jobs_completed",
+    JobStatus.FAILED: "jobs_failed",
+    JobStatus.CANCELLED: "jobs_cancelled",
+}
+
+BACKFILL_BATCH_SIZE = 1000
+
+Deltas = Dict[Tuple[int, datetime], Dict[str, float]]
+
+def _utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment is None:
+        return None
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+def day_of(moment: Optional[datetime] = None) -> datetime:
+    """Rollup key for a moment: midnight UTC of its day (today if None)"""
+    moment = _utc(moment) or datetime.now(timezone.utc)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def parse_queries(queries: Any) -> List[str]:
+    """A job's queries (stored either as a JSON list or a JSON-encoded string)"""
+    if isinstance(queries, str):
+        try:
+            queries = json.loads(queries)
+        except ValueError:
+            return [queries] if queries else []
+    return list(queries) if isinstance(queries, list) else []
+
+def _status(value: Any) -> Optional[JobStatus]:
+    try:
+        return JobStatus(getattr(value, "value", value))
+    except ValueError:
+        return None
+
+def _add(deltas: Deltas, user_id: Optional[int], day: datetime, **values: float):
+    if user_id is None:
+        return
+    bucket = deltas[(user_id, day)]
+    for column, value in values.items():
+        bucket[column] = bucket.get(column, 0) + value
+
+def _completion(deltas: Deltas, user_id: int, status: JobStatus, created_at, completed_at, results_count, duration: Optional[int] = None):
+    completed_at = _utc(completed_at) or datetime.now(timezone.utc)
+    values = {TERMINAL_COUNTERS[status]: 1}
+    if status == JobStatus.COMPLETED:
+        values["leads_generated"] = results_count or 0
+        if duration is None:
+            duration = duration_ms(created_at, completed_at)  # rows from before duration_ms
+        if duration is not None:
+            values["jobs_timed"] = 1
+            values["job_duration_seconds"] = duration / 1000
+    _add(deltas, user_id, day_of(completed_at), **values)
+
+# --- Live maintenance ---
+#
+# Rollups count events: a job is counted as created on the day it is inserted and as
+# completed/failed/cancelled on the day it reaches that status. Deleting or archiving
+# rows doesn't rewrite history.
+
+def _job_deltas(deltas: Deltas, job: Jobs, is_new: bool):
+    state = inspect(job)
+    values = state.dict  # not job.<attr>: unloaded server defaults would be fetched mid-flush
+    status_history = state.attrs.status.history
+    status = _status(values.get("status"))
+    if is_new:
+        _add(deltas, job.user_id, day_of(values.get("created_at")), jobs_created=1, queries_run=len(parse_queries(values.get("queries"))))
+        if status in TERMINAL_COUNTERS:
+            _completion(deltas, job.user_id, status, values.get("created_at"), values.get("completed_at"), values.get("results_count"), values.get("duration_ms"))
+        return
+    if status_history.has_changes():
+        previous = _status(status_history.deleted[0]) if status_history.deleted else None
+        if status in TERMINAL_COUNTERS and status != previous:
+            _completion(deltas, job.user_id, status, values.get("created_at"), values.get("completed_at"), values.get("results_count"), values.get("duration_ms"))
+        return
+    count_history = state.attrs.results_count.history
+    if status == JobStatus.COMPLETED and count_history.has_changes():
+        # Results added to an already completed job count on its completion day
+        previous = (count_history.deleted or [0])[0] or 0
+        _add(deltas, job.user_id, day_of(values.get("completed_at")), leads_generated=(values.get("results_count") or 0) - previous)
+
+def _converted(status: Any) -> bool:
+    return getattr(status, "value", status) == LeadStatus.CONVERTED.value
+
+def _lead_deltas(deltas: Deltas, lead: Leads, is_new: bool):
+    state = inspect(lead)
+    converted = _converted(state.dict.get("status"))
+    if is_new:
+        if converted:
+            _add(deltas, lead.user_id, day_of(), conversions=1)
+        return
+    history = state.attrs.status.history
+    if history.has_changes():
+        was_converted = bool(history.deleted) and _converted(history.deleted[0])
+        if converted != was_converted:
+            # Leaving converted takes the conversion back (today), so re-converting counts once
+            _add(deltas, lead.user_id, day_of(), conversions=1 if converted else -1)
+
+def _score_deltas(deltas: Deltas, score: LeadScores, change: str):
+    state = inspect(score)
+    lead = object_session(score).get(Leads, score.lead_id) if score.lead_id else None
+    if lead is None:
+        return
+    day = day_of(state.dict.get("created_at"))
+    if change == "new":
+        _add(deltas, lead.user_id, day, lead_scores=1, lead_score_total=score.overall_score or 0)
+    elif change == "deleted":
+        _add(deltas, lead.user_id, day, lead_scores=-1, lead_score_total=-(score.overall_score or 0))
+    else:
+        history = state.attrs.overall_score.history
+        if history.has_changes() and history.deleted:
+            _add(deltas, lead.user_id, day, lead_score_total=(score.overall_score or 0) - (history.deleted[0] or 0))
+
+def deltas_for_flush(session: Session) -> Deltas:
+    deltas: Deltas = defaultdict(dict)
+    for instance in session.new:
+        if isinstance(instance, Jobs):
+            _job_deltas(deltas, instance, is_new=True)
+        elif isinstance(instance, Leads):
+            _lead_deltas(deltas, instance, is_new=True)
+        elif isinstance(instance, LeadScores):
+            _score_deltas(deltas, instance, "new")
+    for instance in session.dirty:
+        if isinstance(instance, Jobs):
+            _job_deltas(deltas, instance, is_new=False)
+        elif isinstance(instance, Leads):
+            _lead_deltas(deltas, instance, is_new=False)
+        elif isinstance(instance, LeadScores):
+            _score_deltas(deltas, instance, "dirty")
+    for instance in session.deleted:
+        if isinstance(instance, LeadScores):
+            _score_deltas(deltas, instance, "deleted")
+    return deltas
+
+def _rows(deltas: Deltas) -> List[Dict[str, Any]]:
+    rows = []
+    for (user_id, day), values in deltas.items():
+        if any(values.values()):
+            rows.append({"user_id": user_id, "date": day, **{column: values.get(column, 0) for column in ROLLUP_COUNTERS}})
+    return rows
+
+def upsert_increments(connection, table, keys: Sequence[str], counters: Sequence[str], rows: List[Dict[str, Any]], replace: Sequence[str] = ()):
+    """Insert rows, or add their counters to the existing row with the same keys.
+
+    Columns in replace are overwritten instead (e.g. a last-seen value). Needs a unique
+    index on keys for the dialect upserts."""
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        updates = {column: table.c[column] + stmt.excluded[column] for column in counters}
+        updates.update({column: stmt.excluded[column] for column in replace})
+        connection.execute(stmt.on_conflict_do_update(index_elements=[table.c[key] for key in keys], set_=updates), rows)
+    elif dialect == "mysql":
+        stmt = mysql.insert(table)
+        updates = {column: table.c[column] + stmt.inserted[column] for column in counters}
+        updates.update({column: stmt.inserted[column] for column in replace})
+        connection.execute(stmt.on_duplicate_key_update(updates), rows)
+    else:
+        for row in rows:
+            values = {column: table.c[column] + row[column] for column in counters}
+            values.update({column: row[column] for column in replace})
+            updated = connection.execute(table.update().where(*(table.c[key] == row[key] for key in keys)).values(values))
+            if not updated.rowcount:
+                connection.execute(table.insert().values(**row))
+
+def apply_deltas(connection, deltas: Deltas):
+    """Add deltas to the rollup rows, creating them as needed (one upsert per row)"""
+    upsert_increments(connection, Analytics.__table__, ("user_id", "date"), ROLLUP_COUNTERS, _rows(deltas))
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    pass
+
+# Deltas need the value being replaced even when the row was expired by a commit
+for _attribute in (Jobs.status, Jobs.results_count, Leads.status, LeadScores.overall_score):
+    event.listen(_attribute, "set", _load_previous_value, active_history=True)
+
+@event.listens_for(Session, "after_flush")
+def _roll_up_flush(session, flush_context):
+    deltas = deltas_for_flush(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+def record_conversions(db: Session, user_id: int, count: int):
+    """Count leads inserted as converted by Core bulk writes, which skip the flush hook"""
+    if count:
+        deltas: Deltas = defaultdict(dict)
+        _add(deltas, user_id, day_of(), conversions=count)
+        apply_deltas(db.connection(), deltas)
+
+# --- Reading ---
+
+def rollup_totals(db: Session, user_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, float]:
+    """Sum of each rollup counter for a user over [since, until) (days, UTC)"""
+    stmt = select(*[func.coalesce(func.sum(Analytics.__table__.c[column]), 0) for column in ROLLUP_COUNTERS]).where(
+        Analytics.user_id == user_id
+    )
+    if since is not None:
+        stmt = stmt.where(Analytics.date >= day_of(since))
+    if until is not None:
+        stmt = stmt.where(Analytics.date < day_of(until))
+    return dict(zip(ROLLUP_COUNTERS, db.execute(stmt).one()))
+
+def rollup_windows(db: Session, user_id: int, windows: Iterable[int], now: Optional[datetime] = None) -> Dict[int, Dict[str, float]]:
+    """rollup_totals for several trailing windows of days (today included), in one query"""
+    today = day_of(now)
+    windows = sorted(set(windows))
+    columns = [
+        func.coalesce(func.sum(case((Analytics.date >= today - timedelta(days=days - 1), Analytics.__table__.c[column]), else_=0)), 0)
+        for days in windows
+        for column in ROLLUP_COUNTERS
+    ]
+    row = db.execute(select(*columns).where(Analytics.user_id == user_id, Analytics.date >= today - timedelta(days=windows[-1] - 1))).one()
+    width = len(ROLLUP_COUNTERS)
+    return {days: dict(zip(ROLLUP_COUNTERS, row[i * width:(i + 1) * width])) for i, days in enumerate(windows)}
+
+# --- Backfill ---
+
+def backfill(db: Session, user_id: Optional[int] = None) -> int:
+    """Rebuild rollups from the current jobs, leads and scores (one-off, after migrating).
+
+    Replaces existing rollup rows for the user (or everyone). Job events are dated by
+    created_at / completed_at (updated_at for failed and cancelled jobs). Conversion
+    dates aren't recorded anywhere, so converted leads count on their last update.
+    Returns the number of rollup rows written."""
+    deltas: Deltas = defaultdict(dict)
+
+    jobs = select(Jobs.user_id, Jobs.status, Jobs.queries, Jobs.results_count, Jobs.created_at, Jobs.updated_at, Jobs.completed_at, Jobs.duration_ms)
+    if user_id is not None:
+        jobs = jobs.where(Jobs.user_id == user_id)
+    for job in db.execute(jobs.execution_options(yield_per=BACKFILL_BATCH_SIZE)):
+        _add(deltas, job.user_id, day_of(job.created_at), jobs_created=1, queries_run=len(parse_queries(job.queries)))
+        status = _status(job.status)
+        if status in TERMINAL_COUNTERS:
+            finished_at = job.completed_at or job.updated_at or job.created_at
+            _completion(deltas, job.user_id, status, job.created_at, finished_at, job.results_count, job.duration_ms)
+
+    conversions = select(Leads.user_id, func.coalesce(Leads.updated_at, Leads.created_at)).where(Leads.status == LeadStatus.CONVERTED)
+    scores = select(Leads.user_id, LeadScores.created_at, LeadScores.overall_score).join(Leads, LeadScores.lead_id == Leads.id)
+    if user_id is not None:
+        conversions = conversions.where(Leads.user_id == user_id)
+        scores = scores.where(Leads.user_id == user_id)
+    for owner, converted_at in db.execute(conversions.execution_options(yield_per=BACKFILL_BATCH_SIZE)):
+        _add(deltas, owner, day_of(converted_at), conversions=1)
+    for owner, created_at, overall_score in db.execute(scores.execution_options(yield_per=BACKFILL_BATCH_SIZE)):
+        _add(deltas, owner, day_of(created_at), lead_scores=1, lead_score_total=overall_score or 0)
+
+    clear = delete(Analytics)
+    if user_id is not None:
+        clear = clear.where(Analytics.user_id == user_id)
+    db.execute(clear)
+    items = list(deltas.items())
+    for start in range(0, len(items), BACKFILL_BATCH_SIZE):
+        apply_deltas(db.connection(), dict(items[start:start + BACKFILL_BATCH_SIZE]))
+    db.commit()
+    written = len(_rows(deltas))
+    logger.info(f"Backfilled {written} analytics rollup rows")
+    return written
+
+def main():
+    from database import SessionLocal
+
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("Usage: python analytics_rollup.py backfill [user_id]")
+        sys.exit(1)
+    user_id = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    db = SessionLocal()
+    try:
+        print(f"🔍 Backfilling analytics rollups{f' for user {user_id}' if user_id else ''}...")
+        print(f"✅ Wrote {backfill(db, user_id)} rollup rows")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
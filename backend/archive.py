@@ -0,0 +1,305 @@
+"""
+Hot/cold archival for LeadTap Platform
+Moves aged rows out of the primary tables into the compressed archived_records table
+and keeps them queryable through an explicit include-archive path.
+"""
+
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone, date
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Path, Query
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from auth import get_current_user
+from cache import CacheTags
+from cache_invalidation import mark_stale
+from config import settings
+from database import SessionLocal, get_db
+from models import (
+    ArchivedRecords, AuditLogs, BulkWhatsAppCampaigns, BulkWhatsAppMessages, JobResults,
+    Jobs, Users, WebhookDeliveries, Webhooks
+)
+from security import check_permission
+
+logger = logging.getLogger("archive")
+
+router = APIRouter(prefix="/api/archive", tags=["archive"])
+
+# Per-table archival policies. Rows older than the retention window (and matching
+# the optional filter) are moved in id-ordered batches; child rows are archived
+# inside the parent payload so foreign keys never dangle.
+ARCHIVE_POLICIES: Dict[str, Dict[str, Any]] = {
+    "jobs": {
+        "model": Jobs,
+        "timestamp": Jobs.created_at,
+        "owner": Jobs.user_id,
+        "retention_days": settings.ARCHIVE_RETENTION_JOBS_DAYS,
+        "filter": lambda: Jobs.status.in_(["completed", "failed", "cancelled"]),
+        "children": {"results": (JobResults, JobResults.job_id)},
+    },
+    "audit_logs": {
+        "model": AuditLogs,
+        "timestamp": AuditLogs.created_at,
+        "owner": AuditLogs.user_id,
+        "retention_days": settings.ARCHIVE_RETENTION_AUDIT_LOGS_DAYS,
+    },
+    "webhook_deliveries": {
+        "model": WebhookDeliveries,
+        "timestamp": WebhookDeliveries.delivered_at,
+        "owner": Webhooks.user_id,
+        "join": (Webhooks, WebhookDeliveries.webhook_id == Webhooks.id),
+        "retention_days": settings.ARCHIVE_RETENTION_WEBHOOK_DELIVERIES_DAYS,
+    },
+    "bulk_whatsapp_messages": {
+        "model": BulkWhatsAppMessages,
+        "timestamp": BulkWhatsAppMessages.created_at,
+        "owner": BulkWhatsAppCampaigns.user_id,
+        "join": (BulkWhatsAppCampaigns, BulkWhatsAppMessages.campaign_id == BulkWhatsAppCampaigns.id),
+        "retention_days": settings.ARCHIVE_RETENTION_BULK_WHATSAPP_MESSAGES_DAYS,
+    },
+}
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+def row_to_dict(row) -> Dict[str, Any]:
+    """Serialize an ORM row into a plain dict of its column values"""
+    return {column.name: getattr(row, column.key) for column in row.__mapper__.columns}
+
+def encode_payload(data: Dict[str, Any]) -> bytes:
+    """JSON-encode and compress an archived row"""
+    return zlib.compress(json.dumps(data, default=_json_default, separators=(",", ":")).encode(), 6)
+
+def decode_payload(payload: bytes) -> Dict[str, Any]:
+    """Decompress and decode an archived row"""
+    return json.loads(zlib.decompress(payload))
+
+class ArchiveManager:
+    """Moves aged rows into the archive table in throttled batches"""
+
+    def __init__(self, batch_size: int = None, pause_seconds: float = None, max_batches: int = None):
+        self.batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+        self.pause_seconds = settings.ARCHIVE_BATCH_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+        self.max_batches = max_batches or settings.ARCHIVE_MAX_BATCHES_PER_RUN
+        self.last_run: Dict[str, Dict[str, Any]] = {}
+
+    def cutoff_for(self, table: str, now: datetime = None) -> datetime:
+        now = now or datetime.now(timezone.utc)
+        return now - timedelta(days=ARCHIVE_POLICIES[table]["retention_days"])
+
+    def archive_batch(self, db: Session, table: str, cutoff: datetime) -> int:
+        """Archive a single batch of rows older than cutoff. Returns rows moved."""
+        policy = ARCHIVE_POLICIES[table]
+        model = policy["model"]
+        stmt = select(model, policy["owner"]).where(policy["timestamp"] < cutoff)
+        if "join" in policy:
+            stmt = stmt.outerjoin(*policy["join"])
+        if "filter" in policy:
+            stmt = stmt.where(policy["filter"]())
+        # Every app worker runs the archiver: SKIP LOCKED hands each concurrent pass a
+        # disjoint batch (OF keeps the lock off the nullable side of the owner join)
+        stmt = stmt.order_by(model.id).limit(self.batch_size).with_for_update(skip_locked=True, of=model)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return 0
+
+        ids = [row[0].id for row in rows]
+        children: Dict[int, Dict[str, List[Dict[str, Any]]]] = {}
+        for name, (child_model, fk_column) in policy.get("children", {}).items():
+            for child in db.execute(select(child_model).where(fk_column.in_(ids))).scalars():
+                parent_children = children.setdefault(getattr(child, fk_column.key), {})
+                parent_children.setdefault(name, []).append(row_to_dict(child))
+
+        archived = []
+        for record, owner_id in rows:
+            data = row_to_dict(record)
+            if record.id in children:
+                data["_children"] = children[record.id]
+            archived.append({
+                "source_table": table,
+                "source_id": record.id,
+                "user_id": owner_id,
+                "record_created_at": getattr(record, policy["timestamp"].key),
+                "payload": encode_payload(data),
+            })
+
+        try:
+            db.execute(insert(ArchivedRecords), archived)
+            for child_model, fk_column in policy.get("children", {}).values():
+                db.execute(delete(child_model).where(fk_column.in_(ids)).execution_options(synchronize_session=False))
+            db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+            mark_stale(db, {CacheTags.user(owner_id) for _, owner_id in rows if owner_id is not None})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return len(ids)
+
+    def archive_table(self, db: Session, table: str, now: datetime = None) -> int:
+        """Archive every eligible row of a table, pausing between batches"""
+        if table not in ARCHIVE_POLICIES:
+            raise ValueError(f"No archive policy for table: {table}")
+        cutoff = self.cutoff_for(table, now)
+        started = time.time()
+        total = 0
+        for batch_number in range(self.max_batches):
+            moved = self.archive_batch(db, table, cutoff)
+            total += moved
+            if moved < self.batch_size:
+                break
+            if self.pause_seconds:
+                time.sleep(self.pause_seconds)
+        self.last_run[table] = {
+            "archived": total,
+            "cutoff": cutoff.isoformat(),
+            "duration_seconds": round(time.time() - started, 3),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if total:
+            logger.info(f"Archived {total} rows from {table} older than {cutoff.isoformat()}")
+        return total
+
+    def run_once(self, tables: Optional[List[str]] = None) -> Dict[str, int]:
+        """Run one archival pass over the given tables (all policies by default)"""
+        results = {}
+        db = SessionLocal()
+        try:
+            for table in tables or list(ARCHIVE_POLICIES):
+                try:
+                    results[table] = self.archive_table(db, table)
+                except Exception:
+                    logger.exception(f"Archival of {table} failed")
+                    results[table] = 0
+        finally:
+            db.close()
+        return results
+
+class ArchiveWorker:
+    """Background thread that runs the archive manager periodically, woken early on demand"""
+
+    def __init__(self, manager: ArchiveManager, interval_seconds: int = None):
+        self.manager = manager
+        self.interval_seconds = interval_seconds or settings.ARCHIVE_INTERVAL_SECONDS
+        self.running = False
+        self.thread = None
+        self._wake_event = threading.Event()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self._wake_event.clear()
+            self.thread = threading.Thread(target=self._run, name="archive-worker")
+            self.thread.daemon = True
+            self.thread.start()
+            logger.info("Archive worker started")
+
+    def stop(self):
+        self.running = False
+        self._wake_event.set()
+        if self.thread:
+            self.thread.join()
+        logger.info("Archive worker stopped")
+
+    def notify(self):
+        self._wake_event.set()
+
+    def _run(self):
+        while self.running:
+            try:
+                self.manager.run_once()
+            except Exception:
+                logger.exception("Error in archive worker loop")
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+
+archive_manager = ArchiveManager()
+archive_worker = ArchiveWorker(archive_manager)
+
+def count_archived(db: Session, table: str, user_id: Optional[int] = None) -> int:
+    """Count archived rows of a table, optionally for a single owner"""
+    query = db.query(func.count(ArchivedRecords.id)).filter(ArchivedRecords.source_table == table)
+    if user_id is not None:
+        query = query.filter(ArchivedRecords.user_id == user_id)
+    return query.scalar() or 0
+
+def fetch_archived(
+    db: Session,
+    table: str,
+    user_id: Optional[int] = None,
+    offset: int = 0,
+    limit: Optional[int] = 100,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Return decoded archived rows, newest first"""
+    query = db.query(ArchivedRecords).filter(ArchivedRecords.source_table == table)
+    if user_id is not None:
+        query = query.filter(ArchivedRecords.user_id == user_id)
+    if since is not None:
+        query = query.filter(ArchivedRecords.record_created_at >= since)
+    if until is not None:
+        query = query.filter(ArchivedRecords.record_created_at < until)
+    query = query.order_by(ArchivedRecords.record_created_at.desc(), ArchivedRecords.source_id.desc()).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    records = []
+    for record in query.all():
+        data = decode_payload(record.payload)
+        data["archived"] = True
+        data["archived_at"] = record.archived_at.isoformat() if record.archived_at else None
+        records.append(data)
+    return records
+
+@router.get("/status", summary="Get archive status", description="Get archive policies, archived row counts and the last run per table. Admin access required.")
+def get_archive_status(db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
+    if not check_permission(user, "admin", "read", db):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {
+        "enabled": settings.ARCHIVE_ENABLED,
+        "tables": {
+            table: {
+                "retention_days": policy["retention_days"],
+                "archived_rows": count_archived(db, table),
+                "last_run": archive_manager.last_run.get(table),
+            }
+            for table, policy in ARCHIVE_POLICIES.items()
+        },
+    }
+
+@router.post("/run", status_code=202, summary="Run archival now", description="Start a throttled archival pass over all tables in the background; progress shows up in /status. Admin access required.")
+def run_archive_now(background_tasks: BackgroundTasks, db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
+    if not check_permission(user, "admin", "write", db):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if archive_worker.running:
+        archive_worker.notify()
+    else:
+        background_tasks.add_task(archive_manager.run_once)
+    return {"status": "scheduled"}
+
+@router.get("/{table}", summary="List archived rows", description="List the current user's archived rows for a table, newest first.")
+def list_archived(
+    table: str = Path(..., description="Source table (jobs, audit_logs, webhook_deliveries, bulk_whatsapp_messages)."),
+    page: int = Query(1, ge=1, description="Page number for pagination."),
+    page_size: int = Query(50, ge=1, le=500, description="Number of rows per page."),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    if table not in ARCHIVE_POLICIES:
+        raise HTTPException(status_code=404, detail="Unknown archive table")
+    return {
+        "results": fetch_archived(db, table, user_id=user.id, offset=(page - 1) * page_size, limit=page_size),
+        "total": count_archived(db, table, user_id=user.id),
+    }
@@ -25,6 +25,13 @@ class AuditLogOut(BaseModel):
     class Config:
         orm_mode = True
 
+def record_action(db: Session, user_id: int, action: str, target_type: str = None, target_id=None, details=None):
+    """Write an audit log row and commit. AuditLogs has no target_id column, so the id goes into details."""
+    if target_id is not None:
+        details = f"{target_type or 'target'} {target_id}" + (f": {details}" if details else "")
+    db.add(AuditLogs(user_id=user_id, action=action, target_type=target_type, details=str(details) if details else None))
+    db.commit()
+
 # Unified audit logging decorator
 # Usage: @audit_log(action="delete_lead", target_type="lead")
 def audit_log(action: str, target_type: str = None, target_id_param: str = None, details_param: str = None):
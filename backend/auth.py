@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr
 from models import Users, AuditLogs
 from database import get_db
+from queries import user_by_id
+from cache_warming import cache_warmer
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 import logging
 import secrets
@@ -147,6 +149,7 @@ def login(user: UserLogin, db: Session = Depends(get_db), request: Request = Non
     token = create_access_token({"sub": str(db_user.id)})
     print(f"🎫 [LOGIN] Access token created successfully for user: {user.email}")
     log_audit_event(db, db_user, "login_success", "auth", {"email": user.email})
+    cache_warmer.enqueue(db_user.id)
     return {"access_token": token, "token_type": "bearer"}
 
 # New endpoint for 2FA step of login
@@ -169,6 +172,7 @@ def login_2fa(data: TwoFALoginRequest, db: Session = Depends(get_db), request: R
         if totp.verify(data.code):
             token = create_access_token({"sub": str(db_user.id)})
             log_audit_event(db, db_user, "login_2fa_success", "auth", {"user_id": data.user_id})
+            cache_warmer.enqueue(db_user.id)
             return {"access_token": token, "token_type": "bearer"}
     # Try enhanced backup codes (JSON with used flag)
     if db_user.backup_codes:
@@ -180,6 +184,7 @@ def login_2fa(data: TwoFALoginRequest, db: Session = Depends(get_db), request: R
         db.commit()
         token = create_access_token({"sub": str(db_user.id)})
         log_audit_event(db, db_user, "login_2fa_success_backup", "auth", {"user_id": data.user_id})
+        cache_warmer.enqueue(db_user.id)
         return {"access_token": token, "token_type": "bearer"}
     log_audit_event(db, db_user, "login_2fa_failed", "auth", {"user_id": data.user_id, "reason": "invalid_code"})
     raise HTTPException(status_code=401, detail="Invalid 2FA code")
@@ -208,7 +213,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
     
     # Find user in database
-    user = db.query(Users).filter(Users.id == int(user_id)).first()
+    user = user_by_id(db, int(user_id))
     if user is None:
         print(f"❌ [AUTH] Token validation failed - User not found in database: {user_id}")
         raise credentials_exception
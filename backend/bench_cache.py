@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Benchmark: MemoryCache set/get cost as the cache grows to 1M entries
+Per-operation time should stay flat (O(1)) regardless of size.
+Usage: python bench_cache.py [max_entries]
+"""
+
+import random
+import sys
+import time
+
+from cache import MemoryCache
+
+def measure(cache, keys, operation, samples=100_000):
+    chosen = [random.choice(keys) for _ in range(samples)]
+    started = time.perf_counter()
+    if operation == "get":
+        for key in chosen:
+            cache.get(key)
+    else:
+        for key in chosen:
+            cache.set(key, key, 300)
+    return (time.perf_counter() - started) / samples * 1e9
+
+def main():
+    max_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cache = MemoryCache(max_entries=max_entries, max_bytes=1 << 40)
+    print(f"🔍 MemoryCache set/get cost up to {max_entries:,} entries...")
+    size = 0
+    checkpoint = 10_000
+    while checkpoint <= max_entries:
+        for i in range(size, checkpoint):
+            cache.set(f"key:{i}", f"key:{i}", 300)
+        size = checkpoint
+        keys = [f"key:{i}" for i in range(0, size, max(1, size // 100_000))]
+        get_ns = measure(cache, keys, "get")
+        set_ns = measure(cache, keys, "set")
+        print(f"  {size:>9,} entries: get {get_ns:6.0f} ns  set {set_ns:6.0f} ns")
+        checkpoint *= 10
+
+    # Full cache: every new key evicts the least recently used one
+    started = time.perf_counter()
+    for i in range(100_000):
+        cache.set(f"new:{i}", i, 300)
+    print(f"  eviction set at capacity: {(time.perf_counter() - started) / 100_000 * 1e9:6.0f} ns ({cache.evictions:,} evictions)")
+
+if __name__ == "__main__":
+    main()
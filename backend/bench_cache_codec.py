@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: encode/decode time and stored size per cache codec on realistic payloads
+With a reachable REDIS_URL the Redis MEMORY USAGE of each stored value is reported too.
+Usage: python bench_cache_codec.py [iterations] [redis_url]
+"""
+
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from cache_codec import COMPRESSORS, SERIALIZERS, CacheCodec, _AVAILABLE
+
+def make_payloads():
+    now = datetime(2024, 5, 1, 12, 0, 0)
+    job_results = [
+        {
+            "business_name": f"Business {i}",
+            "address": f"{i} Main Street, Springfield",
+            "phone": f"+1555{i:07d}",
+            "website": f"https://business{i}.example.com",
+            "rating": round(3 + (i % 20) / 10, 1),
+            "reviews": i * 7 % 900,
+            "category": ["Restaurant", "Cafe", "Dentist", "Plumber"][i % 4],
+            "scraped_at": (now - timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(500)
+    ]
+    analytics_summary = {
+        "total_jobs": 1240,
+        "total_leads": 58210,
+        "success_rate": 93.4,
+        "average_score": 61.2,
+        "top_performing_queries": [{"query": f"coffee shops in city {i}", "count": 40 - i, "success_rate": 38 - i} for i in range(5)],
+        "recent_activity": [
+            {"id": 9000 + i, "type": "job_created", "status": "completed", "created_at": (now - timedelta(hours=i)).isoformat(), "queries_count": 3}
+            for i in range(10)
+        ],
+    }
+    crm_stats = {
+        "total_leads": 5821,
+        "recent_leads": 412,
+        "status_breakdown": {"new": 3010, "contacted": 1520, "qualified": 811, "converted": 480},
+        "source_breakdown": {"gmaps": 4100, "import": 1200, "social": 521},
+    }
+    return {"crm stats": crm_stats, "analytics summary": analytics_summary, "job results page": job_results}
+
+def codecs():
+    yield "legacy json text", None
+    for serializer, _, _ in SERIALIZERS.values():
+        for compression, _, _ in COMPRESSORS.values():
+            if _AVAILABLE[serializer] and _AVAILABLE[compression]:
+                yield f"{serializer}+{compression}", CacheCodec(serializer, compression, min_compress_bytes=1024)
+
+def timed(callable_, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = callable_()
+    return (time.perf_counter() - started) / iterations * 1e6, result
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    redis_client = None
+    if len(sys.argv) > 2:
+        import redis
+        redis_client = redis.from_url(sys.argv[2])
+        redis_client.ping()
+
+    for label, payload in make_payloads().items():
+        print(f"🔍 {label}")
+        print(f"  {'codec':<18} {'encode µs':>10} {'decode µs':>10} {'bytes':>9}" + (f" {'redis bytes':>12}" if redis_client else ""))
+        for name, codec in codecs():
+            if codec is None:
+                encode = lambda: json.dumps(payload)
+                decode = json.loads
+            else:
+                encode = lambda: codec.encode(payload)
+                decode = codec.decode
+            encode_us, encoded = timed(encode, iterations)
+            decode_us, _ = timed(lambda: decode(encoded), iterations)
+            size = len(encoded if isinstance(encoded, bytes) else encoded.encode())
+            line = f"  {name:<18} {encode_us:10.1f} {decode_us:10.1f} {size:9,}"
+            if redis_client:
+                redis_client.set("bench:codec", encoded)
+                line += f" {redis_client.memory_usage('bench:codec'):12,}"
+            print(line)
+    if redis_client:
+        redis_client.delete("bench:codec")
+
+if __name__ == "__main__":
+    main()
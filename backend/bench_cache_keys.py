@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cache hit rate of the legacy hash(str(args)) keys vs deterministic keys
+Two worker processes (with different hash seeds) serve the same stream of dashboard
+requests, each with a fresh session and user object as FastAPI's Depends provides.
+Usage: python bench_cache_keys.py [requests] [users]
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+def worker_keys(requests, users):
+    """Run inside a worker: the keys each builder produces for the request stream"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from cache import build_cache_key
+    from database import Base
+    from models import Users
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    setup = Session()
+    setup.add_all([Users(email=f"user{i}@example.com", hashed_password="x") for i in range(users)])
+    setup.commit()
+    setup.close()
+
+    def get_analytics_summary(db=None, user=None):
+        pass
+
+    stream = random.Random(42)
+    legacy, deterministic = [], []
+    for _ in range(requests):
+        db = Session()
+        user = db.get(Users, stream.randint(1, users))
+        args, kwargs = (), {"db": db, "user": user}
+        legacy.append(f"analytics:{hash(str(args) + str(sorted(kwargs.items())))}")
+        deterministic.append(build_cache_key(get_analytics_summary, args, kwargs, "analytics")[0])
+        db.close()
+    return {"legacy": legacy, "deterministic": deterministic}
+
+def hit_rate(*worker_streams):
+    """Fraction of requests (interleaved across workers) whose key was already cached"""
+    seen, hits, total = set(), 0, 0
+    for keys in zip(*worker_streams):
+        for key in keys:
+            hits += key in seen
+            seen.add(key)
+            total += 1
+    return hits / total
+
+def main():
+    if sys.argv[1:2] == ["--worker"]:
+        print(json.dumps(worker_keys(int(sys.argv[2]), int(sys.argv[3]))))
+        return
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    print(f"🔍 {requests} dashboard requests per worker, {users} users, 2 workers...")
+    results = []
+    for seed in ("1", "2"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", str(requests), str(users)],
+            env={**os.environ, "PYTHONHASHSEED": seed, "ENABLE_CACHING": "false"},
+            capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    for builder in ("legacy", "deterministic"):
+        print(f"  {builder:<14} hit rate: {hit_rate(*(result[builder] for result in results)) * 100:6.1f}%")
+    ideal = 1 - users / (2 * requests)
+    print(f"  {'ideal':<14} hit rate: {ideal * 100:6.1f}%  (one miss per user)")
+
+if __name__ == "__main__":
+    main()
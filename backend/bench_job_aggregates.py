@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: job aggregates computed in Python vs grouped SQL SUM/COUNT queries
+Builds one account with N jobs and times the export/analytics job statistics the old
+way (load every job, count and time them in Python) and with an uncached
+user_metrics.compute_snapshot (one grouped query per table).
+Usage: python bench_job_aggregates.py [jobs] [iterations]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Jobs, Users
+from user_metrics import compute_snapshot
+
+def python_totals(db, user_id):
+    jobs = db.query(Jobs).filter(Jobs.user_id == user_id).all()
+    completed = [job for job in jobs if job.status == "completed"]
+    durations = [
+        (job.completed_at - job.created_at).total_seconds() * 1000
+        for job in completed if job.completed_at and job.created_at
+    ]
+    return {
+        "total_jobs": len(jobs),
+        "completed_jobs": len(completed),
+        "failed_jobs": sum(1 for job in jobs if job.status == "failed"),
+        "results": sum(job.results_count or 0 for job in completed),
+        "average_duration_ms": sum(durations) / len(durations) if durations else None,
+    }
+
+def sql_totals(db, user_id):
+    snapshot = compute_snapshot(db, user_id)
+    return {"results": snapshot["job_results"], **snapshot}
+
+def run(label, aggregate, db, user_id, iterations):
+    aggregate(db, user_id)  # warm up
+    db.expunge_all()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        totals = aggregate(db, user_id)
+        db.expunge_all()
+    per_call = (time.perf_counter() - started) / iterations * 1000
+    print(f"  {label:<18} {per_call:8.2f} ms/request")
+    return per_call, totals
+
+def main():
+    job_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = Users(email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(job_count):
+        created_at = now - timedelta(minutes=i)
+        status = rng.choices(["completed", "failed", "pending"], weights=[8, 1, 1])[0]
+        job = {"user_id": user.id, "status": status, "queries": ["query"], "created_at": created_at}
+        if status == "completed":
+            duration = rng.randint(5000, 120000)
+            job.update(results_count=rng.randint(0, 200), started_at=created_at,
+                       completed_at=created_at + timedelta(milliseconds=duration), duration_ms=duration)
+        rows.append(job)
+    db.bulk_insert_mappings(Jobs, rows)
+    db.commit()
+
+    print(f"🔍 Job statistics for an account with {job_count} jobs ({iterations} requests)...")
+    python_ms, python_result = run("Python over rows", python_totals, db, user.id, iterations)
+    sql_ms, sql_result = run("grouped SQL", sql_totals, db, user.id, iterations)
+    assert python_result["results"] == sql_result["results"]
+    print(f"  Speedup:           {python_ms / sql_ms:8.1f}x")
+    db.close()
+
+if __name__ == "__main__":
+    main()
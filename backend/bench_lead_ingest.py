@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-row ORM inserts vs the bulk lead ingestor
+Usage: python bench_lead_ingest.py [count] [database_url]
+"""
+
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from lead_ingest import ingest_leads
+from models import Leads, Users
+
+def make_leads(count):
+    return [
+        {
+            "name": f"Business {i}",
+            "email": f"owner{i}@example.com",
+            "phone": f"+1555{i:07d}",
+            "company": f"Company {i % 500}",
+            "website": f"https://business{i}.example.com",
+            "address": f"{i} Main Street",
+            "source": "import",
+            "tags": ["bench"],
+        }
+        for i in range(count)
+    ]
+
+def bench_orm(db, user_id, leads):
+    started = time.perf_counter()
+    for lead_data in leads:
+        db.add(Leads(
+            user_id=user_id,
+            name=lead_data["name"],
+            email=lead_data["email"],
+            phone=lead_data["phone"],
+            company=lead_data["company"],
+            website=lead_data["website"],
+            source=lead_data["source"],
+        ))
+    db.commit()
+    return time.perf_counter() - started
+
+def bench_ingest(db, user_id, leads):
+    started = time.perf_counter()
+    result = ingest_leads(db, user_id, iter(leads))
+    assert result["inserted"] == len(leads), result["inserted"]
+    return time.perf_counter() - started
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    url = sys.argv[2] if len(sys.argv) > 2 else "sqlite://"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    # Separate users so the (user_id, email) unique index doesn't reject the second run
+    orm_user = Users(email="bench-orm@example.com", hashed_password="x")
+    ingest_user = Users(email="bench-ingest@example.com", hashed_password="x")
+    db.add_all([orm_user, ingest_user])
+    db.commit()
+
+    leads = make_leads(count)
+    print(f"🔍 Inserting {count} leads into {engine.dialect.name}...")
+    orm_seconds = bench_orm(db, orm_user.id, leads)
+    print(f"  ORM per-row:   {orm_seconds:8.2f}s  ({count / orm_seconds:,.0f} rows/s)")
+    ingest_seconds = bench_ingest(db, ingest_user.id, leads)
+    print(f"  Bulk ingestor: {ingest_seconds:8.2f}s  ({count / ingest_seconds:,.0f} rows/s)")
+    print(f"  Speedup:       {orm_seconds / ingest_seconds:8.1f}x")
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request CPU of ad-hoc ORM queries vs cached select() statements
+Simulates the queries behind one authenticated analytics request
+(get_current_user + four per-user counts).
+Usage: python bench_statements.py [iterations]
+"""
+
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Jobs, Leads, Users
+from queries import count_jobs, count_leads, user_by_id
+
+def legacy_request(db, user_id):
+    user = db.query(Users).filter(Users.id == user_id).first()
+    db.query(Jobs).filter(Jobs.user_id == user.id).count()
+    db.query(Jobs).filter(Jobs.user_id == user.id, Jobs.status == 'completed').count()
+    db.query(Leads).filter(Leads.user_id == user.id).count()
+    db.query(Leads).filter(Leads.user_id == user.id, Leads.status == 'converted').count()
+
+def cached_request(db, user_id):
+    user = user_by_id(db, user_id)
+    count_jobs(db, user.id)
+    count_jobs(db, user.id, status='completed')
+    count_leads(db, user.id)
+    count_leads(db, user.id, status='converted')
+
+def run(label, request, db, user_ids, iterations):
+    for user_id in user_ids:  # warm up statement caches
+        request(db, user_id)
+    started = time.process_time()
+    for i in range(iterations):
+        request(db, user_ids[i % len(user_ids)])
+        db.expunge_all()
+    per_request = (time.process_time() - started) / iterations * 1e6
+    print(f"  {label:<16} {per_request:8.1f} µs CPU/request")
+    return per_request
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    users = [Users(email=f"bench{i}@example.com", hashed_password="x") for i in range(10)]
+    db.add_all(users)
+    db.commit()
+    user_ids = [user.id for user in users]
+
+    print(f"🔍 {iterations} simulated requests (5 queries each)...")
+    legacy = run("ORM query()", legacy_request, db, user_ids, iterations)
+    cached = run("cached select", cached_request, db, user_ids, iterations)
+    print(f"  Saved:           {legacy - cached:8.1f} µs CPU/request ({(1 - cached / legacy) * 100:.0f}%)")
+    db.close()
+
+if __name__ == "__main__":
+    main()
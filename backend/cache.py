@@ -4,31 +4,280 @@ Supports Redis with memory fallback and comprehensive cache management
 """
 
 import redis
+import redis.asyncio as redis_asyncio
 import json
+import fnmatch
 import hashlib
+import inspect
 import time
 import logging
-from typing import Any, Optional, Union, Dict, List
+import threading
+import uuid
+import asyncio
+import math
+import random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Optional, Union, Dict, Iterable, List, Tuple
 from functools import wraps
+from fastapi import BackgroundTasks, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import InstanceState, Session
 from config import settings
+from cache_codec import CacheCodec
 import structlog
 
 logger = structlog.get_logger(__name__)
 
+_MISSING = object()
+
+def _estimate_size(value: Any) -> int:
+    """Approximate in-memory size of a cached value in bytes"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 64
+
+def cache_namespace(key: str) -> str:
+    """Metrics namespace of a logical key: its first segment ("analytics", "user", "leads", ...)"""
+    return key.split(":", 1)[0] or "default"
+
+def _storage_namespace(cache_key: str) -> str:
+    return cache_namespace(cache_key.split(":", 1)[-1])
+
+class MemoryCache:
+    """Size- and byte-bounded LRU with per-entry TTL.
+
+    get/set/delete are O(1): recency is kept by an OrderedDict and expiry is
+    lazy (checked on read) plus amortised through a timer wheel of one-second
+    buckets that is drained a little on every write."""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, resolution: float = 1.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.resolution = resolution
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._wheel: Dict[int, set] = {}
+        self._cursor = int(time.time() / resolution)
+        self._lock = threading.Lock()
+        self.on_evict: Optional[Callable[[str], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires, _ = entry
+            if expires <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        size = _estimate_size(value)
+        now = time.time()
+        expires = now + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires, size)
+            self.bytes += size
+            self._wheel.setdefault(int(expires / self.resolution), set()).add(key)
+            self._expire_due(now)
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+                if self.on_evict is not None:
+                    self.on_evict(oldest)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._wheel.clear()
+            self.bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, expires, size = self._entries.pop(key)
+        self.bytes -= size
+        slot = int(expires / self.resolution)
+        bucket = self._wheel.get(slot)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._wheel[slot]
+
+    def _expire_due(self, now: float, max_buckets: int = 8) -> None:
+        """Drop entries from up to max_buckets elapsed wheel buckets"""
+        current = int(now / self.resolution)
+        if current - self._cursor > len(self._wheel):
+            # Idle for longer than the wheel spans: jump to the oldest bucket, but never
+            # past now, or buckets filled later behind the cursor would never drain
+            self._cursor = min(min(self._wheel, default=current), current)
+        for _ in range(max_buckets):
+            if self._cursor >= current:
+                break
+            for key in self._wheel.pop(self._cursor, ()):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    _, _, size = self._entries.pop(key)
+                    self.bytes -= size
+                    self.expirations += 1
+            self._cursor += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class CircuitBreaker:
+    """Fails fast after consecutive errors.
+
+    Closed: calls go through. After `failure_threshold` consecutive failures it opens
+    and allow() returns False for `reset_seconds`; then a single trial call is let
+    through (half-open), which closes the breaker on success or re-opens it."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.trips = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        if self.failures or self._opened_at is not None:
+            with self._lock:
+                self.failures = 0
+                self._opened_at = None
+                self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self._opened_at is None and self.failures >= self.failure_threshold):
+                if not self._trial:
+                    self.trips += 1
+                    logger.warning(f"Redis circuit breaker opened after {self.failures} consecutive errors")
+                self._opened_at = time.monotonic()
+                self._trial = False
+
 class CacheManager:
-    """Production-ready cache manager with Redis and memory fallback"""
+    """Two-tier cache: in-process L1 (MemoryCache) in front of Redis L2.
+
+    Writes and deletes are broadcast on a Redis pub/sub channel so every worker
+    drops its L1 copy of the key; L1 entries also carry a short TTL as a bound on
+    staleness if a message is missed. Without Redis, L1 is the only tier.
+
+    Entries can be tagged (e.g. "user:42", "tenant:acme"). Each tag has a version
+    counter that is folded into the storage key, so invalidate_tags() is a single
+    INCR per tag: entries written under the old version are never read again and
+    simply age out by TTL."""
     
     def __init__(self):
         self.redis_client = None
-        self.memory_cache = {}
+        self.async_redis = None
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.CACHE_BREAKER_FAILURES,
+            reset_seconds=settings.CACHE_BREAKER_RESET_SECONDS
+        )
+        self.memory_cache = MemoryCache(
+            max_entries=settings.CACHE_MEMORY_MAX_ENTRIES,
+            max_bytes=settings.CACHE_MEMORY_MAX_BYTES
+        )
+        self.l1_ttl = settings.CACHE_L1_TTL_SECONDS
+        self.channel = settings.CACHE_INVALIDATION_CHANNEL
+        self.worker_id = uuid.uuid4().hex
+        self.codec = CacheCodec(
+            serializer=settings.CACHE_CODEC,
+            compression=settings.CACHE_COMPRESSION,
+            min_compress_bytes=settings.CACHE_COMPRESS_MIN_BYTES
+        )
+        # Tag versions: cached from Redis for l1_ttl, or authoritative here without Redis
+        self.tag_versions = MemoryCache(max_entries=settings.CACHE_MEMORY_MAX_ENTRIES)
+        self._local_tag_versions: Dict[str, int] = {}
         self.cache_stats = {
             "hits": 0,
+            "l1_hits": 0,
+            "l2_hits": 0,
             "misses": 0,
             "sets": 0,
             "deletes": 0,
-            "errors": 0
+            "errors": 0,
+            "invalidations_sent": 0,
+            "invalidations_received": 0,
+            "tag_invalidations": 0,
+            "recomputes": 0,
+            "coalesced": 0,
+            "stale_served": 0,
+            "early_refreshes": 0,
+            "background_refreshes": 0
+        }
+        self._listeners: Dict[str, List[Callable[[str, float], None]]] = {
+            kind: [] for kind in ("l1_hit", "l2_hit", "miss", "set", "evict", "error", "get_seconds", "set_seconds", "value_bytes")
         }
+        self.memory_cache.on_evict = lambda cache_key: self._emit("evict", _storage_namespace(cache_key))
+        # Called with (logical key, hit) on every get; cache_warming counts prevented misses
+        self.on_lookup: Optional[Callable[[str, bool], None]] = None
+        self._listener_thread = None
+        self._listener_stop = threading.Event()
         self._initialize_redis()
+        if self.redis_client:
+            self.start_invalidation_listener()
     
     def _initialize_redis(self):
         """Initialize Redis connection with error handling"""
@@ -36,7 +285,7 @@ class CacheManager:
             if settings.ENABLE_CACHING and settings.REDIS_URL:
                 self.redis_client = redis.from_url(
                     settings.REDIS_URL,
-                    decode_responses=True,
+                    decode_responses=False,  # values are binary (see cache_codec)
                     socket_connect_timeout=5,
                     socket_timeout=5,
                     retry_on_timeout=True,
@@ -44,6 +293,15 @@ class CacheManager:
                 )
                 # Test connection
                 self.redis_client.ping()
+                # Pooled client for async callers; connects lazily on the running loop
+                self.async_redis = redis_asyncio.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=False,
+                    max_connections=settings.CACHE_REDIS_MAX_CONNECTIONS,
+                    socket_connect_timeout=settings.CACHE_REDIS_CONNECT_TIMEOUT_MS / 1000.0,
+                    socket_timeout=settings.CACHE_REDIS_TIMEOUT_MS / 1000.0,
+                    health_check_interval=30
+                )
                 logger.info("✅ Redis cache initialized successfully")
             else:
                 logger.info("⚠️ Redis cache disabled, using memory fallback")
@@ -52,122 +310,479 @@ class CacheManager:
             logger.warning(f"⚠️ Redis connection failed: {e}, using memory fallback")
             self.redis_client = None
     
-    def _generate_key(self, key: str, prefix: str = "leadtap") -> str:
-        """Generate a consistent cache key"""
-        return f"{prefix}:{hashlib.md5(key.encode()).hexdigest()}"
+    def _use_redis(self) -> bool:
+        """Whether to try Redis now: configured and the circuit breaker isn't open"""
+        return self.redis_client is not None and self.breaker.allow()
     
-    def get(self, key: str, default: Any = None) -> Any:
-        """Get value from cache with fallback"""
+    def _redis_failed(self, operation: str, error: Exception, namespace: str = "redis"):
+        logger.warning(f"Redis {operation} failed: {error}")
+        self.breaker.record_failure()
+        self._emit("error", namespace)
+    
+    # --- Observers (Prometheus metrics are attached in monitoring.py) ---
+    
+    def add_listener(self, kind: str, callback: Callable[[str, float], None]):
+        """Register callback(namespace, value) for a cache event: l1_hit, l2_hit, miss,
+        set, evict, error (value 1), get_seconds, set_seconds or value_bytes"""
+        self._listeners[kind].append(callback)
+    
+    def _emit(self, kind: str, namespace: str, value: float = 1.0):
+        for callback in self._listeners[kind]:
+            try:
+                callback(namespace, value)
+            except Exception:
+                logger.exception(f"Cache listener failed for {kind}")
+    
+    def _generate_key(self, key: str, prefix: str = "leadtap", tags: Iterable[str] = None) -> str:
+        """Generate the storage key: readable (so clear() patterns match) and
+        suffixed with the current version of each tag"""
+        cache_key = f"{prefix}:{key}"
+        if tags:
+            cache_key += self._tag_suffix(self._get_tag_versions(tags))
+        return cache_key
+    
+    async def _agenerate_key(self, key: str, prefix: str = "leadtap", tags: Iterable[str] = None) -> str:
+        cache_key = f"{prefix}:{key}"
+        if tags:
+            cache_key += self._tag_suffix(await self._aget_tag_versions(tags))
+        return cache_key
+    
+    # --- Tag versions ---
+    
+    def _tag_version_key(self, tag: str) -> str:
+        return f"leadtap:tagver:{tag}"
+    
+    def _tag_suffix(self, versions: Dict[str, Any]) -> str:
+        return "@" + ",".join(f"{tag}={versions[tag]}" for tag in sorted(versions))
+    
+    def _unknown_tag_versions(self, tags: Iterable[str]) -> Dict[str, str]:
+        # Can't know the current versions: use a key no one else will hit
+        return {tag: f"unknown-{uuid.uuid4().hex}" for tag in tags}
+    
+    def _known_tag_versions(self, tags: set) -> Tuple[Dict[str, int], List[str]]:
+        versions, missing = {}, []
+        for tag in tags:
+            version = self.tag_versions.get(tag)
+            if version is None:
+                missing.append(tag)
+            else:
+                versions[tag] = version
+        return versions, missing
+    
+    def _remember_tag_versions(self, versions: Dict[str, int], missing: List[str], values: List[Any]) -> Dict[str, int]:
+        for tag, value in zip(missing, values):
+            versions[tag] = int(value or 0)
+            self.tag_versions.set(tag, versions[tag], self.l1_ttl)
+        return versions
+    
+    def _get_tag_versions(self, tags: Iterable[str]) -> Dict[str, Any]:
+        tags = set(tags)
+        if not self.redis_client:
+            return {tag: self._local_tag_versions.get(tag, 0) for tag in tags}
+        versions, missing = self._known_tag_versions(tags)
+        if missing:
+            if not self.breaker.allow():
+                return self._unknown_tag_versions(tags)
+            try:
+                values = self.redis_client.mget([self._tag_version_key(tag) for tag in missing])
+                self.breaker.record_success()
+            except Exception as e:
+                self._redis_failed("tag version lookup", e)
+                return self._unknown_tag_versions(tags)
+            self._remember_tag_versions(versions, missing, values)
+        return versions
+    
+    async def _aget_tag_versions(self, tags: Iterable[str]) -> Dict[str, Any]:
+        tags = set(tags)
+        if not self.async_redis:
+            return self._get_tag_versions(tags)
+        versions, missing = self._known_tag_versions(tags)
+        if missing:
+            if not self.breaker.allow():
+                return self._unknown_tag_versions(tags)
+            try:
+                values = await self.async_redis.mget([self._tag_version_key(tag) for tag in missing])
+                self.breaker.record_success()
+            except Exception as e:
+                self._redis_failed("tag version lookup", e)
+                return self._unknown_tag_versions(tags)
+            self._remember_tag_versions(versions, missing, values)
+        return versions
+    
+    def _apply_tag_versions(self, versions: Dict[str, int]):
+        for tag, version in versions.items():
+            if version > (self.tag_versions.get(tag) or 0):
+                self.tag_versions.set(tag, version, self.l1_ttl)
+    
+    def invalidate_tags(self, *tags: str) -> Dict[str, int]:
+        """Invalidate every entry carrying any of the given tags (O(1) per tag).
+    
+        Returns the new version of each tag."""
+        tags = sorted(set(tags))
+        if not tags:
+            return {}
+        versions = {}
+        if self.redis_client:
+            try:
+                if not self.breaker.allow():
+                    raise ConnectionError("circuit breaker open")
+                pipe = self.redis_client.pipeline(transaction=False)
+                for tag in tags:
+                    pipe.incr(self._tag_version_key(tag))
+                versions = dict(zip(tags, pipe.execute()))
+                self.breaker.record_success()
+                self._apply_tag_versions(versions)
+                self._publish_invalidation(tag_versions=versions)
+            except Exception as e:
+                self._redis_failed("tag invalidation", e)
+                self.cache_stats["errors"] += 1
+                # Local reads must not keep serving the old version
+                for tag in tags:
+                    self.tag_versions.delete(tag)
+        else:
+            for tag in tags:
+                self._local_tag_versions[tag] = versions[tag] = self._local_tag_versions.get(tag, 0) + 1
+        self.cache_stats["tag_invalidations"] += len(tags)
+        return versions
+    
+    # --- Cross-worker L1 invalidation ---
+    
+    def start_invalidation_listener(self):
+        """Start the background thread that applies invalidations from other workers"""
+        if self._listener_thread and self._listener_thread.is_alive():
+            return
+        self._listener_stop.clear()
+        self._listener_thread = threading.Thread(target=self._listen_for_invalidations, name="cache-invalidation")
+        self._listener_thread.daemon = True
+        self._listener_thread.start()
+    
+    def stop_invalidation_listener(self):
+        self._listener_stop.set()
+        if self._listener_thread:
+            self._listener_thread.join(timeout=5)
+    
+    def _listen_for_invalidations(self):
+        while not self._listener_stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Messages may have been missed while (re)connecting
+                self.memory_cache.clear()
+                self.tag_versions.clear()
+                while not self._listener_stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._handle_invalidation(message["data"])
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error: {e}, reconnecting")
+                self._listener_stop.wait(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+    
+    def _handle_invalidation(self, data: str):
+        """Apply an invalidation message published by another worker"""
+        message = json.loads(data)
+        if message.get("origin") == self.worker_id:
+            return
+        self.cache_stats["invalidations_received"] += 1
+        if message.get("all"):
+            self.memory_cache.clear()
+            return
+        self._apply_tag_versions(message.get("tags", {}))
+        if message.get("pattern"):
+            self._clear_memory_pattern(message["pattern"])
+        for cache_key in message.get("keys", []):
+            self.memory_cache.delete(cache_key)
+    
+    def _invalidation_payload(self, keys, all_keys, pattern, tag_versions) -> str:
+        payload = {"origin": self.worker_id, "keys": keys or [], "all": all_keys}
+        if pattern:
+            payload["pattern"] = pattern
+        if tag_versions:
+            payload["tags"] = tag_versions
+        return json.dumps(payload)
+    
+    def _publish_invalidation(
+        self,
+        keys: List[str] = None,
+        all_keys: bool = False,
+        pattern: str = None,
+        tag_versions: Dict[str, int] = None
+    ):
+        if not self.redis_client:
+            return
         try:
-            cache_key = self._generate_key(key)
-            
-            # Try Redis first
-            if self.redis_client:
+            self.redis_client.publish(self.channel, self._invalidation_payload(keys, all_keys, pattern, tag_versions))
+            self.cache_stats["invalidations_sent"] += 1
+        except Exception as e:
+            logger.warning(f"Cache invalidation publish failed: {e}")
+    
+    async def _apublish_invalidation(self, keys: List[str] = None):
+        try:
+            await self.async_redis.publish(self.channel, self._invalidation_payload(keys, False, None, None))
+            self.cache_stats["invalidations_sent"] += 1
+        except Exception as e:
+            logger.warning(f"Cache invalidation publish failed: {e}")
+    
+    # --- Cache operations ---
+    #
+    # get/set/delete use the sync client; async code should use aget/aset/adelete,
+    # which go through the redis.asyncio pool with millisecond timeouts. Both share
+    # the circuit breaker: after CACHE_BREAKER_FAILURES consecutive Redis errors the
+    # cache serves from L1 only until a trial call succeeds again.
+    
+    def _l1_get(self, cache_key: str, namespace: str) -> Any:
+        value = self.memory_cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            self.cache_stats["hits"] += 1
+            self.cache_stats["l1_hits"] += 1
+            self._emit("l1_hit", namespace)
+        return value
+    
+    def _promote(self, cache_key: str, raw: bytes, pttl: int, namespace: str) -> Any:
+        """Decode an L2 hit and copy it into L1 for at most l1_ttl"""
+        value = self.codec.decode(raw)
+        l1_ttl = min(self.l1_ttl, pttl / 1000.0) if pttl and pttl > 0 else self.l1_ttl
+        self.memory_cache.set(cache_key, value, l1_ttl)
+        self.cache_stats["hits"] += 1
+        self.cache_stats["l2_hits"] += 1
+        self._emit("l2_hit", namespace)
+        return value
+    
+    def _looked_up(self, key: str, value: Any, hit: bool = True) -> Any:
+        if self.on_lookup is not None:
+            try:
+                self.on_lookup(key, hit)
+            except Exception:
+                logger.exception("Cache lookup hook failed")
+        return value
+    
+    def _miss(self, namespace: str):
+        self.cache_stats["misses"] += 1
+        self._emit("miss", namespace)
+    
+    def _failed(self, namespace: str):
+        self.cache_stats["errors"] += 1
+        self._emit("error", namespace)
+    
+    def _stored(self, namespace: str, value: Any, encoded: Optional[bytes]):
+        self.cache_stats["sets"] += 1
+        self._emit("set", namespace)
+        if self._listeners["value_bytes"]:
+            self._emit("value_bytes", namespace, len(encoded) if encoded is not None else _estimate_size(value))
+    
+    def _l1_ttl_for(self, ttl: int) -> float:
+        # With a Redis tier, L1 copies are short-lived even if this write missed Redis
+        return min(ttl, self.l1_ttl) if self.redis_client else ttl
+    
+    def get(self, key: str, default: Any = None, tags: Iterable[str] = None) -> Any:
+        """Get value from L1, then Redis (promoting L2 hits into L1)"""
+        namespace = cache_namespace(key)
+        started = time.perf_counter()
+        try:
+            cache_key = self._generate_key(key, tags=tags)
+    
+            value = self._l1_get(cache_key, namespace)
+            if value is not _MISSING:
+                return self._looked_up(key, value)
+    
+            if self._use_redis():
                 try:
-                    value = self.redis_client.get(cache_key)
-                    if value:
-                        self.cache_stats["hits"] += 1
-                        return json.loads(value)
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    pipe.get(cache_key)
+                    pipe.pttl(cache_key)
+                    raw, pttl = pipe.execute()
+                    self.breaker.record_success()
+                    if raw is not None:
+                        return self._looked_up(key, self._promote(cache_key, raw, pttl, namespace))
                 except Exception as e:
-                    logger.warning(f"Redis get failed: {e}")
-            
-            # Fallback to memory cache
-            if cache_key in self.memory_cache:
-                item = self.memory_cache[cache_key]
-                if item["expires"] > time.time():
-                    self.cache_stats["hits"] += 1
-                    return item["value"]
-                else:
-                    del self.memory_cache[cache_key]
-            
-            self.cache_stats["misses"] += 1
+                    self._redis_failed("get", e, namespace)
+    
+            self._miss(namespace)
+            return self._looked_up(key, default, hit=False)
+    
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
+            self._failed(namespace)
             return default
-            
+        finally:
+            self._emit("get_seconds", namespace, time.perf_counter() - started)
+    
+    async def aget(self, key: str, default: Any = None, tags: Iterable[str] = None) -> Any:
+        """Async get: never blocks the event loop on Redis for longer than CACHE_REDIS_TIMEOUT_MS"""
+        if not self.async_redis:
+            return self.get(key, default, tags)
+        namespace = cache_namespace(key)
+        started = time.perf_counter()
+        try:
+            cache_key = await self._agenerate_key(key, tags=tags)
+    
+            value = self._l1_get(cache_key, namespace)
+            if value is not _MISSING:
+                return self._looked_up(key, value)
+    
+            if self.breaker.allow():
+                try:
+                    async with self.async_redis.pipeline(transaction=False) as pipe:
+                        pipe.get(cache_key)
+                        pipe.pttl(cache_key)
+                        raw, pttl = await pipe.execute()
+                    self.breaker.record_success()
+                    if raw is not None:
+                        return self._looked_up(key, self._promote(cache_key, raw, pttl, namespace))
+                except Exception as e:
+                    self._redis_failed("get", e, namespace)
+    
+            self._miss(namespace)
+            return self._looked_up(key, default, hit=False)
+    
         except Exception as e:
             logger.error(f"Cache get error: {e}")
-            self.cache_stats["errors"] += 1
+            self._failed(namespace)
             return default
+        finally:
+            self._emit("get_seconds", namespace, time.perf_counter() - started)
+    
+    def set(self, key: str, value: Any, ttl: int = None, tags: Iterable[str] = None) -> bool:
+        """Set value in both tiers with TTL and invalidate other workers' L1.
     
-    def set(self, key: str, value: Any, ttl: int = None) -> bool:
-        """Set value in cache with TTL"""
+        Tagged entries must be read with the same tags."""
+        namespace = cache_namespace(key)
+        started = time.perf_counter()
         try:
-            cache_key = self._generate_key(key)
+            cache_key = self._generate_key(key, tags=tags)
             ttl = ttl or settings.CACHE_TIMEOUT_SECONDS
-            
-            # Try Redis first
-            if self.redis_client:
+    
+            encoded = None
+            if self._use_redis():
                 try:
-                    serialized_value = json.dumps(value)
-                    self.redis_client.setex(cache_key, ttl, serialized_value)
-                    self.cache_stats["sets"] += 1
-                    return True
+                    encoded = self.codec.encode(value)
+                    self.redis_client.setex(cache_key, ttl, encoded)
+                    self.breaker.record_success()
+                    self._publish_invalidation([cache_key])
                 except Exception as e:
-                    logger.warning(f"Redis set failed: {e}")
-            
-            # Fallback to memory cache
-            self.memory_cache[cache_key] = {
-                "value": value,
-                "expires": time.time() + ttl
-            }
-            self.cache_stats["sets"] += 1
-            
-            # Clean expired items from memory cache
-            self._cleanup_memory_cache()
-            
+                    self._redis_failed("set", e, namespace)
+    
+            self.memory_cache.set(cache_key, value, self._l1_ttl_for(ttl))
+            self._stored(namespace, value, encoded)
             return True
-            
+    
         except Exception as e:
             logger.error(f"Cache set error: {e}")
-            self.cache_stats["errors"] += 1
+            self._failed(namespace)
             return False
+        finally:
+            self._emit("set_seconds", namespace, time.perf_counter() - started)
     
-    def delete(self, key: str) -> bool:
-        """Delete value from cache"""
+    async def aset(self, key: str, value: Any, ttl: int = None, tags: Iterable[str] = None) -> bool:
+        """Async set (see aget)"""
+        if not self.async_redis:
+            return self.set(key, value, ttl, tags)
+        namespace = cache_namespace(key)
+        started = time.perf_counter()
         try:
-            cache_key = self._generate_key(key)
-            
-            # Try Redis first
-            if self.redis_client:
+            cache_key = await self._agenerate_key(key, tags=tags)
+            ttl = ttl or settings.CACHE_TIMEOUT_SECONDS
+    
+            encoded = None
+            if self.breaker.allow():
+                try:
+                    encoded = self.codec.encode(value)
+                    await self.async_redis.setex(cache_key, ttl, encoded)
+                    self.breaker.record_success()
+                    await self._apublish_invalidation([cache_key])
+                except Exception as e:
+                    self._redis_failed("set", e, namespace)
+    
+            self.memory_cache.set(cache_key, value, self._l1_ttl_for(ttl))
+            self._stored(namespace, value, encoded)
+            return True
+    
+        except Exception as e:
+            logger.error(f"Cache set error: {e}")
+            self._failed(namespace)
+            return False
+        finally:
+            self._emit("set_seconds", namespace, time.perf_counter() - started)
+    
+    def delete(self, key: str, tags: Iterable[str] = None) -> bool:
+        """Delete value from both tiers on every worker"""
+        namespace = cache_namespace(key)
+        try:
+            cache_key = self._generate_key(key, tags=tags)
+    
+            if self._use_redis():
                 try:
                     self.redis_client.delete(cache_key)
+                    self.breaker.record_success()
+                    self._publish_invalidation([cache_key])
                 except Exception as e:
-                    logger.warning(f"Redis delete failed: {e}")
-            
-            # Remove from memory cache
-            if cache_key in self.memory_cache:
-                del self.memory_cache[cache_key]
-            
+                    self._redis_failed("delete", e, namespace)
+    
+            self.memory_cache.delete(cache_key)
+    
             self.cache_stats["deletes"] += 1
             return True
-            
+    
         except Exception as e:
             logger.error(f"Cache delete error: {e}")
-            self.cache_stats["errors"] += 1
+            self._failed(namespace)
+            return False
+    
+    async def adelete(self, key: str, tags: Iterable[str] = None) -> bool:
+        """Async delete (see aget)"""
+        if not self.async_redis:
+            return self.delete(key, tags)
+        namespace = cache_namespace(key)
+        try:
+            cache_key = await self._agenerate_key(key, tags=tags)
+    
+            if self.breaker.allow():
+                try:
+                    await self.async_redis.delete(cache_key)
+                    self.breaker.record_success()
+                    await self._apublish_invalidation([cache_key])
+                except Exception as e:
+                    self._redis_failed("delete", e, namespace)
+    
+            self.memory_cache.delete(cache_key)
+    
+            self.cache_stats["deletes"] += 1
+            return True
+    
+        except Exception as e:
+            logger.error(f"Cache delete error: {e}")
+            self._failed(namespace)
             return False
     
     def clear(self, pattern: str = None) -> bool:
-        """Clear cache with optional pattern"""
+        """Clear the whole cache, or the keys matching a glob pattern (e.g. "leads:stats:*").
+
+        Redis is walked incrementally with SCAN rather than the blocking KEYS."""
         try:
-            if pattern:
-                cache_pattern = self._generate_key(pattern)
-            else:
-                cache_pattern = "leadtap:*"
+            cache_pattern = self._generate_key(pattern) if pattern else "leadtap:*"
             
-            # Try Redis first
             if self.redis_client:
                 try:
-                    keys = self.redis_client.keys(cache_pattern)
-                    if keys:
-                        self.redis_client.delete(*keys)
+                    batch = []
+                    for cache_key in self.redis_client.scan_iter(match=cache_pattern, count=1000):
+                        batch.append(cache_key)
+                        if len(batch) >= 500:
+                            self.redis_client.unlink(*batch)
+                            batch = []
+                    if batch:
+                        self.redis_client.unlink(*batch)
+                    self._publish_invalidation(all_keys=not pattern, pattern=cache_pattern if pattern else None)
                 except Exception as e:
                     logger.warning(f"Redis clear failed: {e}")
             
-            # Clear memory cache
             if pattern:
-                pattern_key = self._generate_key(pattern)
-                keys_to_delete = [k for k in self.memory_cache.keys() if pattern_key in k]
-                for key in keys_to_delete:
-                    del self.memory_cache[key]
+                self._clear_memory_pattern(cache_pattern)
             else:
                 self.memory_cache.clear()
             
@@ -177,51 +792,102 @@ class CacheManager:
             logger.error(f"Cache clear error: {e}")
             return False
     
-    def exists(self, key: str) -> bool:
+    def _clear_memory_pattern(self, cache_pattern: str):
+        for cache_key in self.memory_cache.keys():
+            if fnmatch.fnmatchcase(cache_key, cache_pattern):
+                self.memory_cache.delete(cache_key)
+    
+    def exists(self, key: str, tags: Iterable[str] = None) -> bool:
         """Check if key exists in cache"""
         try:
-            cache_key = self._generate_key(key)
+            cache_key = self._generate_key(key, tags=tags)
+            
+            if cache_key in self.memory_cache:
+                return True
             
-            # Try Redis first
             if self.redis_client:
                 try:
                     return bool(self.redis_client.exists(cache_key))
                 except Exception as e:
                     logger.warning(f"Redis exists failed: {e}")
             
-            # Check memory cache
-            if cache_key in self.memory_cache:
-                item = self.memory_cache[cache_key]
-                if item["expires"] > time.time():
-                    return True
-                else:
-                    del self.memory_cache[cache_key]
-            
             return False
             
         except Exception as e:
             logger.error(f"Cache exists error: {e}")
             return False
     
+    # --- Distributed recompute locks ---
+    
+    _RELEASE_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+    
+    def acquire_lock(self, key: str, ttl_ms: int) -> Optional[str]:
+        """Take the cross-worker recompute lock for a key; returns a token or None if held.
+    
+        Without Redis (or if Redis fails) the lock is always granted and only the
+        in-process single-flight applies."""
+        token = uuid.uuid4().hex
+        if not self._use_redis():
+            return token
+        try:
+            acquired = self.redis_client.set(f"leadtap:lock:{key}", token, nx=True, px=ttl_ms)
+            self.breaker.record_success()
+            return token if acquired else None
+        except Exception as e:
+            self._redis_failed("lock acquire", e)
+            return token
+    
+    async def aacquire_lock(self, key: str, ttl_ms: int) -> Optional[str]:
+        if not self.async_redis:
+            return self.acquire_lock(key, ttl_ms)
+        token = uuid.uuid4().hex
+        if not self.breaker.allow():
+            return token
+        try:
+            acquired = await self.async_redis.set(f"leadtap:lock:{key}", token, nx=True, px=ttl_ms)
+            self.breaker.record_success()
+            return token if acquired else None
+        except Exception as e:
+            self._redis_failed("lock acquire", e)
+            return token
+    
+    def release_lock(self, key: str, token: str):
+        """Release a lock taken by acquire_lock, unless it has already passed to another holder"""
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.eval(self._RELEASE_LOCK_SCRIPT, 1, f"leadtap:lock:{key}", token)
+        except Exception as e:
+            logger.warning(f"Redis lock release failed: {e}")
+    
+    async def arelease_lock(self, key: str, token: str):
+        if not self.async_redis:
+            return self.release_lock(key, token)
+        try:
+            await self.async_redis.eval(self._RELEASE_LOCK_SCRIPT, 1, f"leadtap:lock:{key}", token)
+        except Exception as e:
+            logger.warning(f"Redis lock release failed: {e}")
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         return {
             **self.cache_stats,
             "memory_cache_size": len(self.memory_cache),
+            "memory_cache": self.memory_cache.stats(),
             "redis_enabled": self.redis_client is not None,
+            "circuit_breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "trips": self.breaker.trips
+            },
             "cache_enabled": settings.ENABLE_CACHING
         }
     
-    def _cleanup_memory_cache(self):
-        """Clean up expired items from memory cache"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, item in self.memory_cache.items()
-            if item["expires"] <= current_time
-        ]
-        for key in expired_keys:
-            del self.memory_cache[key]
-    
     def health_check(self) -> Dict[str, Any]:
         """Health check for cache system"""
         try:
@@ -249,48 +915,388 @@ class CacheManager:
 # Global cache instance
 cache_manager = CacheManager()
 
+# --- Deterministic keys for the decorators ---
+#
+# Keys are built from the call's bound arguments in a canonical JSON form, hashed with
+# SHA-256, so the same call maps to the same key in every worker and across restarts.
+# Injected dependencies (sessions, requests, background tasks) are left out, ORM
+# instances are keyed by table and primary key, and a Users argument both scopes the
+# key ("<prefix>:u<id>:<digest>") and tags the entry with CacheTags.user(id), so lead,
+# job and plan writes for that user invalidate it.
+
+IGNORED_KEY_PARAMS = {"self", "cls", "db", "session", "request", "response", "background_tasks"}
+IGNORED_KEY_TYPES = (Session, Request, Response, BackgroundTasks)
+
+class UncacheableArgument(TypeError):
+    """An argument has no stable canonical form, so the call can't be cached"""
+
+def _canonical(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Enum):
+        return _canonical(value.value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return _canonical(value.dict())
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    state = sa_inspect(value, raiseerr=False)
+    if isinstance(state, InstanceState) and state.identity:
+        return {state.mapper.local_table.name: list(state.identity)}
+    raise UncacheableArgument(f"Can't build a cache key from {type(value).__name__}")
+
+def _user_id(value: Any) -> Optional[int]:
+    state = sa_inspect(value, raiseerr=False)
+    if isinstance(state, InstanceState) and state.identity and state.mapper.local_table.name == "users":
+        return state.identity[0]
+    return None
+
+def _key_arguments(func, args: tuple, kwargs: dict) -> Dict[str, Any]:
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+    except TypeError:
+        return {**{f"arg{i}": arg for i, arg in enumerate(args)}, **kwargs}
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+def build_cache_key(func, args: tuple, kwargs: dict, key_prefix: str = None) -> Tuple[str, Optional[int], Dict[str, Any]]:
+    """Return (key, user id or None, bound arguments) for a call to a cached function"""
+    arguments = _key_arguments(func, args, kwargs)
+    canonical = {}
+    user_id = None
+    for name, value in arguments.items():
+        if name in IGNORED_KEY_PARAMS or isinstance(value, IGNORED_KEY_TYPES):
+            continue
+        if user_id is None:
+            user_id = _user_id(value)
+        canonical[name] = _canonical(value)
+    digest = hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:32]
+    prefix = key_prefix or f"{func.__module__}.{func.__qualname__}"
+    scope = f"u{user_id}:" if user_id is not None else ""
+    return f"{prefix}:{scope}{digest}", user_id, arguments
+
+def _prepare_call(func, key_prefix, tags, args, kwargs) -> Optional[Tuple[str, Optional[List[str]]]]:
+    """Key and tags for a call, or None if its arguments can't be cached.
+
+    A tags callable receives the call's arguments by name."""
+    try:
+        cache_key, user_id, arguments = build_cache_key(func, args, kwargs, key_prefix)
+    except UncacheableArgument as e:
+        logger.warning(f"Not caching {func.__qualname__}: {e}")
+        return None
+    entry_tags = set(tags(**arguments) if callable(tags) else tags or ())
+    if user_id is not None:
+        entry_tags.add(CacheTags.user(user_id))
+    return cache_key, sorted(entry_tags) or None
+
+# --- Stampede protection for the decorators ---
+#
+# Decorated results are stored as {"v": value, "exp": fresh-until, "delta": compute
+# seconds} and kept for ttl + stale seconds. A fresh entry is served directly, except
+# that it is refreshed early with probability growing as expiry nears (XFetch:
+# delta * beta * -ln(rand) >= time left), so hot keys are usually recomputed before
+# they expire. Only one caller per key recomputes: an in-process lock coalesces
+# concurrent callers in a worker and a Redis lock coalesces workers. While a refresh
+# is in flight everyone else is served the stale (or still-fresh) entry; with no entry
+# at all they wait for the winner's result, up to CACHE_LOCK_TIMEOUT_MS.
+#
+# When there is an entry to serve and the call carries no request-scoped state
+# (sessions, requests, ORM rows), the refresh runs on a background thread (or task)
+# and even the winner gets the entry at once. Calls that do carry such state are
+# recomputed inline by the winner, since their session is closed once the response
+# is sent.
+
+class _SingleFlight:
+    """Per-key locks shared by the callers of a cached function in this process"""
+    
+    def __init__(self):
+        self._locks: Dict[str, Tuple[threading.Lock, int]] = {}
+        self._async_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        self._guard = threading.Lock()
+    
+    def _checkout(self, table, key, factory):
+        with self._guard:
+            lock, users = table.get(key, (None, 0))
+            table[key] = (lock or factory(), users + 1)
+            return table[key][0]
+    
+    def _checkin(self, table, key):
+        with self._guard:
+            lock, users = table[key]
+            if users == 1:
+                del table[key]
+            else:
+                table[key] = (lock, users - 1)
+    
+    @contextmanager
+    def hold(self, key: str, blocking: bool = True):
+        lock = self._checkout(self._locks, key, threading.Lock)
+        acquired = lock.acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+            self._checkin(self._locks, key)
+    
+    @asynccontextmanager
+    async def hold_async(self, key: str, blocking: bool = True):
+        lock = self._checkout(self._async_locks, key, asyncio.Lock)
+        acquired = False
+        try:
+            if blocking or not lock.locked():
+                await lock.acquire()
+                acquired = True
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+            self._checkin(self._async_locks, key)
+
+_flights = _SingleFlight()
+
+def _is_entry(entry: Any) -> bool:
+    return isinstance(entry, dict) and "exp" in entry and "v" in entry
+
+def _is_fresh(entry: Any, beta: float = 0.0) -> bool:
+    if not _is_entry(entry):
+        return False
+    remaining = entry["exp"] - time.time()
+    if remaining <= 0:
+        return False
+    if beta and entry.get("delta"):
+        return entry["delta"] * beta * -math.log(1.0 - random.random()) < remaining
+    return True
+
+def _refreshed_since(entry: Any, previous: Any) -> bool:
+    """True if another caller stored a newer result while we waited for the lock"""
+    return _is_fresh(entry) and (previous is None or entry["exp"] > previous["exp"])
+
+def _note_served(entry: Any):
+    cache_manager.cache_stats["coalesced"] += 1
+    if not _is_fresh(entry):
+        cache_manager.cache_stats["stale_served"] += 1
+
+def _store(cache_key: str, value: Any, ttl: int, stale: int, delta: float, tags: Optional[List[str]]):
+    entry = {"v": value, "exp": time.time() + ttl, "delta": delta}
+    cache_manager.set(cache_key, entry, ttl + stale, tags=tags)
+    cache_manager.cache_stats["recomputes"] += 1
+
+async def _astore(cache_key: str, value: Any, ttl: int, stale: int, delta: float, tags: Optional[List[str]]):
+    entry = {"v": value, "exp": time.time() + ttl, "delta": delta}
+    await cache_manager.aset(cache_key, entry, ttl + stale, tags=tags)
+    cache_manager.cache_stats["recomputes"] += 1
+
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+_refresh_tasks: set = set()  # strong references to running async refreshes
+_refreshing: set = set()  # keys with a background refresh queued or running
+_refreshing_guard = threading.Lock()
+
+def _detachable(args: tuple, kwargs: dict) -> bool:
+    """True if a call can still run after the request that made it has ended"""
+    for value in (*args, *kwargs.values()):
+        if isinstance(value, IGNORED_KEY_TYPES) or isinstance(sa_inspect(value, raiseerr=False), InstanceState):
+            return False
+    return True
+
+def _claim_refresh(cache_key: str, entry: Any) -> bool:
+    """Serve entry while it is refreshed in the background; False if a refresh is already queued"""
+    if not _is_fresh(entry):
+        cache_manager.cache_stats["stale_served"] += 1
+    with _refreshing_guard:
+        if cache_key in _refreshing:
+            return False
+        _refreshing.add(cache_key)
+        return True
+
+def _refresh_in_background(func, args, kwargs, cache_key, entry, entry_tags, fresh_ttl, stale_ttl):
+    try:
+        with _flights.hold(cache_key, blocking=False) as acquired:
+            if not acquired or _refreshed_since(cache_manager.get(cache_key, tags=entry_tags), entry):
+                return
+            token = cache_manager.acquire_lock(cache_key, settings.CACHE_LOCK_TIMEOUT_MS)
+            if token is None:
+                return  # another worker is refreshing it
+            try:
+                if _is_fresh(entry):
+                    cache_manager.cache_stats["early_refreshes"] += 1
+                started = time.perf_counter()
+                result = func(*args, **kwargs)
+                _store(cache_key, result, fresh_ttl, stale_ttl, time.perf_counter() - started, entry_tags)
+                cache_manager.cache_stats["background_refreshes"] += 1
+            finally:
+                cache_manager.release_lock(cache_key, token)
+    except Exception:
+        logger.exception(f"Background refresh of {cache_key} failed")
+    finally:
+        with _refreshing_guard:
+            _refreshing.discard(cache_key)
+
+async def _arefresh_in_background(func, args, kwargs, cache_key, entry, entry_tags, fresh_ttl, stale_ttl):
+    try:
+        async with _flights.hold_async(cache_key, blocking=False) as acquired:
+            if not acquired or _refreshed_since(await cache_manager.aget(cache_key, tags=entry_tags), entry):
+                return
+            token = await cache_manager.aacquire_lock(cache_key, settings.CACHE_LOCK_TIMEOUT_MS)
+            if token is None:
+                return  # another worker is refreshing it
+            try:
+                if _is_fresh(entry):
+                    cache_manager.cache_stats["early_refreshes"] += 1
+                started = time.perf_counter()
+                result = await func(*args, **kwargs)
+                await _astore(cache_key, result, fresh_ttl, stale_ttl, time.perf_counter() - started, entry_tags)
+                cache_manager.cache_stats["background_refreshes"] += 1
+            finally:
+                await cache_manager.arelease_lock(cache_key, token)
+    except Exception:
+        logger.exception(f"Background refresh of {cache_key} failed")
+    finally:
+        with _refreshing_guard:
+            _refreshing.discard(cache_key)
+
 # Cache decorator for functions
-def cached(ttl: int = None, key_prefix: str = None):
-    """Decorator to cache function results"""
+def cached(ttl: int = None, key_prefix: str = None, tags=None, stale: int = None, beta: float = None):
+    """Decorator to cache function results, with single-flight recompute,
+    stale-while-revalidate for `stale` seconds and probabilistic early refresh"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Generate cache key from function name and arguments
-            cache_key = f"{key_prefix or func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
+            # Deterministic key from the function and its (non-injected) arguments
+            prepared = _prepare_call(func, key_prefix, tags, args, kwargs)
+            if prepared is None:
+                return func(*args, **kwargs)
+            cache_key, entry_tags = prepared
+            fresh_ttl = ttl or settings.CACHE_TIMEOUT_SECONDS
+            stale_ttl = settings.CACHE_STALE_SECONDS if stale is None else stale
+            early_beta = settings.CACHE_EARLY_REFRESH_BETA if beta is None else beta
             
-            # Try to get from cache
-            cached_result = cache_manager.get(cache_key)
-            if cached_result is not None:
-                return cached_result
+            entry = cache_manager.get(cache_key, tags=entry_tags)
+            if not _is_entry(entry):
+                entry = None
+            elif _is_fresh(entry, early_beta):
+                return entry["v"]
+            elif _detachable(args, kwargs):
+                if _claim_refresh(cache_key, entry):
+                    _refresh_pool.submit(_refresh_in_background, func, args, kwargs, cache_key, entry, entry_tags, fresh_ttl, stale_ttl)
+                return entry["v"]
             
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            cache_manager.set(cache_key, result, ttl)
-            return result
+            with _flights.hold(cache_key, blocking=entry is None) as acquired:
+                if not acquired:
+                    _note_served(entry)
+                    return entry["v"]
+                latest = cache_manager.get(cache_key, tags=entry_tags)
+                if _refreshed_since(latest, entry):
+                    cache_manager.cache_stats["coalesced"] += 1
+                    return latest["v"]
+                if _is_fresh(entry):
+                    cache_manager.cache_stats["early_refreshes"] += 1
+                
+                lock_ms = settings.CACHE_LOCK_TIMEOUT_MS
+                token = cache_manager.acquire_lock(cache_key, lock_ms)
+                if token is None:
+                    if entry is not None:
+                        _note_served(entry)
+                        return entry["v"]
+                    deadline = time.monotonic() + lock_ms / 1000.0
+                    while time.monotonic() < deadline:
+                        time.sleep(0.05)
+                        latest = cache_manager.get(cache_key, tags=entry_tags)
+                        if _is_fresh(latest):
+                            cache_manager.cache_stats["coalesced"] += 1
+                            return latest["v"]
+                try:
+                    started = time.perf_counter()
+                    result = func(*args, **kwargs)
+                    _store(cache_key, result, fresh_ttl, stale_ttl, time.perf_counter() - started, entry_tags)
+                    return result
+                finally:
+                    if token is not None:
+                        cache_manager.release_lock(cache_key, token)
+        wrapper.cache_key = lambda *args, **kwargs: build_cache_key(func, args, kwargs, key_prefix)[0]
         return wrapper
     return decorator
 
 # Cache decorator for async functions
-def async_cached(ttl: int = None, key_prefix: str = None):
-    """Decorator to cache async function results"""
+def async_cached(ttl: int = None, key_prefix: str = None, tags=None, stale: int = None, beta: float = None):
+    """Decorator to cache async function results (same semantics as cached)"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Generate cache key from function name and arguments
-            cache_key = f"{key_prefix or func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
+            # Deterministic key from the function and its (non-injected) arguments
+            prepared = _prepare_call(func, key_prefix, tags, args, kwargs)
+            if prepared is None:
+                return await func(*args, **kwargs)
+            cache_key, entry_tags = prepared
+            fresh_ttl = ttl or settings.CACHE_TIMEOUT_SECONDS
+            stale_ttl = settings.CACHE_STALE_SECONDS if stale is None else stale
+            early_beta = settings.CACHE_EARLY_REFRESH_BETA if beta is None else beta
             
-            # Try to get from cache
-            cached_result = cache_manager.get(cache_key)
-            if cached_result is not None:
-                return cached_result
+            entry = await cache_manager.aget(cache_key, tags=entry_tags)
+            if not _is_entry(entry):
+                entry = None
+            elif _is_fresh(entry, early_beta):
+                return entry["v"]
+            elif _detachable(args, kwargs):
+                if _claim_refresh(cache_key, entry):
+                    task = asyncio.get_running_loop().create_task(
+                        _arefresh_in_background(func, args, kwargs, cache_key, entry, entry_tags, fresh_ttl, stale_ttl)
+                    )
+                    _refresh_tasks.add(task)
+                    task.add_done_callback(_refresh_tasks.discard)
+                return entry["v"]
             
-            # Execute function and cache result
-            result = await func(*args, **kwargs)
-            cache_manager.set(cache_key, result, ttl)
-            return result
+            async with _flights.hold_async(cache_key, blocking=entry is None) as acquired:
+                if not acquired:
+                    _note_served(entry)
+                    return entry["v"]
+                latest = await cache_manager.aget(cache_key, tags=entry_tags)
+                if _refreshed_since(latest, entry):
+                    cache_manager.cache_stats["coalesced"] += 1
+                    return latest["v"]
+                if _is_fresh(entry):
+                    cache_manager.cache_stats["early_refreshes"] += 1
+                
+                lock_ms = settings.CACHE_LOCK_TIMEOUT_MS
+                token = await cache_manager.aacquire_lock(cache_key, lock_ms)
+                if token is None:
+                    if entry is not None:
+                        _note_served(entry)
+                        return entry["v"]
+                    deadline = time.monotonic() + lock_ms / 1000.0
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(0.05)
+                        latest = await cache_manager.aget(cache_key, tags=entry_tags)
+                        if _is_fresh(latest):
+                            cache_manager.cache_stats["coalesced"] += 1
+                            return latest["v"]
+                try:
+                    started = time.perf_counter()
+                    result = await func(*args, **kwargs)
+                    await _astore(cache_key, result, fresh_ttl, stale_ttl, time.perf_counter() - started, entry_tags)
+                    return result
+                finally:
+                    if token is not None:
+                        await cache_manager.arelease_lock(cache_key, token)
+        wrapper.cache_key = lambda *args, **kwargs: build_cache_key(func, args, kwargs, key_prefix)[0]
         return wrapper
     return decorator
 
+def cache_result(ttl_seconds: int = None, key_prefix: str = None, tags=None):
+    """Cache a sync or async function's result (picks cached or async_cached)"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            return async_cached(ttl=ttl_seconds, key_prefix=key_prefix, tags=tags)(func)
+        return cached(ttl=ttl_seconds, key_prefix=key_prefix, tags=tags)(func)
+    return decorator
+
 # Utility functions
 def get_cache_stats() -> Dict[str, Any]:
     """Get cache statistics"""
@@ -304,6 +1310,10 @@ def cache_health_check() -> Dict[str, Any]:
     """Check cache system health"""
     return cache_manager.health_check()
 
+def invalidate_tags(*tags: str) -> Dict[str, int]:
+    """Invalidate every cache entry carrying any of the given tags"""
+    return cache_manager.invalidate_tags(*tags)
+
 # Cache keys for common operations
 class CacheKeys:
     """Common cache key patterns"""
@@ -324,6 +1334,18 @@ class CacheKeys:
     def lead_stats(user_id: int) -> str:
         return f"leads:stats:{user_id}"
     
+    @staticmethod
+    def metrics_snapshot(user_id: int) -> str:
+        return f"metrics:snapshot:{user_id}"
+    
+    @staticmethod
+    def timeseries_block(user_id: int, metric: str, resolution: str, block: str, until: str) -> str:
+        return f"timeseries:{metric}:{user_id}:{resolution}:{block}:{until}"
+    
+    @staticmethod
+    def export_job(user_id: int, kind: str, format: str) -> str:
+        return f"export:job:{user_id}:{kind}:{format}"
+    
     @staticmethod
     def job_status(job_id: int) -> str:
         return f"job:status:{job_id}"
@@ -347,4 +1369,19 @@ class CacheKeys:
     @staticmethod
     def whatsapp_campaign(campaign_id: int) -> str:
         return f"whatsapp:campaign:{campaign_id}" 
- 
\ No newline at end of file
+ 
+
+class CacheTags:
+    """Invalidation tags shared by cache readers and writers"""
+    
+    @staticmethod
+    def user(user_id: int) -> str:
+        return f"user:{user_id}"
+    
+    @staticmethod
+    def tenant(tenant_id: str) -> str:
+        return f"tenant:{tenant_id}"
+    
+    @staticmethod
+    def plans() -> str:
+        return "plans"
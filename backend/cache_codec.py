@@ -0,0 +1,133 @@
+"""
+Binary value codecs for the LeadTap cache
+Values are serialised (json, orjson or msgpack), compressed with zstd or zlib once they
+exceed a size threshold, and framed with a three-byte header (format version,
+serializer id, compression id). Any worker can decode any entry whatever its own
+settings, and entries written before the header existed (plain JSON text) still decode.
+"""
+
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Tuple
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT_VERSION = 1
+
+class CodecError(ValueError):
+    """A cached value can't be decoded (unknown format or codec not installed)"""
+
+def json_default(value: Any):
+    """Encode values that cached endpoint results commonly contain"""
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=json_default, separators=(",", ":")).encode()
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, default=json_default, use_bin_type=True)
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+# id -> (name, dumps, loads); ids are part of the stored format and must never change
+SERIALIZERS: Dict[int, Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    1: ("json", _json_dumps, json.loads),
+    2: ("orjson", _orjson_dumps, lambda data: orjson.loads(data)),
+    3: ("msgpack", _msgpack_dumps, _msgpack_loads),
+}
+
+COMPRESSORS: Dict[int, Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    0: ("none", lambda data: data, lambda data: data),
+    1: ("zlib", lambda data: zlib.compress(data, 1), zlib.decompress),
+    2: (
+        "zstd",
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    ),
+}
+
+_AVAILABLE = {
+    "json": True,
+    "orjson": orjson is not None,
+    "msgpack": msgpack is not None,
+    "none": True,
+    "zlib": True,
+    "zstd": zstandard is not None,
+}
+
+def _resolve(table: Dict[int, tuple], name: str, preference: Tuple[str, ...]) -> int:
+    ids = {entry[0]: codec_id for codec_id, entry in table.items()}
+    if name == "auto":
+        name = next(candidate for candidate in preference if _AVAILABLE[candidate])
+    if name not in ids:
+        raise ValueError(f"Unknown cache codec {name!r}")
+    if not _AVAILABLE[name]:
+        raise ValueError(f"Cache codec {name!r} is not installed")
+    return ids[name]
+
+class CacheCodec:
+    """Encodes cache values to framed bytes and back"""
+
+    def __init__(self, serializer: str = "auto", compression: str = "auto", min_compress_bytes: int = 1024):
+        self.serializer_id = _resolve(SERIALIZERS, serializer, ("orjson", "msgpack", "json"))
+        self.compression_id = _resolve(COMPRESSORS, compression, ("zstd", "zlib"))
+        self.min_compress_bytes = min_compress_bytes
+
+    @property
+    def name(self) -> str:
+        return f"{SERIALIZERS[self.serializer_id][0]}+{COMPRESSORS[self.compression_id][0]}"
+
+    def encode(self, value: Any) -> bytes:
+        payload = SERIALIZERS[self.serializer_id][1](value)
+        compression_id = 0
+        if self.compression_id and len(payload) >= self.min_compress_bytes:
+            compressed = COMPRESSORS[self.compression_id][1](payload)
+            if len(compressed) < len(payload):
+                payload, compression_id = compressed, self.compression_id
+        return bytes((FORMAT_VERSION, self.serializer_id, compression_id)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        if isinstance(data, str):
+            data = data.encode()
+        if not data or data[0] != FORMAT_VERSION:
+            # Entry written before framing: plain JSON text
+            try:
+                return json.loads(data)
+            except ValueError as e:
+                raise CodecError(f"Unrecognised cache value: {e}") from e
+        if len(data) < 3 or data[1] not in SERIALIZERS or data[2] not in COMPRESSORS:
+            raise CodecError("Unknown cache codec in header")
+        serializer, compressor = SERIALIZERS[data[1]], COMPRESSORS[data[2]]
+        if not _AVAILABLE[serializer[0]] or not _AVAILABLE[compressor[0]]:
+            raise CodecError(f"Cache value needs {serializer[0]}+{compressor[0]}, which is not installed")
+        return serializer[2](compressor[2](data[3:]))
@@ -0,0 +1,78 @@
+"""
+Write-driven cache invalidation for LeadTap Platform
+Session events collect the cache tags touched by lead, job and plan writes during each
+flush and bump them once the transaction commits, so cached stats and analytics that
+depend on those rows are invalidated without each endpoint having to remember to.
+Core-level bulk writes (which bypass the unit of work) call mark_stale() instead.
+"""
+
+import logging
+from typing import Iterable, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from cache import CacheTags, cache_manager
+from models import Jobs, LeadScores, Leads, Plans, SocialMediaLeads, Tenant, Users
+
+logger = logging.getLogger("cache_invalidation")
+
+# Rows owned by a user: any write invalidates that user's cached stats and analytics
+USER_OWNED = (Leads, Jobs, SocialMediaLeads)
+
+# User columns that cached plan limits, permissions and dashboards depend on
+USER_PLAN_ATTRIBUTES = ("plan", "plan_id", "role", "tenant_id")
+
+_PENDING = "cache_invalidation_tags"
+
+def _pending(session: Session) -> Set[str]:
+    return session.info.setdefault(_PENDING, set())
+
+def mark_stale(session: Session, tags: Iterable[str]):
+    """Invalidate tags once the session's current transaction commits"""
+    _pending(session).update(tags)
+
+def pending_tags(session: Session) -> Set[str]:
+    """Tags the session's flushed but uncommitted writes will invalidate"""
+    return set(session.info.get(_PENDING, ()))
+
+def tags_for(instance) -> Set[str]:
+    """Cache tags affected by writing an ORM instance"""
+    if isinstance(instance, USER_OWNED):
+        return {CacheTags.user(instance.user_id)} if instance.user_id is not None else set()
+    if isinstance(instance, LeadScores):
+        # Scores are owned through their lead (by id: the relationship isn't loaded on new rows)
+        lead = object_session(instance).get(Leads, instance.lead_id) if instance.lead_id else None
+        return {CacheTags.user(lead.user_id)} if lead is not None and lead.user_id is not None else set()
+    if isinstance(instance, Users):
+        state = inspect(instance)
+        if not state.deleted and not any(state.attrs[name].history.has_changes() for name in USER_PLAN_ATTRIBUTES):
+            return set()
+        tags = {CacheTags.user(instance.id)}
+        if instance.tenant_id:
+            tags.add(CacheTags.tenant(instance.tenant_id))
+        return tags
+    if isinstance(instance, Plans):
+        return {CacheTags.plans()}
+    if isinstance(instance, Tenant):
+        return {CacheTags.tenant(instance.id)}
+    return set()
+
+@event.listens_for(Session, "after_flush")
+def _collect_tags(session, flush_context):
+    tags = _pending(session)
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        tags.update(tags_for(instance))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    tags = session.info.pop(_PENDING, None)
+    if tags:
+        try:
+            cache_manager.invalidate_tags(*tags)
+        except Exception:
+            logger.exception(f"Cache invalidation failed for {sorted(tags)}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,246 @@
+"""
+Cache warming for LeadTap Platform
+Precomputes per-user dashboard entries (analytics summary, CRM stats) in the background
+after startup and after each login, so the first dashboard load is a cache hit instead
+of every cold computation landing on the database at once.
+"""
+
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import Session
+
+from cache import CacheTags, MemoryCache, cache_manager
+from config import settings, CACHE_TIMEOUT_SECONDS
+from database import SessionLocal, pool_telemetry
+from models import AuditLogs, Users
+
+logger = logging.getLogger("cache_warming")
+
+LOGIN_ACTIONS = ("login_success", "login_2fa_success", "login_2fa_success_backup")
+
+# How long a warmed key is watched for its first read
+WARMED_KEY_WATCH_SECONDS = 3600
+
+# Workers started together share one startup warm-up
+STARTUP_LOCK_MS = 5 * 60 * 1000
+
+# Targets fill one cache entry for a user and return its key, or None if it was
+# already cached. Endpoint modules are imported lazily: they import auth, which
+# imports this module to queue logins.
+
+def _warm_analytics_summary(db: Session, user: Users) -> Optional[str]:
+    from enhanced_analytics import get_analytics_summary
+    key = get_analytics_summary.cache_key(db=db, user=user)
+    if cache_manager.get(key, tags=[CacheTags.user(user.id)]) is not None:
+        return None
+    get_analytics_summary(db=db, user=user)
+    return key
+
+def _warm_crm_stats(db: Session, user: Users) -> Optional[str]:
+    from crm import compute_crm_stats, crm_stats_cache_entry
+    key, tags = crm_stats_cache_entry(user.id)
+    if cache_manager.get(key, tags=tags) is not None:
+        return None
+    cache_manager.set(key, compute_crm_stats(db, user.id), CACHE_TIMEOUT_SECONDS, tags=tags)
+    return key
+
+WARM_TARGETS: Dict[str, Callable[[Session, Users], Optional[str]]] = {
+    "analytics_summary": _warm_analytics_summary,
+    "crm_stats": _warm_crm_stats,
+}
+
+class CacheWarmer:
+    """Warms users one at a time on a background thread.
+
+    Startup warming covers users who logged in within CACHE_WARM_ACTIVE_DAYS (only one
+    worker does it, under a cache lock); logins queue that user. Before each user the
+    warmer waits while the DB pool is more than CACHE_WARM_MAX_POOL_UTILIZATION checked
+    out. A warmed key whose first read is a hit counts as a prevented miss (reads on
+    other workers aren't seen, so this is a lower bound)."""
+
+    def __init__(self, targets: Dict[str, Callable[[Session, Users], Optional[str]]] = None, session_factory=SessionLocal):
+        self.targets = WARM_TARGETS if targets is None else targets
+        self.session_factory = session_factory
+        self.max_users = settings.CACHE_WARM_MAX_USERS
+        self.stats = {
+            "users_warmed": 0,
+            "entries_warmed": 0,
+            "already_cached": 0,
+            "skipped": 0,
+            "errors": 0,
+            "throttled": 0,
+            "prevented_misses": 0,
+        }
+        self._warmed = MemoryCache(max_entries=settings.CACHE_MEMORY_MAX_ENTRIES)  # key -> target
+        self._warming = threading.local()
+        self._queue: "queue.Queue[int]" = queue.Queue(maxsize=self.max_users)
+        self._listeners: Dict[str, List[Callable[[str], None]]] = {"warmed": [], "prevented_miss": [], "throttled": []}
+        self.running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+
+    def add_listener(self, kind: str, callback: Callable[[str], None]):
+        """Register callback(target) for "warmed", "prevented_miss" or "throttled" ("db")"""
+        self._listeners[kind].append(callback)
+
+    def _emit(self, kind: str, target: str):
+        for callback in self._listeners[kind]:
+            try:
+                callback(target)
+            except Exception:
+                logger.exception(f"Cache warming listener failed for {kind}")
+
+    # --- Prevented-miss accounting (CacheManager.on_lookup) ---
+
+    def record_lookup(self, key: str, hit: bool):
+        if getattr(self._warming, "active", False):
+            return
+        target = self._warmed.get(key)
+        if target is None:
+            return
+        self._warmed.delete(key)
+        if hit:
+            self.stats["prevented_misses"] += 1
+            self._emit("prevented_miss", target)
+
+    # --- Warming ---
+
+    def recently_active_users(self, db: Session) -> List[int]:
+        """Users who logged in recently, most recent first"""
+        since = datetime.now(timezone.utc) - timedelta(days=settings.CACHE_WARM_ACTIVE_DAYS)
+        stmt = (
+            select(AuditLogs.user_id)
+            .where(
+                AuditLogs.action.in_(LOGIN_ACTIONS),
+                AuditLogs.created_at >= since,
+                AuditLogs.user_id.isnot(None),
+            )
+            .group_by(AuditLogs.user_id)
+            .order_by(desc(func.max(AuditLogs.created_at)))
+            .limit(self.max_users)
+        )
+        return list(db.execute(stmt).scalars())
+
+    def db_busy(self) -> bool:
+        status = pool_telemetry.pool_status()
+        capacity = status.get("size", 0) + max(status.get("max_overflow", 0), 0)
+        if not capacity:
+            return False
+        return status["checked_out"] / capacity > settings.CACHE_WARM_MAX_POOL_UTILIZATION
+
+    def _wait_for_db(self) -> bool:
+        """Back off while the pool is busy; False if stopped meanwhile"""
+        while self.db_busy():
+            self.stats["throttled"] += 1
+            self._emit("throttled", "db")
+            if self._stop_event.wait(settings.CACHE_WARM_BUSY_BACKOFF_SECONDS):
+                return False
+        return True
+
+    def warm_user(self, user_id: int) -> int:
+        """Warm every target for a user. Returns the number of entries filled."""
+        db = self.session_factory()
+        self._warming.active = True
+        try:
+            user = db.get(Users, user_id)
+            if user is None or not user.is_active:
+                return 0
+            filled = 0
+            for name, warm in self.targets.items():
+                try:
+                    key = warm(db, user)
+                except HTTPException:
+                    self.stats["skipped"] += 1  # e.g. the user's plan doesn't include it
+                    continue
+                except Exception:
+                    logger.exception(f"Warming {name} failed for user {user_id}")
+                    self.stats["errors"] += 1
+                    db.rollback()
+                    continue
+                if key is None:
+                    self.stats["already_cached"] += 1
+                    continue
+                self._warmed.set(key, name, WARMED_KEY_WATCH_SECONDS)
+                self.stats["entries_warmed"] += 1
+                self._emit("warmed", name)
+                filled += 1
+            self.stats["users_warmed"] += 1
+            return filled
+        finally:
+            self._warming.active = False
+            db.close()
+
+    def warm_recently_active(self) -> int:
+        """Warm recently active users (startup). Returns the number of users warmed."""
+        token = cache_manager.acquire_lock("cache_warming:startup", STARTUP_LOCK_MS)
+        if token is None:
+            logger.info("Startup cache warming already done by another worker")
+            return 0
+        db = self.session_factory()
+        try:
+            user_ids = self.recently_active_users(db)
+        finally:
+            db.close()
+        warmed = 0
+        for user_id in user_ids:
+            if not self._wait_for_db():
+                break
+            self.warm_user(user_id)
+            warmed += 1
+            if self._stop_event.wait(settings.CACHE_WARM_PAUSE_SECONDS):
+                break
+        logger.info(f"Warmed caches for {warmed} recently active users")
+        return warmed
+
+    def enqueue(self, user_id: int):
+        """Warm a user soon (e.g. right after login); dropped if the queue is full"""
+        if not self.running:
+            return
+        try:
+            self._queue.put_nowait(user_id)
+        except queue.Full:
+            logger.debug(f"Cache warming queue full, not warming user {user_id}")
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self._stop_event.clear()
+            cache_manager.on_lookup = self.record_lookup
+            self.thread = threading.Thread(target=self._run, name="cache-warmer")
+            self.thread.daemon = True
+            self.thread.start()
+            logger.info("Cache warmer started")
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join()
+        logger.info("Cache warmer stopped")
+
+    def _run(self):
+        try:
+            self.warm_recently_active()
+        except Exception:
+            logger.exception("Startup cache warming failed")
+        while self.running:
+            try:
+                user_id = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                if self._wait_for_db():
+                    self.warm_user(user_id)
+            except Exception:
+                logger.exception(f"Error warming caches for user {user_id}")
+
+    def get_stats(self):
+        return {**self.stats, "queued": self._queue.qsize(), "running": self.running}
+
+cache_warmer = CacheWarmer()
@@ -47,6 +47,29 @@ class Settings(BaseSettings):
     
     # Cache Configuration
     CACHE_TIMEOUT_SECONDS: int = int(os.getenv('CACHE_TIMEOUT_SECONDS', 60))
+    CACHE_MEMORY_MAX_ENTRIES: int = int(os.getenv('CACHE_MEMORY_MAX_ENTRIES', '10000'))
+    CACHE_MEMORY_MAX_BYTES: int = int(os.getenv('CACHE_MEMORY_MAX_BYTES', str(64 * 1024 * 1024)))
+    CACHE_L1_TTL_SECONDS: int = int(os.getenv('CACHE_L1_TTL_SECONDS', '30'))
+    CACHE_INVALIDATION_CHANNEL: str = os.getenv('CACHE_INVALIDATION_CHANNEL', 'leadtap:cache:invalidate')
+    CACHE_STALE_SECONDS: int = int(os.getenv('CACHE_STALE_SECONDS', '60'))  # serve-stale window after a cached result's TTL
+    CACHE_LOCK_TIMEOUT_MS: int = int(os.getenv('CACHE_LOCK_TIMEOUT_MS', '5000'))
+    CACHE_EARLY_REFRESH_BETA: float = float(os.getenv('CACHE_EARLY_REFRESH_BETA', '1.0'))
+    CACHE_CODEC: str = os.getenv('CACHE_CODEC', 'auto')  # auto, json, orjson, msgpack
+    CACHE_COMPRESSION: str = os.getenv('CACHE_COMPRESSION', 'auto')  # auto, zstd, zlib, none
+    CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', '1024'))
+    CACHE_REDIS_TIMEOUT_MS: int = int(os.getenv('CACHE_REDIS_TIMEOUT_MS', '50'))  # async client
+    CACHE_REDIS_CONNECT_TIMEOUT_MS: int = int(os.getenv('CACHE_REDIS_CONNECT_TIMEOUT_MS', '100'))
+    CACHE_REDIS_MAX_CONNECTIONS: int = int(os.getenv('CACHE_REDIS_MAX_CONNECTIONS', '50'))
+    CACHE_BREAKER_FAILURES: int = int(os.getenv('CACHE_BREAKER_FAILURES', '5'))
+    CACHE_BREAKER_RESET_SECONDS: float = float(os.getenv('CACHE_BREAKER_RESET_SECONDS', '10'))
+    CACHE_WARM_ENABLED: bool = os.getenv('CACHE_WARM_ENABLED', 'true').lower() == 'true'
+    CACHE_WARM_ACTIVE_DAYS: int = int(os.getenv('CACHE_WARM_ACTIVE_DAYS', '7'))  # users who logged in this recently are warmed on startup
+    CACHE_WARM_MAX_USERS: int = int(os.getenv('CACHE_WARM_MAX_USERS', '200'))
+    CACHE_WARM_PAUSE_SECONDS: float = float(os.getenv('CACHE_WARM_PAUSE_SECONDS', '0.05'))  # between users
+    CACHE_WARM_MAX_POOL_UTILIZATION: float = float(os.getenv('CACHE_WARM_MAX_POOL_UTILIZATION', '0.5'))
+    CACHE_WARM_BUSY_BACKOFF_SECONDS: float = float(os.getenv('CACHE_WARM_BUSY_BACKOFF_SECONDS', '1.0'))
+    METRICS_SNAPSHOT_TTL_SECONDS: int = int(os.getenv('METRICS_SNAPSHOT_TTL_SECONDS', '30'))  # per-user job/lead counts
+    TIMESERIES_BLOCK_TTL_SECONDS: int = int(os.getenv('TIMESERIES_BLOCK_TTL_SECONDS', '2592000'))  # completed time-series buckets
     
     # Payment Configuration
     STRIPE_SECRET_KEY: str = os.getenv('STRIPE_SECRET_KEY', 'sk_test_...')
@@ -94,6 +117,37 @@ class Settings(BaseSettings):
     BACKUP_ENABLED: bool = os.getenv('BACKUP_ENABLED', 'false').lower() == 'true'
     BACKUP_RETENTION_DAYS: int = int(os.getenv('BACKUP_RETENTION_DAYS', '30'))
     
+    # Database Pool Telemetry (leak debug records the stack of every checkout)
+    DB_POOL_LEAK_DEBUG: bool = os.getenv('DB_POOL_LEAK_DEBUG', 'false').lower() == 'true'
+    DB_POOL_LEAK_THRESHOLD_SECONDS: float = float(os.getenv('DB_POOL_LEAK_THRESHOLD_SECONDS', '30'))
+    
+    # Archival Configuration (per-table retention in days)
+    ARCHIVE_ENABLED: bool = os.getenv('ARCHIVE_ENABLED', 'false').lower() == 'true'
+    ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv('ARCHIVE_INTERVAL_SECONDS', '3600'))
+    ARCHIVE_BATCH_SIZE: int = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+    ARCHIVE_BATCH_PAUSE_SECONDS: float = float(os.getenv('ARCHIVE_BATCH_PAUSE_SECONDS', '0.5'))
+    ARCHIVE_MAX_BATCHES_PER_RUN: int = int(os.getenv('ARCHIVE_MAX_BATCHES_PER_RUN', '200'))
+    ARCHIVE_RETENTION_JOBS_DAYS: int = int(os.getenv('ARCHIVE_RETENTION_JOBS_DAYS', '180'))
+    ARCHIVE_RETENTION_AUDIT_LOGS_DAYS: int = int(os.getenv('ARCHIVE_RETENTION_AUDIT_LOGS_DAYS', '365'))
+    ARCHIVE_RETENTION_WEBHOOK_DELIVERIES_DAYS: int = int(os.getenv('ARCHIVE_RETENTION_WEBHOOK_DELIVERIES_DAYS', '30'))
+    ARCHIVE_RETENTION_BULK_WHATSAPP_MESSAGES_DAYS: int = int(os.getenv('ARCHIVE_RETENTION_BULK_WHATSAPP_MESSAGES_DAYS', '90'))
+    
+    # Analytics Engine (Parquet snapshots queried with DuckDB; needs the duckdb package)
+    ANALYTICS_ENGINE_ENABLED: bool = os.getenv('ANALYTICS_ENGINE_ENABLED', 'false').lower() == 'true'
+    ANALYTICS_ENGINE_DIR: str = os.getenv('ANALYTICS_ENGINE_DIR', './analytics_snapshots')
+    ANALYTICS_SNAPSHOT_INTERVAL_SECONDS: int = int(os.getenv('ANALYTICS_SNAPSHOT_INTERVAL_SECONDS', '900'))
+    ANALYTICS_SNAPSHOT_BATCH_SIZE: int = int(os.getenv('ANALYTICS_SNAPSHOT_BATCH_SIZE', '5000'))
+    ANALYTICS_SNAPSHOT_MAX_PARTS: int = int(os.getenv('ANALYTICS_SNAPSHOT_MAX_PARTS', '48'))  # per table, before compaction
+    ANALYTICS_ENGINE_MAX_LAG_SECONDS: int = int(os.getenv('ANALYTICS_ENGINE_MAX_LAG_SECONDS', '3600'))  # older snapshots: reports run live
+    
+    # Background Exports (files are kept for EXPORT_RETENTION_SECONDS)
+    EXPORT_WORKER_ENABLED: bool = os.getenv('EXPORT_WORKER_ENABLED', 'true').lower() == 'true'
+    EXPORT_DIR: str = os.getenv('EXPORT_DIR', './exports')
+    EXPORT_POLL_INTERVAL_SECONDS: int = int(os.getenv('EXPORT_POLL_INTERVAL_SECONDS', '30'))
+    EXPORT_BATCH_SIZE: int = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+    EXPORT_RETENTION_SECONDS: int = int(os.getenv('EXPORT_RETENTION_SECONDS', '86400'))
+    EXPORT_STALE_SECONDS: int = int(os.getenv('EXPORT_STALE_SECONDS', '900'))  # running exports without a heartbeat for this long are failed
+    
     # Email Configuration
     SMTP_HOST: Optional[str] = os.getenv('SMTP_HOST')
     SMTP_PORT: int = int(os.getenv('SMTP_PORT', '587'))
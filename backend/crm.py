@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request, Path
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import json
 from datetime import datetime, timedelta
 from database import get_db
@@ -10,11 +13,13 @@ from pydantic import BaseModel, Field
 import secrets
 from functools import lru_cache
 from config import CACHE_TIMEOUT_SECONDS
-import threading
 from tenant_utils import get_tenant_from_request, get_tenant_record_or_403
 from webhook_utils import send_webhook_event
 from audit import audit_log
 from security import check_permission
+from lead_ingest import ingest_leads
+from queries import count_leads
+from cache import cache_manager, CacheKeys, CacheTags
 
 router = APIRouter(prefix="/api/crm", tags=["crm"])
 
@@ -63,14 +68,13 @@ class BulkDeleteLeadsResponse(BaseModel):
     deleted: int = Field(..., description="Number of leads deleted.")
 class BulkAddLeadsResponse(BaseModel):
     added: int = Field(..., description="Number of leads added.")
+    duplicates: int = Field(0, description="Number of leads skipped because the email already exists.")
+    rejected: int = Field(0, description="Number of leads rejected by validation or insert errors.")
+    errors: List[dict] = Field([], description="Per-row errors (index and reason) for rejected leads.")
 
 class DeleteLeadResponse(BaseModel):
     message: str
 
-# Thread-safe cache for per-user stats
-_stats_cache = {}
-_stats_cache_lock = threading.Lock()
-
 @router.post("/leads", response_model=LeadResponse, summary="Create a new CRM lead", description="Create a new lead in the CRM for the authenticated user.")
 async def create_lead(
     lead_data: LeadCreate = Body(..., description="Lead data to create."),
@@ -96,7 +100,11 @@ async def create_lead(
     )
     
     db.add(lead)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A lead with this email already exists")
     db.refresh(lead)
     
     # Log the action
@@ -268,7 +276,11 @@ async def update_lead(
         lead.tags = json.dumps(lead_data.tags)
     
     lead.updated_at = datetime.utcnow()
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A lead with this email already exists")
     db.refresh(lead)
     
     return LeadResponse(
@@ -306,40 +318,41 @@ async def delete_lead(
     
     return DeleteLeadResponse(message="Lead deleted successfully")
 
-@router.get("/stats")
-async def get_crm_stats(
-    current_user: Users = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get CRM statistics for the user, cached for 60 seconds"""
-    user_id = current_user.id
-    now = datetime.utcnow()
-    cache_key = f"stats_{user_id}"
-    with _stats_cache_lock:
-        entry = _stats_cache.get(cache_key)
-        if entry and (now - entry["timestamp"]).total_seconds() < CACHE_TIMEOUT_SECONDS:
-            return entry["data"]
-    # Compute stats as before
-    total_leads = db.query(Leads).filter(Leads.user_id == user_id).count()
-    status_counts = db.query(Leads.status, db.func.count(Leads.id)).filter(
+def compute_crm_stats(db: Session, user_id: int) -> Dict[str, Any]:
+    """Lead counts by status and source for a user (uncached)"""
+    total_leads = count_leads(db, user_id)
+    status_counts = db.query(Leads.status, func.count(Leads.id)).filter(
         Leads.user_id == user_id
     ).group_by(Leads.status).all()
-    source_counts = db.query(Leads.source, db.func.count(Leads.id)).filter(
+    source_counts = db.query(Leads.source, func.count(Leads.id)).filter(
         Leads.user_id == user_id
     ).group_by(Leads.source).all()
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_leads = db.query(Leads).filter(
-        Leads.user_id == user_id,
-        Leads.created_at >= thirty_days_ago
-    ).count()
-    data = {
+    recent_leads = count_leads(db, user_id, since=thirty_days_ago)
+    return {
         "total_leads": total_leads,
         "recent_leads": recent_leads,
         "status_breakdown": dict(status_counts),
         "source_breakdown": dict(source_counts)
     }
-    with _stats_cache_lock:
-        _stats_cache[cache_key] = {"timestamp": now, "data": data}
+
+def crm_stats_cache_entry(user_id: int) -> Tuple[str, List[str]]:
+    """Cache key and tags of a user's CRM stats (shared with cache_warming)"""
+    # Tagged with the user: any lead write for them invalidates it (see cache_invalidation)
+    return CacheKeys.lead_stats(user_id), [CacheTags.user(user_id)]
+
+@router.get("/stats")
+async def get_crm_stats(
+    current_user: Users = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get CRM statistics for the user, cached for 60 seconds"""
+    cache_key, tags = crm_stats_cache_entry(current_user.id)
+    data = await cache_manager.aget(cache_key, tags=tags)
+    if data is not None:
+        return data
+    data = await run_in_threadpool(compute_crm_stats, db, current_user.id)  # keep the loop free on a miss
+    await cache_manager.aset(cache_key, data, CACHE_TIMEOUT_SECONDS, tags=tags)
     return data
 
 @router.post("/leads/import", summary="Import leads", description="Import multiple leads in bulk.", response_model=List[LeadResponse])
@@ -352,43 +365,34 @@ async def import_leads(
 
 - **leads_data**: List of LeadCreate.
 - **Returns**: List of LeadResponse."""
-    created_leads = []
-    
+    rows = []
     for lead_data in leads_data:
-        lead = Leads(
-            user_id=current_user.id,
-            name=lead_data.name,
+        row = lead_data.dict(exclude_none=True)
+        row["source"] = "import"
+        rows.append(row)
+    result = ingest_leads(db, current_user.id, rows, return_ids=True, on_conflict="ignore")
+    
+    created = []
+    for outcome in result["outcomes"]:
+        if outcome["status"] != "inserted":
+            continue
+        lead_data = leads_data[outcome["index"]]
+        created.append(LeadResponse(
+            id=outcome.get("id") or 0,
+            name=outcome.get("row", {}).get("name", lead_data.name),
             email=lead_data.email,
             phone=lead_data.phone,
             company=lead_data.company,
             website=lead_data.website,
             address=lead_data.address,
             source="import",
+            status="new",
             notes=lead_data.notes,
-            tags=json.dumps(lead_data.tags) if lead_data.tags else None
-        )
-        db.add(lead)
-        created_leads.append(lead)
-    
-    db.commit()
-    
-    return [
-        LeadResponse(
-            id=lead.id,
-            name=lead.name,
-            email=lead.email,
-            phone=lead.phone,
-            company=lead.company,
-            website=lead.website,
-            address=lead.address,
-            source=lead.source,
-            status=lead.status,
-            notes=lead.notes,
-            tags=json.loads(lead.tags) if lead.tags else [],
-            created_at=lead.created_at,
-            updated_at=lead.updated_at
-        ) for lead in created_leads
-    ]
+            tags=lead_data.tags or [],
+            created_at=outcome.get("created_at") or datetime.utcnow(),
+            updated_at=outcome.get("created_at") or datetime.utcnow()
+        ))
+    return created
 
 @router.post("/leads/bulk-delete", summary="Bulk delete leads", description="Delete multiple leads by their IDs.", response_model=BulkDeleteLeadsResponse)
 def bulk_delete_leads(req: BulkDeleteLeadsRequest, db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
@@ -409,24 +413,12 @@ def bulk_add_leads(req: BulkAddLeadsRequest, db: Session = Depends(get_db), user
 
 - **leads**: List of LeadCreate.
 - **Returns**: Number of leads added."""
-    count = 0
-    for lead_data in req.leads:
-        lead = Leads(
-            user_id=user.id,
-            name=lead_data.name,
-            email=lead_data.email,
-            phone=lead_data.phone,
-            company=lead_data.company,
-            website=lead_data.website,
-            address=lead_data.address,
-            source=lead_data.source,
-            notes=lead_data.notes,
-            tags=json.dumps(lead_data.tags) if lead_data.tags else None
-        )
-        db.add(lead)
-        count += 1
-    db.commit()
-    return {"added": count}
+    result = ingest_leads(db, user.id, (lead_data.dict(exclude_none=True) for lead_data in req.leads), on_conflict="ignore")
+    errors = [
+        {"index": outcome["index"], "error": outcome["error"]}
+        for outcome in result["outcomes"] if outcome["status"] in ("invalid", "failed")
+    ]
+    return {"added": result["inserted"], "duplicates": result["duplicate"], "rejected": len(errors), "errors": errors}
 
 @router.post("/leads/{lead_id}/enrich", summary="Enrich a lead", description="Enrich a lead with additional data from external sources.")
 def enrich_lead(lead_id: int = Path(..., description="ID of the lead to enrich."), db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
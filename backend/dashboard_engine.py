@@ -0,0 +1,150 @@
+"""
+Custom dashboard evaluation for LeadTap Platform
+Evaluates every widget of a CustomDashboards config in one request. Widgets are planned
+onto shared sources first (the user's metrics snapshot, one rollup query for every period,
+one series per distinct chart, one top-queries lookup per scope), each source runs once,
+and every widget reads its value from them. A dashboard config looks like:
+
+    {"widgets": [
+        {"id": "leads", "type": "stat", "metric": "total_leads"},
+        {"id": "won", "type": "stat", "metric": "conversions", "days": 30},
+        {"id": "status", "type": "breakdown", "metric": "jobs"},
+        {"id": "growth", "type": "timeseries", "metric": "leads", "interval": "day", "days": 90},
+        {"id": "best", "type": "top_queries", "limit": 5}
+    ]}
+
+Stats without "days" come from the snapshot (all time), with "days" from the daily rollups.
+A widget with a bad spec gets {"error": ...}; the others are still evaluated.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+import query_stats
+import timeseries
+from analytics_rollup import ROLLUP_COUNTERS, rollup_windows
+from models import JobStatus, LeadStatus
+from user_metrics import metrics_snapshot
+
+MAX_WIDGETS = 50
+MAX_DAYS = 730
+MAX_TOP_QUERIES = 100
+
+SNAPSHOT_STATS = ("total_jobs", "total_leads", "active_jobs", "job_results", "average_job_duration_ms", "conversion_rate")
+PERIOD_STATS = ROLLUP_COUNTERS + ("success_rate", "average_lead_score", "average_job_duration_seconds")
+
+Source = Tuple[Any, ...]
+Extract = Callable[[Any], Dict[str, Any]]
+Planned = Tuple[Source, Any, Extract]  # source, what this widget needs from it, extract
+
+def _snapshot_stat(snapshot: Dict[str, Any], metric: str) -> Any:
+    if metric == "conversion_rate":
+        converted = snapshot["leads"].get(LeadStatus.CONVERTED.value, 0)
+        return round(converted / snapshot["total_leads"] * 100, 2) if snapshot["total_leads"] else 0
+    if "." in metric:
+        group, status = metric.split(".", 1)
+        return snapshot[group][status]
+    return snapshot[metric]
+
+def _period_stat(totals: Dict[str, float], metric: str) -> Any:
+    if metric == "success_rate":
+        finished = totals["jobs_completed"] + totals["jobs_failed"]
+        return round(totals["jobs_completed"] / finished * 100, 2) if finished else 0
+    if metric == "average_lead_score":
+        return round(totals["lead_score_total"] / totals["lead_scores"], 2) if totals["lead_scores"] else None
+    if metric == "average_job_duration_seconds":
+        return round(totals["job_duration_seconds"] / totals["jobs_timed"], 1) if totals["jobs_timed"] else None
+    return totals[metric]
+
+def _days(spec: Dict[str, Any], default: int = None) -> int:
+    days = spec.get("days", default)
+    if days is None:
+        return None
+    if not isinstance(days, int) or not 1 <= days <= MAX_DAYS:
+        raise ValueError(f"days must be an integer from 1 to {MAX_DAYS}")
+    return days
+
+def _plan_stat(spec: Dict[str, Any]) -> Planned:
+    metric, days = spec.get("metric"), _days(spec)
+    if days is None:
+        statuses = {f"jobs.{status.value}" for status in JobStatus} | {f"leads.{status.value}" for status in LeadStatus}
+        if metric not in SNAPSHOT_STATS and metric not in statuses:
+            raise ValueError(f"Unknown stat: {metric}")
+        return ("snapshot",), None, lambda snapshot: {"value": _snapshot_stat(snapshot, metric)}
+    if metric not in PERIOD_STATS:
+        raise ValueError(f"Unknown stat over days: {metric}")
+    # Every period is summed by the same rollup query
+    return ("rollup",), days, lambda windows: {"value": _period_stat(windows[days], metric), "days": days}
+
+def _plan_breakdown(spec: Dict[str, Any]) -> Planned:
+    metric = spec.get("metric")
+    if metric not in ("jobs", "leads"):
+        raise ValueError("breakdown metric must be jobs or leads")
+    return ("snapshot",), None, lambda snapshot: {"metric": metric, "values": snapshot[metric]}
+
+def _plan_timeseries(spec: Dict[str, Any]) -> Planned:
+    metric, interval = spec.get("metric"), spec.get("interval", "day")
+    if metric not in timeseries.METRICS:
+        raise ValueError(f"Unknown series metric: {metric}")
+    if interval not in timeseries.INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+    max_points = spec.get("max_points", timeseries.DEFAULT_MAX_POINTS)
+    if not isinstance(max_points, int) or not 2 <= max_points <= 1000:
+        raise ValueError("max_points must be an integer from 2 to 1000")
+    return ("series", metric, interval, _days(spec, 30), max_points), None, lambda series: series
+
+def _plan_top_queries(spec: Dict[str, Any]) -> Planned:
+    scope, limit = spec.get("scope", "user"), spec.get("limit", 5)
+    if scope not in ("user", "global"):
+        raise ValueError("scope must be user or global")
+    if not isinstance(limit, int) or not 1 <= limit <= MAX_TOP_QUERIES:
+        raise ValueError(f"limit must be an integer from 1 to {MAX_TOP_QUERIES}")
+    return ("top_queries", scope), limit, lambda rows: {"scope": scope, "queries": rows[:limit]}
+
+PLANNERS = {
+    "stat": _plan_stat,
+    "breakdown": _plan_breakdown,
+    "timeseries": _plan_timeseries,
+    "top_queries": _plan_top_queries,
+}
+
+def plan(widgets: List[Dict[str, Any]]) -> Tuple[List[Tuple[str, str, Planned]], Dict[str, Dict[str, Any]]]:
+    """Map each widget to a shared source: ([(id, type, (source, need, extract))], {id: error})"""
+    planned, errors = [], {}
+    for index, spec in enumerate(widgets[:MAX_WIDGETS]):
+        spec = spec if isinstance(spec, dict) else {}
+        widget_id = str(spec.get("id", index))
+        planner = PLANNERS.get(spec.get("type"))
+        try:
+            if planner is None:
+                raise ValueError(f"Unknown widget type: {spec.get('type')}")
+            planned.append((widget_id, spec["type"], planner(spec)))
+        except ValueError as e:
+            errors[widget_id] = {"type": spec.get("type"), "error": str(e)}
+    return planned, errors
+
+def _load(db: Session, user_id: int, source: Source, needs: set) -> Any:
+    kind = source[0]
+    if kind == "snapshot":
+        return metrics_snapshot(db, user_id)
+    if kind == "rollup":
+        return rollup_windows(db, user_id, needs)
+    if kind == "series":
+        _, metric, interval, days, max_points = source
+        return timeseries.series(db, user_id, metric, interval, datetime.now(timezone.utc) - timedelta(days=days), max_points=max_points)
+    # Top queries: the largest limit serves every widget
+    return query_stats.top_queries(db, user_id if source[1] == "user" else None, limit=max(needs))
+
+def evaluate(db: Session, user_id: int, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Every widget's value for a dashboard config: {"widgets": {id: result}, "sources": n}"""
+    widgets = config.get("widgets") if isinstance(config, dict) else None
+    planned, results = plan(widgets if isinstance(widgets, list) else [])
+    needs: Dict[Source, set] = {}
+    for _, _, (source, need, _) in planned:
+        needs.setdefault(source, set()).add(need)
+    loaded = {source: _load(db, user_id, source, wanted - {None}) for source, wanted in needs.items()}
+    for widget_id, kind, (source, _, extract) in planned:
+        results[widget_id] = {"type": kind, **extract(loaded[source])}
+    return {"widgets": results, "sources": len(loaded)}
@@ -1,8 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
-from config import DATABASE_URL
+from config import DATABASE_URL, settings
+from db_telemetry import InstrumentedQueuePool, PoolTelemetry
 import logging
 import os
 
@@ -17,7 +17,7 @@ def create_database_engine():
             # PostgreSQL configuration
             engine = create_engine(
                 DATABASE_URL,
-                poolclass=QueuePool,
+                poolclass=InstrumentedQueuePool,  # QueuePool that reports checkout wait time
                 pool_size=20,  # Number of connections to maintain
                 max_overflow=30,  # Additional connections when pool is full
                 pool_pre_ping=True,  # Verify connections before use
@@ -29,7 +29,7 @@ def create_database_engine():
             # MySQL configuration
             engine = create_engine(
                 DATABASE_URL,
-                poolclass=QueuePool,
+                poolclass=InstrumentedQueuePool,
                 pool_size=20,
                 max_overflow=30,
                 pool_pre_ping=True,
@@ -54,6 +54,12 @@ def create_database_engine():
 # Create engine instance
 engine = create_database_engine()
 
+# Pool telemetry (exported to Prometheus by monitoring.py)
+pool_telemetry = PoolTelemetry(
+    leak_debug=settings.DB_POOL_LEAK_DEBUG,
+    leak_threshold_seconds=settings.DB_POOL_LEAK_THRESHOLD_SECONDS
+).install(engine)
+
 # Session configuration
 SessionLocal = sessionmaker(
     autocommit=False, 
@@ -0,0 +1,181 @@
+"""
+Connection-pool telemetry for LeadTap Platform
+Tracks checkout wait, hold time and connection age via pool events, and in leak-debug
+mode records the stack of every checkout so long-held or leaked connections can be traced.
+"""
+
+import logging
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import Pool, QueuePool
+
+logger = logging.getLogger("db_telemetry")
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection"""
+
+    telemetry: Optional["PoolTelemetry"] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.record_wait(time.perf_counter() - started)
+
+class PoolTelemetry:
+    """Collects pool statistics and notifies listeners (e.g. Prometheus metrics)"""
+
+    def __init__(self, leak_debug: bool = False, leak_threshold_seconds: float = 30.0):
+        self.leak_debug = leak_debug
+        self.leak_threshold_seconds = leak_threshold_seconds
+        self.pool: Optional[Pool] = None
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.long_held = 0
+        self._checked_out: Dict[int, Dict[str, Any]] = {}
+        self._reported: set = set()
+        self._listeners: Dict[str, List[Callable[[float], None]]] = {"wait": [], "hold": [], "long_held": []}
+        self._lock = threading.Lock()
+
+    def add_listener(self, kind: str, callback: Callable[[float], None]):
+        """Register a callback for "wait" or "hold" observations, or "long_held" checkins (seconds held)"""
+        self._listeners[kind].append(callback)
+
+    def _notify(self, kind: str, seconds: float):
+        for callback in self._listeners[kind]:
+            try:
+                callback(seconds)
+            except Exception:
+                logger.exception(f"Pool telemetry listener failed for {kind}")
+
+    def install(self, engine):
+        """Attach pool event listeners to an engine"""
+        self.pool = engine.pool
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.telemetry = self
+        event.listen(engine.pool, "connect", self._on_connect)
+        event.listen(engine.pool, "checkout", self._on_checkout)
+        event.listen(engine.pool, "checkin", self._on_checkin)
+        event.listen(engine.pool, "close", self._on_close)
+        return self
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        self._notify("wait", seconds)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        connection_record.info["connected_at"] = time.time()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        entry = {
+            "checked_out_at": time.time(),
+            "connected_at": connection_record.info.get("connected_at"),
+            "thread": threading.current_thread().name,
+        }
+        if self.leak_debug:
+            entry["stack"] = "".join(traceback.format_stack(limit=25)[:-2])
+        with self._lock:
+            self.checkouts += 1
+            self._checked_out[id(connection_record)] = entry
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            entry = self._checked_out.pop(id(connection_record), None)
+            self._reported.discard(id(connection_record))
+        if entry is None:
+            return
+        held = time.time() - entry["checked_out_at"]
+        self._notify("hold", held)
+        if held > self.leak_threshold_seconds:
+            with self._lock:
+                self.long_held += 1
+            self._notify("long_held", held)
+            self._log_long_held(held, entry)
+
+    def _on_close(self, dbapi_connection, connection_record):
+        connection_record.info.pop("connected_at", None)
+
+    def _log_long_held(self, held: float, entry: Dict[str, Any], still_open: bool = False):
+        state = "still checked out" if still_open else "returned"
+        message = f"DB connection held for {held:.1f}s ({state}, thread {entry['thread']})"
+        if "stack" in entry:
+            message += f"; checked out at:\n{entry['stack']}"
+        logger.warning(message)
+
+    def check_leaks(self) -> List[Dict[str, Any]]:
+        """Report connections checked out longer than the threshold.
+
+        Each offending checkout is logged once; the full list is returned."""
+        now = time.time()
+        leaks = []
+        with self._lock:
+            entries = list(self._checked_out.items())
+        for key, entry in entries:
+            held = now - entry["checked_out_at"]
+            if held <= self.leak_threshold_seconds:
+                continue
+            leaks.append({"held_seconds": round(held, 3), **entry})
+            if key not in self._reported:
+                self._reported.add(key)
+                self._log_long_held(held, entry, still_open=True)
+        return leaks
+
+    def oldest_connection_age(self) -> float:
+        """Age in seconds of the oldest connection currently held by the pool"""
+        pool = self.pool
+        if pool is None:
+            return 0.0
+        now = time.time()
+        records = []
+        queue = getattr(pool, "_pool", None)
+        if queue is not None and hasattr(queue, "queue"):
+            records.extend(queue.queue)
+        connected = [record.info["connected_at"] for record in records if "connected_at" in record.info]
+        with self._lock:
+            connected.extend(entry["connected_at"] for entry in self._checked_out.values() if entry["connected_at"])
+        return max((now - connected_at for connected_at in connected), default=0.0)
+
+    def oldest_checkout_seconds(self) -> float:
+        now = time.time()
+        with self._lock:
+            return max((now - entry["checked_out_at"] for entry in self._checked_out.values()), default=0.0)
+
+    def pool_status(self) -> Dict[str, Any]:
+        """Current pool occupancy (QueuePool only reports size/overflow)"""
+        pool = self.pool
+        status = {"checked_out": len(self._checked_out)}
+        if isinstance(pool, QueuePool):
+            status.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+            })
+        return status
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Pool status plus cumulative checkout statistics"""
+        leaks = self.check_leaks()
+        return {
+            **self.pool_status(),
+            "checkouts": self.checkouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "oldest_checkout_seconds": round(self.oldest_checkout_seconds(), 3),
+            "oldest_connection_age_seconds": round(self.oldest_connection_age(), 3),
+            "long_held_total": self.long_held,
+            "leak_debug": self.leak_debug,
+            "long_held": [
+                {key: value for key, value in leak.items() if key != "stack" or self.leak_debug}
+                for leak in leaks
+            ],
+        }
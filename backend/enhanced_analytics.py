@@ -1,23 +1,30 @@
 # Enhanced Analytics with Real-time Data and Advanced Reporting
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Body, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from sqlalchemy import func, desc, and_, case
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from enum import Enum
-import json
 import logging
 from datetime import datetime, timezone, timedelta
-from models import Users, Jobs, LeadScores, WhatsAppWorkflows, Leads
+from models import Users, Jobs, JobStatus, WhatsAppWorkflows, Leads, BulkWhatsAppCampaigns, BulkWhatsAppMessages, Goals
 from database import get_db
 from auth import get_current_user
 from security import check_permission
+from user_metrics import metrics_snapshot
 from cache import cache_result
+from analytics_rollup import parse_queries, rollup_totals
+from analytics_engine import analytics_engine
+import query_stats
+import timeseries
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 logger = logging.getLogger("enhanced_analytics")
 
+# The live per-query report (no analytics engine) covers this many of the user's most recent jobs
+TOP_QUERIES_JOB_WINDOW = 500
+
 class AnalyticsSummary(BaseModel):
     total_jobs: int
     total_leads: int
@@ -51,46 +58,21 @@ def get_analytics_summary(
     """Get comprehensive analytics summary for the user"""
     try:
         # Check permissions
-        if not check_permission(user, "analytics:read"):
+        if not check_permission(user, "analytics", "read", db):
             raise HTTPException(status_code=403, detail="Insufficient permissions")
         
-        # Get user's jobs
-        user_jobs = db.query(Jobs).filter(Jobs.user_id == user.id).all()
-        total_jobs = len(user_jobs)
-        
-        # Calculate total leads
-        total_leads = 0
-        for job in user_jobs:
-            if job.results:
-                results = json.loads(job.results)
-                total_leads += len(results)
-        
-        # Calculate success rate
-        completed_jobs = [job for job in user_jobs if job.status == "completed"]
-        success_rate = len(completed_jobs) / total_jobs if total_jobs > 0 else 0
-        
-        # Calculate average lead score
-        lead_scores = db.query(LeadScores).filter(LeadScores.user_id == user.id).all()
-        average_score = sum(score.score for score in lead_scores) / len(lead_scores) if lead_scores else 0
+        # Totals from the daily rollups
+        totals = rollup_totals(db, user.id)
+        total_jobs = int(totals["jobs_created"])
+        total_leads = int(totals["leads_generated"])
+        success_rate = totals["jobs_completed"] / total_jobs if total_jobs > 0 else 0
+        average_score = totals["lead_score_total"] / totals["lead_scores"] if totals["lead_scores"] else 0
         
-        # Get top performing queries
-        query_performance = {}
-        for job in user_jobs:
-            if job.queries:
-                queries = json.loads(job.queries)
-                for query in queries:
-                    if query not in query_performance:
-                        query_performance[query] = {"count": 0, "success_rate": 0}
-                    query_performance[query]["count"] += 1
-                    if job.status == "completed":
-                        query_performance[query]["success_rate"] += 1
-        
-        # Sort by success rate and count
-        top_queries = sorted(
-            [{"query": q, **stats} for q, stats in query_performance.items()],
-            key=lambda x: (x["success_rate"], x["count"]),
-            reverse=True
-        )[:5]
+        # Top performing queries from the maintained per-query stats
+        top_queries = [
+            {**stats, "count": stats["runs"], "last_run_at": stats["last_run_at"].isoformat() if stats["last_run_at"] else None}
+            for stats in query_stats.top_queries(db, user.id, limit=5)
+        ]
         
         # Get recent activity
         recent_jobs = db.query(Jobs).filter(
@@ -104,7 +86,7 @@ def get_analytics_summary(
                 "type": "job_created",
                 "status": job.status,
                 "created_at": job.created_at.isoformat(),
-                "queries_count": len(json.loads(job.queries)) if job.queries else 0
+                "queries_count": len(parse_queries(job.queries))
             })
         
         return AnalyticsSummary(
@@ -116,6 +98,8 @@ def get_analytics_summary(
             recent_activity=recent_activity
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error getting analytics summary")
         raise HTTPException(status_code=500, detail="Failed to get analytics summary")
@@ -127,55 +111,17 @@ def get_realtime_metrics(
 ):
     """Get real-time system metrics"""
     try:
-        # Active jobs (running or pending)
-        active_jobs = db.query(Jobs).filter(
-            and_(
-                Jobs.user_id == user.id,
-                Jobs.status.in_(["running", "pending"])
-            )
-        ).count()
-        
-        # Jobs completed today
-        today = datetime.now(timezone.utc).date()
-        jobs_completed_today = db.query(Jobs).filter(
-            and_(
-                Jobs.user_id == user.id,
-                Jobs.status == "completed",
-                func.date(Jobs.updated_at) == today
-            )
-        ).count()
-        
-        # Leads generated today
-        leads_generated_today = 0
-        today_jobs = db.query(Jobs).filter(
-            and_(
-                Jobs.user_id == user.id,
-                func.date(Jobs.updated_at) == today
-            )
-        ).all()
-        
-        for job in today_jobs:
-            if job.results:
-                results = json.loads(job.results)
-                leads_generated_today += len(results)
+        # Active jobs (running or pending): current state, not a rollup
+        active_jobs = metrics_snapshot(db, user.id)["active_jobs"]
         
-        # Calculate average response time (simplified)
-        completed_jobs = db.query(Jobs).filter(
-            and_(
-                Jobs.user_id == user.id,
-                Jobs.status == "completed"
-            )
-        ).all()
+        # Today's activity from today's rollup row
+        today = rollup_totals(db, user.id, since=datetime.now(timezone.utc))
+        jobs_completed_today = int(today["jobs_completed"])
+        leads_generated_today = int(today["leads_generated"])
         
-        total_time = 0
-        count = 0
-        for job in completed_jobs:
-            if job.created_at and job.updated_at:
-                duration = (job.updated_at - job.created_at).total_seconds()
-                total_time += duration
-                count += 1
-        
-        average_response_time = total_time / count if count > 0 else 0
+        # Average run time (jobs' duration_ms), including archived jobs
+        totals = rollup_totals(db, user.id)
+        average_response_time = totals["job_duration_seconds"] / totals["jobs_timed"] if totals["jobs_timed"] else 0
         
         # System health (simplified)
         system_health = "healthy"
@@ -215,36 +161,17 @@ def get_performance_reports(
         days = period_map.get(period, 7)
         start_date = datetime.now(timezone.utc) - timedelta(days=days)
         
-        # Get jobs in period
-        period_jobs = db.query(Jobs).filter(
-            and_(
-                Jobs.user_id == user.id,
-                Jobs.created_at >= start_date
-            )
-        ).all()
-        
-        jobs_created = len(period_jobs)
-        jobs_completed = len([j for j in period_jobs if j.status == "completed"])
-        
-        # Calculate leads generated
-        leads_generated = 0
-        for job in period_jobs:
-            if job.results:
-                results = json.loads(job.results)
-                leads_generated += len(results)
+        # Sum the daily rollups in the period
+        totals = rollup_totals(db, user.id, since=start_date)
+        jobs_created = int(totals["jobs_created"])
+        jobs_completed = int(totals["jobs_completed"])
+        leads_generated = int(totals["leads_generated"])
         
         # Calculate success rate
         success_rate = jobs_completed / jobs_created if jobs_created > 0 else 0
         
-        # Calculate average lead score
-        period_scores = db.query(LeadScores).filter(
-            and_(
-                LeadScores.user_id == user.id,
-                LeadScores.created_at >= start_date
-            )
-        ).all()
-        
-        average_lead_score = sum(score.score for score in period_scores) / len(period_scores) if period_scores else 0
+        # Average score of leads scored in the period
+        average_lead_score = totals["lead_score_total"] / totals["lead_scores"] if totals["lead_scores"] else 0
         
         # Calculate revenue potential (simplified)
         revenue_potential = leads_generated * average_lead_score * 100  # $100 per lead
@@ -405,10 +332,11 @@ def get_goals(
 ):
     """Get all analytics goals for the current user."""
     goals = db.query(Goals).filter(Goals.user_id == user.id).all()
+    current = calculate_current_values(user.id, [(GoalType(goal.goal_type), GoalPeriod(goal.period)) for goal in goals], db)
     result = []
     for goal in goals:
         # Update current value
-        goal.current = calculate_current_value(user.id, GoalType(goal.goal_type), GoalPeriod(goal.period), db)
+        goal.current = current[(GoalType(goal.goal_type), GoalPeriod(goal.period))]
         progress_percentage = min((goal.current / goal.target) * 100, 100) if goal.target > 0 else 0
         result.append(GoalResponse(
             id=goal.id,
@@ -489,26 +417,14 @@ def get_conversion_funnel(
 ):
     """Get conversion funnel analysis for the current user."""
     # Calculate funnel stages
-    total_jobs = db.query(Jobs).filter(Jobs.user_id == user.id).count()
-    completed_jobs = db.query(Jobs).filter(
-        Jobs.user_id == user.id,
-        Jobs.status == 'completed'
-    ).count()
-    total_leads = db.query(Leads).filter(Leads.user_id == user.id).count()
-    crm_leads = db.query(Leads).filter(
-        Leads.user_id == user.id,
-        Leads.status.in_(['new', 'contacted', 'qualified', 'converted'])
-    ).count()
+    metrics = metrics_snapshot(db, user.id)
+    total_jobs, completed_jobs = metrics['total_jobs'], metrics['jobs']['completed']
+    total_leads = metrics['total_leads']
+    crm_leads = sum(metrics['leads'][status] for status in ('new', 'contacted', 'qualified', 'converted'))
     # Estimate exports (jobs with results)
-    exported_jobs = db.query(Jobs).filter(
-        Jobs.user_id == user.id,
-        Jobs.status == 'completed'
-    ).count()  # Simplified - assume completed jobs are exported
+    exported_jobs = completed_jobs  # Simplified - assume completed jobs are exported
     # Estimate conversions (leads with status 'converted')
-    converted_leads = db.query(Leads).filter(
-        Leads.user_id == user.id,
-        Leads.status == 'converted'
-    ).count()
+    converted_leads = metrics['leads']['converted']
     funnel_stages = [
         FunnelStage(
             stage="Jobs Created",
@@ -559,17 +475,11 @@ def get_analytics_insights(
     insights = []
     
     # Get user statistics
-    total_jobs = db.query(Jobs).filter(Jobs.user_id == user.id).count()
-    completed_jobs = db.query(Jobs).filter(
-        Jobs.user_id == user.id,
-        Jobs.status == 'completed'
-    ).count()
+    metrics = metrics_snapshot(db, user.id)
+    total_jobs, completed_jobs = metrics['total_jobs'], metrics['jobs']['completed']
     
-    total_leads = db.query(Leads).filter(Leads.user_id == user.id).count()
-    converted_leads = db.query(Leads).filter(
-        Leads.user_id == user.id,
-        Leads.status == 'converted'
-    ).count()
+    total_leads = metrics['total_leads']
+    converted_leads = metrics['leads']['converted']
     
     # Calculate metrics
     job_success_rate = (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0
@@ -637,84 +547,211 @@ def get_analytics_insights(
     
     return insights
 
+def _live_daily_counts(db: Session, metric: str, user_id: int, since: datetime) -> List[Dict[str, Any]]:
+    days = (datetime.utcnow() - since).days + 2
+    points = timeseries.series(db, user_id, metric, "day", since, max_points=days)["points"]
+    return [{"date": point["start"].date().isoformat(), "count": point["value"]} for point in points if point["value"]]
+
+def _live_message_trends(db: Session, user_id: int, since: datetime) -> List[Dict[str, Any]]:
+    day = func.date(BulkWhatsAppMessages.created_at)
+    status = BulkWhatsAppMessages.status
+    rows = db.query(
+        day.label('date'),
+        func.count(BulkWhatsAppMessages.id),
+        func.sum(case((status.in_(['sent', 'delivered', 'read']), 1), else_=0)),
+        func.sum(case((status.in_(['delivered', 'read']), 1), else_=0)),
+        func.sum(case((status == 'read', 1), else_=0)),
+        func.sum(case((status == 'failed', 1), else_=0)),
+    ).join(BulkWhatsAppCampaigns, BulkWhatsAppMessages.campaign_id == BulkWhatsAppCampaigns.id).filter(
+        BulkWhatsAppCampaigns.user_id == user_id,
+        BulkWhatsAppMessages.created_at >= since
+    ).group_by(day).order_by(day).all()
+    return [
+        {"date": str(date), "count": count, "sent": int(sent or 0), "delivered": int(delivered or 0), "read": int(read or 0), "failed": int(failed or 0)}
+        for date, count, sent, delivered, read, failed in rows
+    ]
+
+def _live_query_performance(db: Session, user_id: int, since: datetime, limit: int) -> List[Dict[str, Any]]:
+    """Per-query stats over the user's jobs in the period (live: at most TOP_QUERIES_JOB_WINDOW recent jobs)"""
+    jobs = db.query(Jobs.queries, Jobs.status, Jobs.results_count, Jobs.duration_ms).filter(
+        Jobs.user_id == user_id,
+        Jobs.created_at >= since
+    ).order_by(desc(Jobs.created_at)).limit(TOP_QUERIES_JOB_WINDOW).all()
+    stats: Dict[str, Dict[str, Any]] = {}
+    for queries, status, results_count, duration_ms in jobs:
+        completed = JobStatus(getattr(status, "value", status)) == JobStatus.COMPLETED
+        for query in parse_queries(queries):
+            entry = stats.setdefault(query, {"jobs": 0, "completed_jobs": 0, "results": 0, "durations": []})
+            entry["jobs"] += 1
+            if completed:
+                entry["completed_jobs"] += 1
+                entry["results"] += results_count or 0
+                if duration_ms is not None:
+                    entry["durations"].append(duration_ms)
+    ranked = sorted(stats.items(), key=lambda item: (-item[1]["jobs"], item[0]))[:limit]
+    return [
+        {
+            "query": query,
+            "jobs": entry["jobs"],
+            "completed_jobs": entry["completed_jobs"],
+            "success_rate": round(entry["completed_jobs"] / entry["jobs"] * 100, 2),
+            "results": entry["results"],
+            "average_duration_ms": round(sum(entry["durations"]) / len(entry["durations"]), 1) if entry["durations"] else None,
+            "average_rating": None,
+        }
+        for query, entry in ranked
+    ]
+
+def _from_engine(report, live):
+    """Run a report on the analytics engine when its snapshots are fresh, else live"""
+    if analytics_engine.available:
+        try:
+            return report(), "snapshot"
+        except Exception:
+            logger.exception("Analytics engine query failed, running the report live")
+    return live(), "live"
+
 @router.get("/trends")
 def get_analytics_trends(
-    days: int = 30,
+    days: int = Query(30, ge=1, le=730, description="Number of days to include."),
     db: Session = Depends(get_db),
     user: Users = Depends(get_current_user)
 ):
-    """Get analytics trends over time"""
+    """Get analytics trends over time (daily jobs, leads and bulk WhatsApp messages)"""
     
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
-    
-    # Get daily job counts
-    daily_jobs = db.query(
-        db.func.date(Jobs.created_at).label('date'),
-        db.func.count(Jobs.id).label('count')
-    ).filter(
-        Jobs.user_id == user.id,
-        Jobs.created_at >= start_date
-    ).group_by(db.func.date(Jobs.created_at)).all()
+    # Whole days, so the cached daily buckets line up with the snapshot reports
+    start_date = timeseries.floor(datetime.utcnow() - timedelta(days=days), "day").replace(tzinfo=None)
     
-    # Get daily lead counts
-    daily_leads = db.query(
-        db.func.date(Leads.created_at).label('date'),
-        db.func.count(Leads.id).label('count')
-    ).filter(
-        Leads.user_id == user.id,
-        Leads.created_at >= start_date
-    ).group_by(db.func.date(Leads.created_at)).all()
+    def from_snapshots():
+        return {
+            "job_trends": analytics_engine.daily_counts("jobs", user.id, start_date),
+            "lead_trends": analytics_engine.daily_counts("leads", user.id, start_date),
+            "message_trends": analytics_engine.message_trends(user.id, start_date),
+        }
     
-    # Format data for charts
-    job_trends = [{"date": str(job.date), "count": job.count} for job in daily_jobs]
-    lead_trends = [{"date": str(lead.date), "count": lead.count} for lead in daily_leads]
+    def live():
+        return {
+            "job_trends": _live_daily_counts(db, "jobs", user.id, start_date),
+            "lead_trends": _live_daily_counts(db, "leads", user.id, start_date),
+            "message_trends": _live_message_trends(db, user.id, start_date),
+        }
     
-    return {
-        "period_days": days,
-        "job_trends": job_trends,
-        "lead_trends": lead_trends
-    }
+    trends, source = _from_engine(from_snapshots, live)
+    return {"period_days": days, **trends, "source": source}
 
-def calculate_current_value(user_id: int, goal_type: GoalType, period: GoalPeriod, db: Session) -> float:
-    """Calculate current value for a goal based on type and period"""
-    
+@router.get("/timeseries", summary="Get a metric over time")
+def get_timeseries(
+    metric: str = Query("jobs", regex="^(jobs|leads|completed_jobs|results)$", description="Metric to count."),
+    interval: str = Query("day", regex="^(hour|day|week|month)$", description="Bucket size; coarsened if the range needs more than max_points."),
+    start: Optional[datetime] = Query(None, description="Range start (default: 30 days before end)."),
+    end: Optional[datetime] = Query(None, description="Range end (default and latest: now)."),
+    max_points: int = Query(timeseries.DEFAULT_MAX_POINTS, ge=2, le=1000, description="Maximum number of points."),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    """Bucketed counts for dashboards and charts, downsampled to at most max_points points (UTC buckets)"""
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return timeseries.series(db, user.id, metric, interval, start, end, max_points)
+
+@router.get("/queries", summary="Get per-query performance")
+def get_query_performance(
+    days: int = Query(90, ge=1, le=730, description="Number of days to include."),
+    limit: int = Query(20, ge=1, le=100, description="Number of queries to return."),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    """Jobs, success rate, results and run time per search query, most used first"""
+    if not check_permission(user, "analytics", "read", db):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    start_date = datetime.utcnow() - timedelta(days=days)
+    queries, source = _from_engine(
+        lambda: analytics_engine.query_performance(user.id, start_date, limit),
+        lambda: _live_query_performance(db, user.id, start_date, limit),
+    )
+    return {"period_days": days, "queries": queries, "source": source}
+
+@router.get("/queries/top", summary="Get top queries")
+def get_top_queries(
+    scope: str = Query("user", regex="^(user|global)$", description="Your queries (user) or everyone's (global)."),
+    limit: int = Query(10, ge=1, le=100, description="Number of queries to return."),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    """Most successful queries by completed runs, with average results, new businesses and run time"""
+    if not check_permission(user, "analytics", "read", db):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    return {"scope": scope, "queries": query_stats.top_queries(db, user.id if scope == "user" else None, limit=limit)}
+
+@router.get("/queries/estimate", summary="Estimate a query's yield")
+def estimate_query(
+    q: str = Query(..., min_length=1, max_length=500, description="Search query to estimate."),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    """Expected results, new businesses and run time of a query, from past runs (yours if enough, else everyone's)"""
+    return {"query": q, "estimate": query_stats.estimate(db, q, user.id)}
+
+@router.get("/engine", summary="Get analytics engine status")
+def get_analytics_engine_status(
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    """Snapshot freshness and part files per table. Admin access required."""
+    if not check_permission(user, "admin", "read", db):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return analytics_engine.status()
+
+# Trailing window per goal period, and the assumed value of a lead for revenue goals
+GOAL_PERIOD_DAYS = {GoalPeriod.DAILY: 1, GoalPeriod.WEEKLY: 7, GoalPeriod.MONTHLY: 30}
+REVENUE_PER_LEAD = 50.0
+
+def calculate_current_values(user_id: int, goals: List[tuple], db: Session) -> Dict[tuple, float]:
+    """Current value for each (goal type, period) pair.
+
+    One aggregate query over leads and one over jobs cover every period window, however
+    many goals there are (exports are counted as completed jobs, revenue from leads)."""
+    goals = set(goals)
     now = datetime.utcnow()
+    starts = {period: now - timedelta(days=GOAL_PERIOD_DAYS[period]) for _, period in goals}
+    lead_periods = sorted({period for goal_type, period in goals if goal_type in (GoalType.LEADS, GoalType.REVENUE)})
+    job_periods = sorted({period for goal_type, period in goals if goal_type in (GoalType.JOBS, GoalType.EXPORTS)})
     
-    if period == GoalPeriod.DAILY:
-        start_date = now - timedelta(days=1)
-    elif period == GoalPeriod.WEEKLY:
-        start_date = now - timedelta(weeks=1)
-    else:  # MONTHLY
-        start_date = now - timedelta(days=30)
-    
-    if goal_type == GoalType.LEADS:
-        return db.query(Leads).filter(
+    leads = {}
+    if lead_periods:
+        row = db.query(*[func.count(case((Leads.created_at >= starts[period], Leads.id))) for period in lead_periods]).filter(
             Leads.user_id == user_id,
-            Leads.created_at >= start_date
-        ).count()
+            Leads.created_at >= min(starts[period] for period in lead_periods)
+        ).one()
+        leads = dict(zip(lead_periods, row))
     
-    elif goal_type == GoalType.JOBS:
-        return db.query(Jobs).filter(
+    jobs, completed = {}, {}
+    if job_periods:
+        row = db.query(*[
+            func.count(case((condition, Jobs.id)))
+            for period in job_periods
+            for condition in (Jobs.created_at >= starts[period], and_(Jobs.created_at >= starts[period], Jobs.status == JobStatus.COMPLETED))
+        ]).filter(
             Jobs.user_id == user_id,
-            Jobs.created_at >= start_date
-        ).count()
+            Jobs.created_at >= min(starts[period] for period in job_periods)
+        ).one()
+        jobs = dict(zip(job_periods, row[0::2]))
+        completed = dict(zip(job_periods, row[1::2]))
     
-    elif goal_type == GoalType.EXPORTS:
-        # Simplified - count completed jobs as exports
-        return db.query(Jobs).filter(
-            Jobs.user_id == user_id,
-            Jobs.status == 'completed',
-            Jobs.created_at >= start_date
-        ).count()
-    
-    elif goal_type == GoalType.REVENUE:
-        # Simplified revenue calculation based on leads
-        leads = db.query(Leads).filter(
-            Leads.user_id == user_id,
-            Leads.created_at >= start_date
-        ).count()
-        # Assume $50 average value per lead
-        return leads * 50.0
-    
-    return 0.0 
\ No newline at end of file
+    values = {}
+    for goal_type, period in goals:
+        if goal_type == GoalType.LEADS:
+            values[(goal_type, period)] = leads[period]
+        elif goal_type == GoalType.REVENUE:
+            values[(goal_type, period)] = leads[period] * REVENUE_PER_LEAD
+        elif goal_type == GoalType.JOBS:
+            values[(goal_type, period)] = jobs[period]
+        elif goal_type == GoalType.EXPORTS:
+            values[(goal_type, period)] = completed[period]
+        else:
+            values[(goal_type, period)] = 0.0
+    return values
+
+def calculate_current_value(user_id: int, goal_type: GoalType, period: GoalPeriod, db: Session) -> float:
+    """Calculate current value for a goal based on type and period"""
+    return calculate_current_values(user_id, [(goal_type, period)], db)[(goal_type, period)]
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
-from models import Users, Jobs, Leads
+from typing import Dict, Any, List, Optional
+from models import Users, LeadStatus
 from database import get_db
 from auth import get_current_user
 from datetime import datetime
-from audit import audit_log
+from audit import audit_log, record_action
 from security import check_permission
+from user_metrics import metrics_snapshot
+from export_formats import MEDIA_TYPES, available
+from export_jobs import lead_columns, lead_query, stream_query
 
 import csv
 import io
@@ -30,6 +34,8 @@ class JobStatistics(BaseModel):
     completed_jobs: int = Field(..., description="Number of completed jobs", example=35)
     failed_jobs: int = Field(..., description="Number of failed jobs", example=2)
     success_rate: float = Field(..., description="Success rate as a percentage", example=83.3)
+    results_collected: int = Field(..., description="Results collected by completed jobs", example=1250)
+    average_duration_seconds: Optional[float] = Field(None, description="Average run time of completed jobs", example=42.5)
 
 class LeadStatistics(BaseModel):
     total_leads: int = Field(..., description="Total number of leads", example=100)
@@ -58,18 +64,20 @@ def export_analytics(
 ):
     """Export analytics data in CSV, JSON, XLSX, or PDF format."""
     # Generate analytics data
-    total_jobs = db.query(Jobs).filter(Jobs.user_id == user.id).count()
-    completed_jobs = db.query(Jobs).filter(Jobs.user_id == user.id, Jobs.status == 'completed').count()
-    failed_jobs = db.query(Jobs).filter(Jobs.user_id == user.id, Jobs.status == 'failed').count()
-    total_leads = db.query(Leads).filter(Leads.user_id == user.id).count()
-    new_leads = db.query(Leads).filter(Leads.user_id == user.id, Leads.status == 'new').count()
-    converted_leads = db.query(Leads).filter(Leads.user_id == user.id, Leads.status == 'converted').count()
+    metrics = metrics_snapshot(db, user.id)
+    total_jobs, completed_jobs = metrics['total_jobs'], metrics['jobs']['completed']
+    average_duration_ms = metrics['average_job_duration_ms']
+    total_leads = metrics['total_leads']
+    new_leads = metrics['leads']['new']
+    converted_leads = metrics['leads']['converted']
     analytics_data = {
         'job_statistics': {
             'total_jobs': total_jobs,
             'completed_jobs': completed_jobs,
-            'failed_jobs': failed_jobs,
-            'success_rate': (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0
+            'failed_jobs': metrics['jobs']['failed'],
+            'success_rate': (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0,
+            'results_collected': metrics['job_results'],
+            'average_duration_seconds': round(average_duration_ms / 1000, 2) if average_duration_ms is not None else None
         },
         'lead_statistics': {
             'total_leads': total_leads,
@@ -121,4 +129,37 @@ def export_analytics(
         # PDF export can be implemented with reportlab or similar
         return Response(content="PDF export not implemented yet", media_type="text/plain")
     else:
-        raise HTTPException(status_code=400, detail="Invalid export format") 
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Invalid export format")
+
+@router.get(
+    "/leads",
+    summary="Export leads",
+    description="Stream the current user's leads as CSV, NDJSON or Parquet, optionally filtered, projected onto chosen columns and gzipped. Rows are read in batches, so memory use doesn't grow with the number of leads."
+)
+def export_leads(
+    format: str = Query("csv", regex="^(csv|ndjson|parquet)$", description="Export format: csv, ndjson, parquet"),
+    columns: Optional[str] = Query(None, description="Comma-separated lead columns to include (default: all)", example="name,email,status"),
+    status: Optional[List[LeadStatus]] = Query(None, description="Only leads with these statuses"),
+    source: Optional[str] = Query(None, description="Only leads from this source"),
+    created_after: Optional[datetime] = Query(None, description="Only leads created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only leads created before this time"),
+    min_score: Optional[float] = Query(None, description="Only leads scoring at least this much"),
+    gzip: bool = Query(False, description="Compress the response body with gzip (Content-Encoding: gzip)"),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    """Stream the current user's leads."""
+    reason = available(format)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+    try:
+        selected = lead_columns(columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stmt = lead_query(user.id, selected, status, source, created_after, created_before, min_score)
+    record_action(db, user.id, "export_leads", "user", details=f"leads as {format}")
+    headers = {"Content-Disposition": f"attachment; filename=leads.{format}"}
+    if gzip:
+        # GZipMiddleware leaves responses that already set Content-Encoding alone
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(stream_query(stmt, format, compress=gzip), media_type=MEDIA_TYPES[format], headers=headers)
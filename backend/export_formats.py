@@ -0,0 +1,198 @@
+"""
+Row writers for LeadTap Platform exports
+Incremental CSV, NDJSON, XLSX and Parquet writers over a binary file object: rows are
+written a batch at a time, so exports never hold more than one batch in memory. stream()
+turns the same writers into an HTTP body, optionally gzipped on the fly.
+XLSX needs xlsxwriter and Parquet needs pyarrow; both are optional.
+"""
+
+import csv
+import enum
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Numeric
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = parquet = None
+
+FORMATS = ("csv", "ndjson", "xlsx", "parquet")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+XLSX_MAX_ROWS = 1048575  # plus the header row
+
+# (name, SQL type or None); the type picks the Parquet column type
+Column = Tuple[str, Any]
+
+class ExportFormatError(Exception):
+    """The format can't be written here (missing package or too many rows)"""
+
+def plain(value: Any) -> Any:
+    """A JSON-compatible value"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def flat(value: Any) -> Any:
+    """A single-cell value: nested lists and objects as JSON"""
+    value = plain(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return value
+
+class CSVWriter:
+    def __init__(self, out: BinaryIO, columns: Sequence[Column]):
+        self.text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+        self.writer = csv.writer(self.text)
+        self.writer.writerow([name for name, _ in columns])
+
+    def write(self, rows: List[Sequence[Any]]):
+        self.writer.writerows([flat(value) for value in row] for row in rows)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()  # leave the underlying file open for the caller
+
+class NDJSONWriter:
+    def __init__(self, out: BinaryIO, columns: Sequence[Column]):
+        self.out = out
+        self.names = [name for name, _ in columns]
+
+    def write(self, rows: List[Sequence[Any]]):
+        self.out.write("".join(
+            json.dumps({name: plain(value) for name, value in zip(self.names, row)}, default=str) + "\n" for row in rows
+        ).encode("utf-8"))
+
+    def close(self):
+        pass
+
+class XLSXWriter:
+    def __init__(self, out: BinaryIO, columns: Sequence[Column]):
+        if xlsxwriter is None:
+            raise ExportFormatError("XLSX exports need the xlsxwriter package")
+        # constant_memory flushes each row to a temp file as soon as the next starts
+        self.workbook = xlsxwriter.Workbook(out, {"constant_memory": True, "remove_timezone": True})
+        self.sheet = self.workbook.add_worksheet()
+        self.sheet.write_row(0, 0, [name for name, _ in columns])
+        self.row = 1
+
+    def write(self, rows: List[Sequence[Any]]):
+        if self.row + len(rows) > XLSX_MAX_ROWS + 1:
+            raise ExportFormatError(f"XLSX exports are limited to {XLSX_MAX_ROWS} rows")
+        for row in rows:
+            self.sheet.write_row(self.row, 0, [flat(value) for value in row])
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+def _arrow_type(sql_type: Any):
+    if isinstance(sql_type, Boolean):
+        return pyarrow.bool_()
+    if isinstance(sql_type, Integer):
+        return pyarrow.int64()
+    if isinstance(sql_type, (Float, Numeric)):
+        return pyarrow.float64()
+    if isinstance(sql_type, DateTime):
+        return pyarrow.timestamp("us", tz="UTC")
+    return pyarrow.string()
+
+class ParquetWriter:
+    def __init__(self, out: BinaryIO, columns: Sequence[Column]):
+        if parquet is None:
+            raise ExportFormatError("Parquet exports need the pyarrow package")
+        self.schema = pyarrow.schema([(name, _arrow_type(sql_type)) for name, sql_type in columns])
+        self.writer = parquet.ParquetWriter(out, self.schema, compression="zstd")
+
+    def write(self, rows: List[Sequence[Any]]):
+        # One row group per batch
+        arrays = []
+        for index, field in enumerate(self.schema):
+            values = [row[index] for row in rows]
+            if pyarrow.types.is_string(field.type):
+                values = [None if value is None else str(flat(value)) for value in values]
+            else:
+                values = [plain(value) if isinstance(value, (enum.Enum, Decimal)) else value for value in values]
+            arrays.append(pyarrow.array(values, type=field.type))
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {"csv": CSVWriter, "ndjson": NDJSONWriter, "xlsx": XLSXWriter, "parquet": ParquetWriter}
+
+def open_writer(format: str, out: BinaryIO, columns: Sequence[Column]):
+    """A writer for format over out; raises ExportFormatError if it can't be written"""
+    if format not in WRITERS:
+        raise ExportFormatError(f"Unknown export format: {format}")
+    return WRITERS[format](out, columns)
+
+def available(format: str) -> Optional[str]:
+    """None if format can be written here, else the reason it can't"""
+    if format == "xlsx" and xlsxwriter is None:
+        return "XLSX exports need the xlsxwriter package"
+    if format == "parquet" and parquet is None:
+        return "Parquet exports need the pyarrow package"
+    return None
+
+class _Chunks(io.RawIOBase):
+    """Write-only sink that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def stream(format: str, columns: Sequence[Column], batches: Iterable[List[Sequence[Any]]], compress: bool = False) -> Iterator[bytes]:
+    """Encode batches of rows as format, yielding the bytes of each batch as it's written"""
+    sink = _Chunks()
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31: gzip framing
+    writer = open_writer(format, sink, columns)
+
+    def emit(data: bytes) -> bytes:
+        return gzip.compress(data) if gzip else data
+
+    for rows in batches:
+        writer.write(rows)
+        data = emit(sink.drain())
+        if data:
+            yield data
+    writer.close()
+    yield emit(sink.drain()) + (gzip.flush() if gzip else b"")
@@ -0,0 +1,446 @@
+"""
+Background export jobs for LeadTap Platform
+Large exports run outside the request: POST /api/export/jobs records an ExportJobs row,
+the export worker streams the rows to a file (CSV, NDJSON, XLSX or Parquet) a batch at a
+time with a server-side cursor, reporting progress as it goes, and the file is downloaded
+with HTTP range support so big downloads can resume. A finished export is reused for
+identical requests until the user's jobs or leads change (its cache entry carries the
+user's cache tag) and deleted after EXPORT_RETENTION_SECONDS. A running export whose
+heartbeat is older than EXPORT_STALE_SECONDS (its worker died) is marked failed.
+"""
+
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import Float, String, func, select, update
+from sqlalchemy.orm import Session
+
+from audit import record_action
+from auth import get_current_user
+from cache import CacheKeys, CacheTags, cache_manager
+from cache_invalidation import pending_tags
+from config import settings
+from database import SessionLocal, get_db
+from export_formats import MEDIA_TYPES, Column, available, open_writer, stream
+from models import ExportJobs, JobResults, Jobs, LeadStatus, Leads, Users
+from user_metrics import metrics_snapshot
+
+logger = logging.getLogger("export_jobs")
+
+router = APIRouter(prefix="/api/export/jobs", tags=["export"])
+
+# Exportable tables: columns in file order, owner column, and a join to reach the owner
+EXPORT_TABLES: Dict[str, Dict[str, Any]] = {
+    "leads": {
+        "columns": (
+            Leads.id, Leads.name, Leads.email, Leads.phone, Leads.company, Leads.website, Leads.status,
+            Leads.source, Leads.score, Leads.notes, Leads.created_at, Leads.updated_at,
+        ),
+        "owner": Leads.user_id,
+    },
+    "jobs": {
+        "columns": (
+            Jobs.id, Jobs.status, Jobs.queries, Jobs.results_count, Jobs.duration_ms,
+            Jobs.created_at, Jobs.started_at, Jobs.completed_at,
+        ),
+        "owner": Jobs.user_id,
+    },
+    "job_results": {
+        "columns": (
+            JobResults.id, JobResults.job_id, JobResults.business_name, JobResults.address, JobResults.phone,
+            JobResults.website, JobResults.email, JobResults.rating, JobResults.reviews_count,
+            JobResults.category, JobResults.created_at,
+        ),
+        "owner": Jobs.user_id,
+        "join": (Jobs, JobResults.job_id == Jobs.id),
+    },
+}
+
+ACTIVE_STATUSES = ("pending", "running")
+
+def _utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment is None:
+        return None
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+def _stale_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.EXPORT_STALE_SECONDS)
+
+def is_stale(export: ExportJobs) -> bool:
+    """A running export whose worker stopped reporting progress"""
+    heartbeat = _utc(export.heartbeat_at or export.started_at)
+    return export.status == "running" and (heartbeat is None or heartbeat < _stale_cutoff())
+
+def table_columns(kind: str) -> List[Column]:
+    return [(column.key, column.type) for column in EXPORT_TABLES[kind]["columns"]]
+
+def table_query(kind: str, user_id: int, columns=None):
+    """SELECT of a user's rows of an exportable table, in id order"""
+    spec = EXPORT_TABLES[kind]
+    stmt = select(*(columns or spec["columns"]))
+    if "join" in spec:
+        stmt = stmt.join(*spec["join"])
+    return stmt.where(spec["owner"] == user_id).order_by(spec["columns"][0])
+
+def analytics_rows(db: Session, user_id: int) -> List[Tuple[str, Any]]:
+    """The user's metrics snapshot as (metric, value) rows"""
+    rows = []
+    for name, value in metrics_snapshot(db, user_id).items():
+        if isinstance(value, dict):
+            rows.extend((f"{name}.{status}", count) for status, count in value.items())
+        else:
+            rows.append((name, value))
+    return rows
+
+def lead_columns(names: Optional[str] = None) -> List[Any]:
+    """Lead columns for a comma-separated projection (all columns if empty)"""
+    columns = {column.key: column for column in EXPORT_TABLES["leads"]["columns"]}
+    if not names:
+        return list(columns.values())
+    selected = [name.strip() for name in names.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in columns]
+    if unknown or not selected:
+        raise ValueError(f"Unknown lead columns: {', '.join(unknown)}. Available: {', '.join(columns)}")
+    return [columns[name] for name in dict.fromkeys(selected)]
+
+def lead_query(
+    user_id: int,
+    columns: List[Any],
+    statuses: Optional[List[LeadStatus]] = None,
+    source: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    min_score: Optional[float] = None,
+):
+    """SELECT of a user's leads matching the filters, projected onto columns, in id order"""
+    stmt = table_query("leads", user_id, columns)
+    if statuses:
+        stmt = stmt.where(Leads.status.in_(statuses))
+    if source:
+        stmt = stmt.where(Leads.source == source)
+    if created_after:
+        stmt = stmt.where(Leads.created_at >= created_after)
+    if created_before:
+        stmt = stmt.where(Leads.created_at < created_before)
+    if min_score is not None:
+        stmt = stmt.where(Leads.score >= min_score)
+    return stmt
+
+def stream_query(stmt, format: str, compress: bool = False, session_factory=None, batch_size: int = None) -> Iterator[bytes]:
+    """Stream a SELECT's rows as a file body, straight from a yield_per cursor.
+
+    Runs on its own session, opened when the response starts and closed when it ends."""
+    columns = [(column.key, column.type) for column in stmt.selected_columns]
+    db = (session_factory or SessionLocal)()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=batch_size or settings.EXPORT_BATCH_SIZE))
+        yield from stream(format, columns, (list(rows) for rows in result.partitions()), compress=compress)
+    finally:
+        db.close()
+
+class ExportManager:
+    """Creates export jobs and writes their files"""
+
+    def __init__(self, directory: str = None, session_factory=None, batch_size: int = None):
+        self.directory = directory or settings.EXPORT_DIR
+        self.session_factory = session_factory or SessionLocal
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+
+    def path_for(self, export: ExportJobs) -> str:
+        return os.path.join(self.directory, str(export.user_id), f"export-{export.id}.{export.format}")
+
+    def request(self, db: Session, user_id: int, kind: str, format: str) -> Tuple[ExportJobs, bool]:
+        """An export of the user's current data: an identical pending, running or finished
+        export if nothing changed since it was requested, else a new pending job.
+        Returns (export, reused)."""
+        key, tags = CacheKeys.export_job(user_id, kind, format), [CacheTags.user(user_id)]
+        if tags[0] not in pending_tags(db):
+            export_id = cache_manager.get(key, tags=tags)
+            export = db.get(ExportJobs, export_id) if export_id else None
+            if export is not None and export.user_id == user_id and (
+                (export.status in ACTIVE_STATUSES and not is_stale(export))
+                or (export.status == "completed" and os.path.exists(export.file_path or ""))
+            ):
+                return export, True
+        export = ExportJobs(user_id=user_id, kind=kind, format=format, status="pending")
+        db.add(export)
+        db.commit()
+        cache_manager.set(key, export.id, settings.EXPORT_RETENTION_SECONDS, tags=tags)
+        return export, False
+
+    def run_once(self) -> int:
+        """Expire old files and fail stale exports, then run every pending export. Returns the number run."""
+        self.expire()
+        self.fail_stale()
+        db = self.session_factory()
+        try:
+            pending = db.execute(select(ExportJobs.id).where(ExportJobs.status == "pending").order_by(ExportJobs.id)).scalars().all()
+        finally:
+            db.close()
+        return sum(1 for export_id in pending if self.run(export_id))
+
+    def run(self, export_id: int) -> bool:
+        """Claim and write one pending export (False if another worker claimed it)"""
+        db, now = self.session_factory(), datetime.now(timezone.utc)
+        try:
+            claimed = db.execute(
+                update(ExportJobs)
+                .where(ExportJobs.id == export_id, ExportJobs.status == "pending")
+                .values(status="running", started_at=now, heartbeat_at=now)
+            ).rowcount
+            db.commit()
+            if claimed:
+                self._write(db, db.get(ExportJobs, export_id))
+            return bool(claimed)
+        finally:
+            db.close()
+
+    def _batches(self, reader: Session, export: ExportJobs) -> Tuple[List[Column], int, Iterator[List[Any]]]:
+        if export.kind == "analytics":
+            rows = analytics_rows(reader, export.user_id)
+            return [("metric", String()), ("value", Float())], len(rows), iter([rows])
+        stmt = table_query(export.kind, export.user_id)
+        total = reader.execute(select(func.count()).select_from(stmt.order_by(None).subquery())).scalar() or 0
+        # Server-side cursor: rows arrive batch_size at a time
+        result = reader.execute(stmt.execution_options(yield_per=self.batch_size))
+        return table_columns(export.kind), total, (list(rows) for rows in result.partitions())
+
+    def _write(self, db: Session, export: ExportJobs):
+        path = self.path_for(export)
+        partial = f"{path}.part"
+        reader = self.session_factory()
+        try:
+            reason = available(export.format)
+            if reason:
+                raise ValueError(reason)
+            columns, export.rows_total, batches = self._batches(reader, export)
+            db.commit()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(partial, "wb") as out:
+                writer = open_writer(export.format, out, columns)
+                for rows in batches:
+                    writer.write(rows)
+                    export.rows_written = (export.rows_written or 0) + len(rows)
+                    export.heartbeat_at = datetime.now(timezone.utc)
+                    db.commit()
+                writer.close()
+            os.replace(partial, path)
+            export.status, export.file_path, export.file_size = "completed", path, os.path.getsize(path)
+            export.completed_at = datetime.now(timezone.utc)
+            db.commit()
+        except Exception as e:
+            logger.exception(f"Export {export.id} failed")
+            db.rollback()
+            export.status, export.error, export.completed_at = "failed", str(e)[:1000], datetime.now(timezone.utc)
+            db.commit()
+            if os.path.exists(partial):
+                os.remove(partial)
+        finally:
+            reader.close()
+
+    def fail_stale(self) -> int:
+        """Fail running exports whose worker stopped sending heartbeats (died or restarted)"""
+        cutoff = _stale_cutoff()
+        db = self.session_factory()
+        try:
+            stale = db.execute(
+                update(ExportJobs)
+                .where(ExportJobs.status == "running", func.coalesce(ExportJobs.heartbeat_at, ExportJobs.started_at) < cutoff)
+                .values(status="failed", error="Export worker stopped before the export finished", completed_at=datetime.now(timezone.utc))
+            ).rowcount
+            db.commit()
+            if stale:
+                logger.warning(f"Failed {stale} stale exports")
+            return stale
+        finally:
+            db.close()
+
+    def expire(self) -> int:
+        """Delete files of exports finished more than EXPORT_RETENTION_SECONDS ago"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.EXPORT_RETENTION_SECONDS)
+        db = self.session_factory()
+        try:
+            expired = db.execute(
+                select(ExportJobs).where(ExportJobs.status == "completed", ExportJobs.completed_at < cutoff)
+            ).scalars().all()
+            for export in expired:
+                if export.file_path and os.path.exists(export.file_path):
+                    os.remove(export.file_path)
+                export.status = "expired"
+            db.commit()
+            return len(expired)
+        finally:
+            db.close()
+
+class ExportWorker:
+    """Background thread that runs pending exports, woken early when one is requested"""
+
+    def __init__(self, manager: ExportManager, interval_seconds: int = None):
+        self.manager = manager
+        self.interval_seconds = interval_seconds or settings.EXPORT_POLL_INTERVAL_SECONDS
+        self.running = False
+        self.thread = None
+        self._wake_event = threading.Event()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self._wake_event.clear()
+            self.thread = threading.Thread(target=self._run, name="export-worker")
+            self.thread.daemon = True
+            self.thread.start()
+            logger.info("Export worker started")
+
+    def stop(self):
+        self.running = False
+        self._wake_event.set()
+        if self.thread:
+            self.thread.join()
+        logger.info("Export worker stopped")
+
+    def notify(self):
+        self._wake_event.set()
+
+    def _run(self):
+        while self.running:
+            try:
+                self.manager.run_once()
+            except Exception:
+                logger.exception("Error in export worker loop")
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+
+export_manager = ExportManager()
+export_worker = ExportWorker(export_manager)
+
+# --- Range downloads ---
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def _byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte of a single-range Range header; None for the whole file.
+    Raises ValueError if the range can't be satisfied."""
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(header)
+    first, last = match.groups()
+    if first == "":  # suffix: the last N bytes
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+def _read(path: str, first: int, length: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as source:
+        source.seek(first)
+        while length > 0:
+            chunk = source.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def file_response(path: str, media_type: str, filename: str, range_header: Optional[str] = None) -> StreamingResponse:
+    """Stream a file, or the byte range asked for (206), advertising range support.
+
+    Sent as Content-Encoding: identity so GZipMiddleware leaves the body alone;
+    byte ranges and Content-Length refer to the file as stored."""
+    size = os.path.getsize(path)
+    headers = {"Accept-Ranges": "bytes", "Content-Disposition": f"attachment; filename={filename}", "Content-Encoding": "identity"}
+    try:
+        byte_range = _byte_range(range_header, size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_read(path, 0, size), media_type=media_type, headers=headers)
+    first, last = byte_range
+    headers.update({"Content-Range": f"bytes {first}-{last}/{size}", "Content-Length": str(last - first + 1)})
+    return StreamingResponse(_read(path, first, last - first + 1), status_code=206, media_type=media_type, headers=headers)
+
+# --- API ---
+
+class ExportJobIn(BaseModel):
+    kind: str = Field(..., regex="^(leads|jobs|job_results|analytics)$", description="What to export.", example="leads")
+    format: str = Field("csv", regex="^(csv|ndjson|xlsx|parquet)$", description="File format.", example="csv")
+
+class ExportJobOut(BaseModel):
+    id: int
+    kind: str
+    format: str
+    status: str = Field(..., description="pending, running, completed, failed or expired")
+    rows_total: Optional[int] = None
+    rows_written: int = 0
+    progress: float = Field(..., description="Percentage of rows written")
+    file_size: Optional[int] = None
+    error: Optional[str] = None
+    reused: bool = Field(False, description="An identical export of unchanged data was returned")
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+def _out(export: ExportJobs, reused: bool = False) -> ExportJobOut:
+    if export.status == "completed":
+        progress = 100.0
+    else:
+        progress = round((export.rows_written or 0) / export.rows_total * 100, 1) if export.rows_total else 0.0
+    return ExportJobOut(
+        id=export.id, kind=export.kind, format=export.format, status=export.status,
+        rows_total=export.rows_total, rows_written=export.rows_written or 0, progress=progress,
+        file_size=export.file_size, error=export.error, reused=reused,
+        created_at=export.created_at, completed_at=export.completed_at,
+    )
+
+def _owned(db: Session, export_id: int, user: Users) -> ExportJobs:
+    export = db.get(ExportJobs, export_id)
+    if export is None or export.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return export
+
+@router.post("", response_model=ExportJobOut, status_code=202, summary="Request an export", description="Start a background export of leads, jobs, job results or analytics.")
+def request_export(
+    data: ExportJobIn = Body(...),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    reason = available(data.format)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+    export, reused = export_manager.request(db, user.id, data.kind, data.format)
+    record_action(db, user.id, "request_export", "export", export.id, f"{data.kind} as {data.format}")
+    if not reused:
+        export_worker.notify()
+    return _out(export, reused)
+
+@router.get("", response_model=List[ExportJobOut], summary="List exports", description="The current user's most recent exports.")
+def list_exports(db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
+    exports = db.execute(
+        select(ExportJobs).where(ExportJobs.user_id == user.id).order_by(ExportJobs.id.desc()).limit(50)
+    ).scalars()
+    return [_out(export) for export in exports]
+
+@router.get("/{export_id}", response_model=ExportJobOut, summary="Get export progress")
+def get_export(export_id: int = Path(..., description="ID of the export."), db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
+    return _out(_owned(db, export_id, user))
+
+@router.get("/{export_id}/download", summary="Download an export", description="Download a finished export. Supports HTTP Range requests.")
+def download_export(
+    request: Request,
+    export_id: int = Path(..., description="ID of the export."),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    export = _owned(db, export_id, user)
+    if export.status != "completed" or not export.file_path or not os.path.exists(export.file_path):
+        raise HTTPException(status_code=409, detail=f"Export is {export.status}")
+    return file_response(export.file_path, MEDIA_TYPES[export.format], f"{export.kind}-{export.id}.{export.format}", request.headers.get("range"))
@@ -3,10 +3,13 @@ from fastapi import APIRouter, Request, Depends, HTTPException
 from strawberry.fastapi import GraphQLRouter
 from models import Users, Leads, Notifications
 from database import SessionLocal
+from lead_ingest import ingest_leads
+from queries import user_by_id
 from jose import jwt, JWTError
 from config import SECRET_KEY, ALGORITHM
 from typing import List, Optional
 import sqlalchemy
+from sqlalchemy.exc import IntegrityError
 
 # Strawberry types
 @strawberry.type
@@ -59,7 +62,7 @@ class Context:
                     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
                     user_id = payload.get("sub")
                     if user_id:
-                        self.current_user = db.query(Users).filter(Users.id == int(user_id)).first()
+                        self.current_user = user_by_id(db, int(user_id))
                 except JWTError:
                     pass
         finally:
@@ -152,7 +155,11 @@ class Mutation:
             user_id=user.id
         )
         db.add(lead)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            db.close()
+            raise HTTPException(status_code=409, detail="A lead with this email already exists")
         db.refresh(lead)
         db.close()
         return lead
@@ -170,7 +177,11 @@ class Mutation:
         for field, value in input.__dict__.items():
             if value is not None:
                 setattr(lead, field, value)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            db.close()
+            raise HTTPException(status_code=409, detail="A lead with this email already exists")
         db.refresh(lead)
         db.close()
         return lead
@@ -196,24 +207,22 @@ class Mutation:
         if not user:
             raise HTTPException(status_code=401, detail="Authentication required")
         db = SessionLocal()
-        count = 0
-        for lead_data in leads:
-            lead = Leads(
-                name=lead_data.name,
-                email=lead_data.email,
-                phone=lead_data.phone,
-                company=lead_data.company,
-                tag=lead_data.tag,
-                notes=lead_data.notes,
-                status=lead_data.status or 'new',
-                source=lead_data.source or 'import',
-                user_id=user.id
-            )
-            db.add(lead)
-            count += 1
-        db.commit()
-        db.close()
-        return count
+        try:
+            result = ingest_leads(db, user.id, (
+                {
+                    "name": lead_data.name,
+                    "email": lead_data.email,
+                    "phone": lead_data.phone,
+                    "company": lead_data.company,
+                    "tag": lead_data.tag,
+                    "notes": lead_data.notes,
+                    "status": lead_data.status or 'new',
+                    "source": lead_data.source or 'import',
+                } for lead_data in leads
+            ), on_conflict="ignore")
+        finally:
+            db.close()
+        return result["inserted"]
 
     @strawberry.mutation
     def mark_notification_read(self, info, notification_id: int) -> Optional[NotificationType]:
@@ -6,6 +6,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from database import get_db
 from models import Tenant
+from response_cache import cached_response
 
 router = APIRouter(prefix="/api/integrations", tags=["integrations"])
 
@@ -90,6 +91,7 @@ INTEGRATIONS = [
 ]
 
 @router.get("/", response_model=IntegrationsListOut, summary="List available integrations", description="Get all available integrations and setup URLs.")
+@cached_response(ttl=3600, max_age=300)
 def list_integrations():
     """Get all available integrations and setup URLs."""
     return {"integrations": INTEGRATIONS}
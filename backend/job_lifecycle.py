@@ -0,0 +1,63 @@
+"""
+Job lifecycle bookkeeping for LeadTap Platform
+Stamps started_at, completed_at and duration_ms on a job when its status changes, and
+fills results_count from its JobResults rows on completion, in the same flush as the
+status change. Aggregates can then SUM/AVG these columns instead of loading jobs.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from models import JobResults, JobStatus, Jobs
+
+TERMINAL_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+def _status(value: Any) -> Optional[JobStatus]:
+    try:
+        return JobStatus(getattr(value, "value", value))
+    except ValueError:
+        return None
+
+def _utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment is None:
+        return None
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+def duration_ms(started_at: Optional[datetime], completed_at: Optional[datetime]) -> Optional[int]:
+    """Milliseconds between two timestamps (None if either is unknown)"""
+    if started_at is None or completed_at is None:
+        return None
+    return max(int((_utc(completed_at) - _utc(started_at)).total_seconds() * 1000), 0)
+
+def _count_results(session: Session, job: Jobs) -> int:
+    pending = sum(1 for obj in session.new if isinstance(obj, JobResults) and (obj.job is job or (obj.job_id is not None and obj.job_id == job.id)))
+    if job.id is None:
+        return pending
+    with session.no_autoflush:
+        stored = session.execute(select(func.count(JobResults.id)).where(JobResults.job_id == job.id)).scalar() or 0
+    return stored + pending
+
+def stamp_job(session: Session, job: Jobs, now: Optional[datetime] = None):
+    """Apply the bookkeeping for a job's current status. Values set explicitly are kept."""
+    state = inspect(job)
+    status = _status(job.status)
+    now = now or datetime.now(timezone.utc)
+    if status == JobStatus.RUNNING and job.started_at is None:
+        job.started_at = now
+    elif status in TERMINAL_STATUSES:
+        if job.completed_at is None:
+            job.completed_at = now
+        if job.duration_ms is None:
+            # Jobs that never ran (e.g. cancelled while pending) are timed from creation
+            job.duration_ms = duration_ms(job.started_at or job.created_at, job.completed_at)
+        if status == JobStatus.COMPLETED and not state.attrs.results_count.history.has_changes() and not job.results_count:
+            job.results_count = _count_results(session, job)
+
+@event.listens_for(Session, "before_flush")
+def _stamp_jobs(session: Session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Jobs) and inspect(obj).attrs.status.history.has_changes():
+            stamp_job(session, obj)
@@ -14,6 +14,7 @@ import logging
 import secrets
 from tenant_utils import get_tenant_from_request
 from security import check_permission
+from archive import count_archived, fetch_archived
 import asyncio
 
 router = APIRouter(prefix="/api/scrape", tags=["scrape"])
@@ -194,27 +195,53 @@ def download_csv(job_id: int = Path(..., description="ID of the job to download
         raise HTTPException(status_code=500, detail="Failed to download CSV")
 
 @router.get("/jobs", summary="List user jobs", description="List all scraping jobs for the authenticated user.", response_model=Dict[str, Any])
-def list_user_jobs(request: Request, db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
-    """List all scraping jobs for the authenticated user.\n\n- **Returns**: List of jobs with ID, queries, status, created/updated timestamps."""
+def list_user_jobs(
+    request: Request,
+    include_archive: bool = Query(False, description="Also return jobs moved to the archive (paginated)."),
+    page: Optional[int] = Query(None, ge=1, description="Page number; passing it paginates the list (default 1)."),
+    page_size: Optional[int] = Query(None, ge=1, le=500, description="Jobs per page; passing it paginates the list (default 100)."),
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_user)
+):
+    """List scraping jobs for the authenticated user, newest first.\n\n- Without **page**, **page_size** or **include_archive** every live job is returned, as before.\n- **include_archive**: Continue into archived jobs (older, read-only) after the live ones.\n- **page**, **page_size**: Pagination over the combined list; the response then also has the total.\n- **Returns**: List of jobs with ID, queries, status, created/updated timestamps."""
     tenant = get_tenant_from_request(request, db)
     try:
-        jobs = db.query(Jobs).filter(Jobs.user_id == user.id).order_by(Jobs.id.desc()).all()
-        return {
-            "jobs": [
-                {
-                    "id": job.id,
-                    "queries": json.loads(job.queries),
-                    "status": job.status,
-                    "created_at": job.created_at,
-                    "updated_at": job.updated_at
-                }
-                for job in jobs
-            ]
-        }
+        query = db.query(Jobs).filter(Jobs.user_id == user.id).order_by(Jobs.id.desc())
+        if page is None and page_size is None and not include_archive:
+            return {"jobs": [_job_summary(job) for job in query.all()]}
+        page, page_size = page or 1, page_size or 100
+        total = query.order_by(None).count()
+        offset = (page - 1) * page_size
+        result = [_job_summary(job) for job in query.offset(offset).limit(page_size).all()]
+        if include_archive:
+            # Archived jobs are always older than live ones: page through live rows first, then the archive
+            remaining = page_size - len(result)
+            if remaining > 0:
+                for job in fetch_archived(db, "jobs", user_id=user.id, offset=max(offset - total, 0), limit=remaining):
+                    queries = job.get("queries")
+                    result.append({
+                        "id": job["id"],
+                        "queries": json.loads(queries) if isinstance(queries, str) else queries,
+                        "status": job.get("status"),
+                        "created_at": job.get("created_at"),
+                        "updated_at": job.get("updated_at"),
+                        "archived": True
+                    })
+            total += count_archived(db, "jobs", user_id=user.id)
+        return {"jobs": result, "total": total}
     except Exception as e:
         print(f"❌ [JOB] Job listing failed - Error: {e}")
         raise HTTPException(status_code=500, detail="Failed to list jobs")
 
+def _job_summary(job: Jobs) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "queries": json.loads(job.queries),
+        "status": job.status,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+
 @router.post("/bulk-delete", summary="Bulk delete jobs", description="Delete multiple scraping jobs by their IDs.", response_model=BulkDeleteResponse)
 def bulk_delete_jobs(req: BulkDeleteRequest, db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
     # RBAC: Only allow if user has jobs:delete permission
@@ -0,0 +1,432 @@
+"""
+High-throughput lead ingestion for LeadTap Platform
+Validates lead dicts column-wise in batches and writes them with batched multi-row INSERTs
+(or COPY on PostgreSQL), returning a per-row outcome for every input row.
+"""
+
+import csv
+import io
+import json
+import logging
+import re
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from cache import CacheTags
+from analytics_rollup import record_conversions
+from cache_invalidation import mark_stale
+from models import LeadStatus, Leads, SocialMediaLeads
+
+logger = logging.getLogger("lead_ingest")
+
+DEFAULT_CHUNK_SIZE = 1000
+CONFLICT_MODES = (None, "ignore", "update")
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+EMPTY_MARKERS = {"", "n/a", "na", "none", "null", "-"}
+LEAD_STATUSES = {status.value for status in LeadStatus}
+
+def _clean_text(values: List[Any], max_length: Optional[int]) -> List[Optional[str]]:
+    cleaned = []
+    for value in values:
+        if value is None:
+            cleaned.append(None)
+            continue
+        value = str(value).strip()
+        if value.lower() in EMPTY_MARKERS:
+            cleaned.append(None)
+        else:
+            cleaned.append(value[:max_length] if max_length else value)
+    return cleaned
+
+def _clean_email(values: List[Any], max_length: Optional[int]) -> List[Optional[str]]:
+    return [value if value is None or EMAIL_RE.match(value) else False for value in _clean_text(values, max_length)]
+
+def _clean_int(values: List[Any], max_length: Optional[int]) -> List[Optional[int]]:
+    cleaned = []
+    for value in values:
+        try:
+            cleaned.append(None if value in (None, "") else int(value))
+        except (TypeError, ValueError):
+            cleaned.append(None)
+    return cleaned
+
+def _clean_float(values: List[Any], max_length: Optional[int]) -> List[Optional[float]]:
+    cleaned = []
+    for value in values:
+        try:
+            cleaned.append(None if value in (None, "") else float(value))
+        except (TypeError, ValueError):
+            cleaned.append(None)
+    return cleaned
+
+def _clean_bool(values: List[Any], max_length: Optional[int]) -> List[Optional[bool]]:
+    return [None if value is None else (value.strip().lower() in ("1", "true", "yes") if isinstance(value, str) else bool(value)) for value in values]
+
+def _clean_json(values: List[Any], max_length: Optional[int]) -> List[Any]:
+    cleaned = []
+    for value in values:
+        if isinstance(value, str) and value[:1] in ("[", "{"):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                # Not JSON after all; keep the raw string rather than failing the batch
+                pass
+        cleaned.append(value)
+    return cleaned
+
+CLEANERS: Dict[str, Callable[[List[Any], Optional[int]], List[Any]]] = {
+    "text": _clean_text,
+    "email": _clean_email,
+    "int": _clean_int,
+    "float": _clean_float,
+    "bool": _clean_bool,
+    "json": _clean_json,
+}
+
+# Ingest schemas: column -> (cleaner, max length). Keys not in the schema are
+# folded into the `extra_column` JSON so nothing the caller sent is lost.
+# `unique_key` is the per-user natural key backed by a unique index
+# (uq_leads_user_email / uq_social_media_leads_user_profile).
+INGEST_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "leads": {
+        "model": Leads,
+        "required": ["name"],
+        "extra_column": "enriched_data",
+        "unique_key": "email",
+        "unique_casefold": True,
+        "columns": {
+            "name": ("text", 255),
+            "email": ("email", 255),
+            "phone": ("text", 50),
+            "company": ("text", 255),
+            "website": ("text", 255),
+            "status": ("text", None),
+            "source": ("text", 100),
+            "notes": ("text", None),
+            "score": ("float", None),
+            "enriched_data": ("json", None),
+        },
+    },
+    "social_media_leads": {
+        "model": SocialMediaLeads,
+        "required": ["platform"],
+        "extra_column": None,
+        "unique_key": "profile_url",
+        "unique_casefold": False,
+        "columns": {
+            "platform": ("text", 100),
+            "platform_id": ("text", 255),
+            "username": ("text", 255),
+            "display_name": ("text", 255),
+            "email": ("email", 255),
+            "phone": ("text", 50),
+            "bio": ("text", None),
+            "followers_count": ("int", None),
+            "following_count": ("int", None),
+            "posts_count": ("int", None),
+            "location": ("text", 255),
+            "website": ("text", 255),
+            "profile_url": ("text", 500),
+            "avatar_url": ("text", 500),
+            "verified": ("bool", None),
+            "business_category": ("text", 255),
+            "engagement_score": ("float", None),
+            "status": ("text", 50),
+            "tags": ("json", None),
+            "notes": ("text", None),
+            "collection_id": ("int", None),
+        },
+    },
+}
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class BulkLeadIngestor:
+    """Validate and insert a stream of lead dicts in chunks"""
+
+    def __init__(
+        self,
+        db: Session,
+        user_id: int,
+        schema: str = "leads",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        defaults: Optional[Dict[str, Any]] = None,
+        return_ids: bool = False,
+        use_copy: bool = True,
+        on_conflict: Optional[str] = None,
+    ):
+        if schema not in INGEST_SCHEMAS:
+            raise ValueError(f"Unknown ingest schema: {schema}")
+        if on_conflict not in CONFLICT_MODES:
+            raise ValueError(f"Unknown conflict mode: {on_conflict}")
+        self.db = db
+        self.user_id = user_id
+        self.schema = INGEST_SCHEMAS[schema]
+        self.model = self.schema["model"]
+        self.chunk_size = chunk_size
+        self.defaults = defaults or {}
+        self.return_ids = return_ids
+        self.use_copy = use_copy
+        self.on_conflict = on_conflict
+
+    def validate_batch(self, batch: List[Dict[str, Any]]):
+        """Validate a batch column by column.
+
+        Returns (rows, errors) where rows[i] is the insertable dict for input i
+        (or None) and errors[i] is the validation error (or None)."""
+        columns = self.schema["columns"]
+        size = len(batch)
+        merged = [{**self.defaults, **row} for row in batch]
+        cleaned: Dict[str, List[Any]] = {}
+        for column, (kind, max_length) in columns.items():
+            cleaned[column] = CLEANERS[kind]([row.get(column) for row in merged], max_length)
+
+        errors: List[Optional[str]] = [None] * size
+        for column in self.schema["required"]:
+            for i, value in enumerate(cleaned[column]):
+                if errors[i] is None and not value:
+                    errors[i] = f"{column} is required"
+        for column, (kind, _) in columns.items():
+            if kind == "email":
+                for i, value in enumerate(cleaned[column]):
+                    if errors[i] is None and value is False:
+                        errors[i] = f"invalid {column}"
+        if "status" in cleaned and self.model is Leads:
+            statuses = [value.lower() if value else None for value in cleaned["status"]]
+            cleaned["status"] = statuses
+            for i, value in enumerate(statuses):
+                if errors[i] is None and value is not None and value not in LEAD_STATUSES:
+                    errors[i] = f"invalid status: {value}"
+
+        extra_column = self.schema["extra_column"]
+        rows: List[Optional[Dict[str, Any]]] = []
+        for i in range(size):
+            if errors[i] is not None:
+                rows.append(None)
+                continue
+            row = {column: values[i] for column, values in cleaned.items() if values[i] is not None}
+            row["user_id"] = self.user_id
+            if extra_column:
+                extras = {key: value for key, value in merged[i].items() if key not in columns and key != "user_id" and value not in (None, "")}
+                if extras:
+                    row[extra_column] = {**(row.get(extra_column) or {}), **extras}
+            rows.append(row)
+        return rows, errors
+
+    def _normalise(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Give every row the same keys so a single multi-row INSERT can be used.
+
+        Columns with a scalar Python-side default are always included: COPY only
+        writes the columns it is given, so the model defaults would otherwise be lost."""
+        table = self.model.__table__
+        keys = {column.key for column in table.c if column.default is not None and column.default.is_scalar}
+        for row in rows:
+            keys.update(row)
+        normalised = []
+        for row in rows:
+            full = {}
+            for key in keys:
+                if key in row:
+                    full[key] = row[key]
+                else:
+                    default = table.c[key].default
+                    full[key] = default.arg if default is not None and default.is_scalar else None
+            normalised.append(full)
+        return normalised
+
+    def _copy_rows(self, rows: List[Dict[str, Any]]) -> bool:
+        """Write rows with COPY ... FROM STDIN on PostgreSQL (psycopg2). Returns False if unavailable."""
+        connection = self.db.connection()
+        dialect = connection.dialect
+        if dialect.name != "postgresql":
+            return False
+        raw = connection.connection.dbapi_connection
+        cursor = raw.cursor()
+        if not hasattr(cursor, "copy_expert"):
+            return False
+        table = self.model.__table__
+        columns = list(rows[0])
+        processors = [table.c[column].type.bind_processor(dialect) for column in columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            values = []
+            for column, processor in zip(columns, processors):
+                value = row[column]
+                if processor is not None and value is not None:
+                    value = processor(value)
+                values.append("\\N" if value is None else value)
+            writer.writerow(values)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+        return True
+
+    def _insert_rows(self, rows: List[Dict[str, Any]]) -> Optional[List[Any]]:
+        """Insert a chunk; returns (id, created_at) tuples in input order when requested"""
+        dialect = self.db.get_bind().dialect
+        if self.return_ids and dialect.insert_executemany_returning_sort_by_parameter_order:
+            stmt = insert(self.model).returning(self.model.id, self.model.created_at, sort_by_parameter_order=True)
+            return self.db.execute(stmt, rows).all()
+        if self.use_copy and not self.return_ids and self._copy_rows(rows):
+            return None
+        # executemany on the Core table is rendered as batched multi-row
+        # INSERT ... VALUES by the dialect and compiled once, unlike .values(rows)
+        self.db.execute(insert(self.model.__table__), rows)
+        return None
+
+    def _key_of(self, row: Dict[str, Any]) -> Optional[str]:
+        value = row.get(self.schema["unique_key"])
+        if value is not None and self.schema["unique_casefold"]:
+            value = value.lower()
+        return value
+
+    def _key_expression(self):
+        column = self.model.__table__.c[self.schema["unique_key"]]
+        return func.lower(column) if self.schema["unique_casefold"] else column
+
+    def _existing_keys(self, keys: List[str]) -> set:
+        """Natural keys of this user that are already stored (one SELECT per chunk)"""
+        table = self.model.__table__
+        key = self._key_expression()
+        stmt = select(key).where(table.c.user_id == self.user_id, key.in_(keys))
+        return {value for (value,) in self.db.execute(stmt)}
+
+    def _upsert_rows(self, rows: List[Dict[str, Any]], updatable: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Insert keyed rows with ON CONFLICT DO NOTHING / DO UPDATE on the natural key.
+
+        Returns key -> {"status", "id", "created_at"} for every row. Rows must have
+        distinct keys; `updatable` lists the columns refreshed on conflict."""
+        table = self.model.__table__
+        dialect = self.db.get_bind().dialect
+        keys = [self._key_of(row) for row in rows]
+
+        if dialect.name in ("postgresql", "sqlite"):
+            stmt = (postgresql if dialect.name == "postgresql" else sqlite).insert(table)
+            if self.on_conflict == "ignore":
+                # DO NOTHING + RETURNING yields exactly the rows that were inserted
+                stmt = stmt.on_conflict_do_nothing().returning(table.c.id, table.c.created_at, self._key_expression())
+                returned = {key: (id_, created_at) for id_, created_at, key in self.db.execute(stmt, rows)}
+                return {
+                    key: {"status": "inserted", "id": returned[key][0], "created_at": returned[key][1]}
+                    if key in returned else {"status": "duplicate"}
+                    for key in keys
+                }
+            existing = self._existing_keys(keys)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id, self._key_expression()],
+                set_={column: stmt.excluded[column] for column in updatable}
+            )
+        elif dialect.name == "mysql":
+            existing = self._existing_keys(keys)
+            stmt = mysql.insert(table)
+            if self.on_conflict == "ignore":
+                stmt = stmt.prefix_with("IGNORE")
+            else:
+                stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in updatable})
+        else:
+            # No native upsert: skip keys that already exist and insert the rest
+            existing = self._existing_keys(keys)
+            rows = [row for row, key in zip(rows, keys) if key not in existing]
+            stmt = insert(table)
+        if rows:
+            self.db.execute(stmt, rows)
+        existing_status = "duplicate" if self.on_conflict == "ignore" else "updated"
+        return {key: {"status": existing_status if key in existing else "inserted"} for key in keys}
+
+    def _write_chunk(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write validated rows; returns one {"status", ...} entry per row"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        plain = []
+        keyed: Dict[str, int] = {}
+        for i, row in enumerate(rows):
+            key = self._key_of(row) if self.on_conflict else None
+            if key is None:
+                plain.append(i)
+            elif key in keyed:
+                results[i] = {"status": "duplicate" if self.on_conflict == "ignore" else "updated"}
+            else:
+                keyed[key] = i
+
+        normalised = self._normalise(rows)
+        if plain:
+            returned = self._insert_rows([normalised[i] for i in plain])
+            for position, i in enumerate(plain):
+                results[i] = {"status": "inserted"}
+                if returned:
+                    results[i]["id"], results[i]["created_at"] = returned[position][0], returned[position][1]
+        if keyed:
+            # Only refresh what the caller sent; status stays with the existing lead
+            supplied = {column for row in rows for column in row}
+            updatable = sorted(supplied - {"user_id", "status", self.schema["unique_key"]})
+            by_key = self._upsert_rows([normalised[i] for i in keyed.values()], updatable)
+            for key, i in keyed.items():
+                results[i] = by_key[key]
+        return results
+
+    def ingest(self, leads: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Ingest a stream of lead dicts. Commits once per chunk.
+
+        Returns per-status counts plus `outcomes`, one {"index", "status", ...}
+        entry per input row. Status is inserted, duplicate or updated (only with
+        on_conflict), invalid or failed; inserted rows carry "id" when known."""
+        outcomes: List[Dict[str, Any]] = []
+        counts = {"inserted": 0, "duplicate": 0, "updated": 0, "invalid": 0, "failed": 0}
+        offset = 0
+        for batch in _chunks(leads, self.chunk_size):
+            rows, errors = self.validate_batch(batch)
+            valid_positions = [i for i, row in enumerate(rows) if row is not None]
+            written: Dict[int, Dict[str, Any]] = {}
+            insert_error = None
+            if valid_positions:
+                try:
+                    written = dict(zip(valid_positions, self._write_chunk([rows[i] for i in valid_positions])))
+                    if self.model is Leads:
+                        record_conversions(self.db, self.user_id, sum(
+                            1 for i, outcome in written.items()
+                            if outcome["status"] == "inserted" and rows[i].get("status") == LeadStatus.CONVERTED.value
+                        ))
+                    mark_stale(self.db, [CacheTags.user(self.user_id)])
+                    self.db.commit()
+                except Exception as e:
+                    self.db.rollback()
+                    logger.exception("Bulk lead insert failed")
+                    insert_error = f"insert failed: {e.__class__.__name__}"
+            for i in range(len(batch)):
+                if errors[i] is not None:
+                    outcome = {"status": "invalid", "error": errors[i]}
+                elif insert_error:
+                    outcome = {"status": "failed", "error": insert_error}
+                else:
+                    outcome = written[i]
+                    if "id" in outcome:
+                        outcome["row"] = rows[i]
+                counts[outcome["status"]] += 1
+                outcomes.append({"index": offset + i, **outcome})
+            offset += len(batch)
+        logger.info(
+            f"Ingested {counts['inserted']} rows into {self.model.__tablename__} for user {self.user_id} "
+            f"({counts['duplicate']} duplicate, {counts['updated']} updated, {counts['invalid']} invalid, {counts['failed']} failed)"
+        )
+        return {**counts, "outcomes": outcomes}
+
+def ingest_leads(db: Session, user_id: int, leads: Iterable[Dict[str, Any]], **options) -> Dict[str, Any]:
+    """Convenience wrapper around BulkLeadIngestor for the `leads` table"""
+    return BulkLeadIngestor(db, user_id, schema="leads", **options).ingest(leads)
+
+def ingest_social_leads(db: Session, user_id: int, leads: Iterable[Dict[str, Any]], **options) -> Dict[str, Any]:
+    """Convenience wrapper around BulkLeadIngestor for the `social_media_leads` table"""
+    return BulkLeadIngestor(db, user_id, schema="social_media_leads", **options).ingest(leads)
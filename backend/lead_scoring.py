@@ -11,6 +11,7 @@ from models import Users, Jobs, LeadScores, Leads
 from database import get_db
 from auth import get_current_user
 from security import check_permission
+from response_cache import cached_response
 
 router = APIRouter(prefix="/api/lead-scoring", tags=["lead-scoring"])
 
@@ -214,6 +215,7 @@ def get_lead_scores(
         raise HTTPException(status_code=500, detail="Failed to get lead scores")
 
 @router.get("/criteria", response_model=List[ScoringCriteria], summary="Get available scoring criteria")
+@cached_response(ttl=3600, max_age=300)
 def get_scoring_criteria():
     """Get available scoring criteria and their descriptions"""
     return [
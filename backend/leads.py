@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Request, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from models import Leads
 from database import get_db
@@ -45,7 +46,11 @@ def create_lead(lead_data: LeadCreate, request: Request, db: Session = Depends(g
     tenant = get_tenant_from_request(request, db)
     lead = Leads(**lead_data.dict(), tenant_id=tenant.id)
     db.add(lead)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A lead with this email already exists")
     db.refresh(lead)
     return lead
 
@@ -14,6 +14,12 @@ import json
 from datetime import datetime
 from typing import List
 from database import engine, Base, test_database_connection, get_database_info
+from monitoring import get_metrics
+from cache import cache_manager
+import cache_invalidation  # noqa: F401 -- registers the session hooks that invalidate cache tags on commit
+import analytics_rollup  # noqa: F401 -- registers the session hook that maintains daily analytics rollups
+import job_lifecycle  # noqa: F401 -- registers the session hook that stamps job start/completion times
+import query_stats  # noqa: F401 -- registers the session hook that maintains per-query yield stats
 from auth import router as auth_router
 from jobs import router as jobs_router
 from payhere import router as payhere_router
@@ -46,6 +52,10 @@ from realtime import router as realtime_router
 from payments import router as payments_router
 from webhooks import router as webhooks_router
 from affiliate import router as affiliate_router
+from archive import router as archive_router, archive_worker
+from analytics_engine import snapshot_worker
+from export_jobs import router as export_jobs_router, export_worker
+from cache_warming import cache_warmer
 from config import settings, SECURITY_HEADERS, ALLOWED_ORIGINS
 
 # Configure structured logging
@@ -101,10 +111,39 @@ async def lifespan(app: FastAPI):
     logger.info(f"🔧 Debug mode: {settings.DEBUG}")
     logger.info(f"🔒 Security features: 2FA={settings.ENABLE_2FA}, SSO={settings.ENABLE_SSO}")
     
+    # Start background archival of aged rows
+    if settings.ARCHIVE_ENABLED:
+        archive_worker.start()
+        logger.info("📦 Archive worker started")
+    
+    # Precompute dashboards for recently active users in the background
+    if settings.CACHE_WARM_ENABLED:
+        cache_warmer.start()
+        logger.info("🔥 Cache warmer started")
+    
+    # Export Parquet snapshots for the analytics engine
+    if settings.ANALYTICS_ENGINE_ENABLED:
+        snapshot_worker.start()
+    
+    # Run requested exports in the background
+    if settings.EXPORT_WORKER_ENABLED:
+        export_worker.start()
+    
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down LeadTap application...")
+    if settings.ARCHIVE_ENABLED:
+        archive_worker.stop()
+    if settings.CACHE_WARM_ENABLED:
+        cache_warmer.stop()
+    if settings.ANALYTICS_ENGINE_ENABLED:
+        snapshot_worker.stop()
+    if settings.EXPORT_WORKER_ENABLED:
+        export_worker.stop()
+    cache_manager.stop_invalidation_listener()
+    if cache_manager.async_redis:
+        await cache_manager.async_redis.aclose()
 
 # Create FastAPI application with production settings
 app = FastAPI(
@@ -198,6 +237,8 @@ app.include_router(realtime_router)
 app.include_router(payments_router)
 app.include_router(webhooks_router)
 app.include_router(affiliate_router)
+app.include_router(archive_router)
+app.include_router(export_jobs_router)
 
 # Root endpoint
 @app.get("/")
@@ -284,6 +325,14 @@ def system_info():
         "version": "2.0.0"
     }
 
+# Prometheus metrics endpoint
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Expose Prometheus metrics (HTTP, system and connection pool)"""
+    if not settings.PROMETHEUS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return get_metrics()
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, Float, ForeignKey, JSON, Enum, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -90,12 +90,18 @@ class Jobs(Base):
     results_count = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    started_at = Column(DateTime(timezone=True))
     completed_at = Column(DateTime(timezone=True))
+    duration_ms = Column(Integer)  # started_at (or created_at) to completed_at, set by job_lifecycle
     
     # Relationships
     user = relationship("Users", back_populates="jobs")
     results = relationship("JobResults", back_populates="job")
 
+# timeseries range-scans a user's jobs by creation and by completion time
+Index("ix_jobs_user_created", Jobs.user_id, Jobs.created_at)
+Index("ix_jobs_user_completed", Jobs.user_id, Jobs.completed_at)
+
 class JobResults(Base):
     __tablename__ = "job_results"
     
@@ -117,6 +123,9 @@ class JobResults(Base):
     # Relationships
     job = relationship("Jobs", back_populates="results")
 
+# query_stats counts a job's results not seen in earlier jobs by business name
+Index("ix_job_results_business_name", JobResults.business_name)
+
 class Leads(Base):
     __tablename__ = "leads"
     
@@ -139,6 +148,11 @@ class Leads(Base):
     user = relationship("Users", back_populates="leads")
     lead_scores = relationship("LeadScores", back_populates="lead")
 
+# Natural key for lead dedup: one lead per (user, case-insensitive email). create_all only
+# builds it where expression indexes work; on MySQL, add_dedup_constraints_migration.sql does.
+Index("uq_leads_user_email", Leads.user_id, func.lower(Leads.email), unique=True).ddl_if(dialect=("postgresql", "sqlite"))
+Index("ix_leads_user_created", Leads.user_id, Leads.created_at)
+
 class ApiKeys(Base):
     __tablename__ = "api_keys"
     
@@ -209,6 +223,7 @@ class Notifications(Base):
     # Relationships
     user = relationship("Users", back_populates="notifications")
 
+# Daily per-user rollup (date is midnight UTC), maintained by analytics_rollup
 class Analytics(Base):
     __tablename__ = "analytics"
     
@@ -219,7 +234,37 @@ class Analytics(Base):
     leads_generated = Column(Integer, default=0)
     conversions = Column(Integer, default=0)
     revenue = Column(Float, default=0.0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    jobs_created = Column(Integer, default=0, server_default="0")
+    jobs_completed = Column(Integer, default=0, server_default="0")
+    jobs_failed = Column(Integer, default=0, server_default="0")
+    jobs_cancelled = Column(Integer, default=0, server_default="0")
+    jobs_timed = Column(Integer, default=0, server_default="0")  # completed jobs with a known duration
+    job_duration_seconds = Column(Float, default=0.0, server_default="0")
+    lead_scores = Column(Integer, default=0, server_default="0")
+    lead_score_total = Column(Float, default=0.0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# One rollup row per user and day (the upsert target)
+Index("uq_analytics_user_date", Analytics.user_id, Analytics.date, unique=True)
+
+class QueryStats(Base):
+    __tablename__ = "query_stats"
+    __table_args__ = (
+        Index("uq_query_stats_user_query", "user_id", "query_key", unique=True),
+        Index("ix_query_stats_top", "user_id", "successes", "runs"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)  # 0: all users (no foreign key for that reason)
+    query_key = Column(String(255), nullable=False)  # normalised query text
+    query_text = Column(String(500))  # as last entered
+    runs = Column(Integer, default=0, server_default="0")  # completed or failed jobs
+    successes = Column(Integer, default=0, server_default="0")
+    results = Column(Float, default=0.0, server_default="0")  # a job's totals are split evenly across its queries
+    new_businesses = Column(Float, default=0.0, server_default="0")
+    runtime_ms = Column(Float, default=0.0, server_default="0")
+    timed_runs = Column(Integer, default=0, server_default="0")
+    last_run_at = Column(DateTime(timezone=True))
 
 class Payments(Base):
     __tablename__ = "payments"
@@ -447,6 +492,9 @@ class LeadCollections(Base):
 
 class SocialMediaLeads(Base):
     __tablename__ = "social_media_leads"
+    __table_args__ = (
+        Index("uq_social_media_leads_user_profile", "user_id", "profile_url", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     platform = Column(String(100), nullable=False)
@@ -516,6 +564,24 @@ class CustomDashboards(Base):
     # Relationships
     user = relationship("Users") 
 
+class Goals(Base):
+    __tablename__ = "goals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    name = Column(String(255), nullable=False)
+    target = Column(Float, nullable=False)
+    current = Column(Float, default=0.0)  # progress when last read (see enhanced_analytics)
+    goal_type = Column(String(50), nullable=False)  # leads, revenue, jobs, exports
+    period = Column(String(20), nullable=False)  # daily, weekly, monthly
+    deadline = Column(DateTime(timezone=True))
+    description = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    user = relationship("Users")
+
 class LeadScores(Base):
     __tablename__ = "lead_scores"
 
@@ -715,4 +781,37 @@ class BulkWhatsAppMessages(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    campaign = relationship("BulkWhatsAppCampaigns", back_populates="messages") 
\ No newline at end of file
+    campaign = relationship("BulkWhatsAppCampaigns", back_populates="messages")
+
+class ExportJobs(Base):
+    __tablename__ = "export_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(50), nullable=False)  # leads, jobs, job_results, analytics
+    format = Column(String(20), nullable=False)  # csv, ndjson, xlsx, parquet
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, running, completed, failed, expired
+    rows_total = Column(Integer)
+    rows_written = Column(Integer, default=0)
+    file_path = Column(String(500))
+    file_size = Column(BigInteger)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))  # last progress of a running export
+    completed_at = Column(DateTime(timezone=True))
+
+class ArchivedRecords(Base):
+    __tablename__ = "archived_records"
+    __table_args__ = (
+        Index("ix_archived_records_lookup", "source_table", "user_id", "record_created_at"),
+        UniqueConstraint("source_table", "source_id", name="uq_archived_records_source"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_table = Column(String(100), nullable=False)
+    source_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)  # Owner resolved at archive time
+    record_created_at = Column(DateTime(timezone=True))
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON row (plus child rows)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -12,6 +12,8 @@ from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTEN
 from prometheus_client.registry import CollectorRegistry
 from config import settings
 from cache import cache_manager
+from cache_warming import cache_warmer
+from database import pool_telemetry
 
 logger = structlog.get_logger(__name__)
 
@@ -74,16 +76,87 @@ system_disk_usage = Gauge(
     registry=registry
 )
 
-# Cache metrics
+# Cache metrics (labelled by key namespace: analytics, user, leads, plan, ...)
 cache_hits_total = Counter(
     'cache_hits_total',
     'Total cache hits',
+    ['namespace', 'tier'],
     registry=registry
 )
 
 cache_misses_total = Counter(
     'cache_misses_total',
     'Total cache misses',
+    ['namespace'],
+    registry=registry
+)
+
+cache_sets_total = Counter(
+    'cache_sets_total',
+    'Total cache writes',
+    ['namespace'],
+    registry=registry
+)
+
+cache_evictions_total = Counter(
+    'cache_evictions_total',
+    'Total in-process (L1) cache evictions due to size limits',
+    ['namespace'],
+    registry=registry
+)
+
+cache_errors_total = Counter(
+    'cache_errors_total',
+    'Total cache errors (including Redis failures)',
+    ['namespace'],
+    registry=registry
+)
+
+cache_operation_duration_seconds = Histogram(
+    'cache_operation_duration_seconds',
+    'Cache get/set latency',
+    ['namespace', 'operation'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+    registry=registry
+)
+
+cache_value_size_bytes = Histogram(
+    'cache_value_size_bytes',
+    'Size of values written to the cache (encoded size when stored in Redis)',
+    ['namespace'],
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    registry=registry
+)
+
+cache_memory_entries = Gauge(
+    'cache_memory_entries',
+    'Entries in the in-process (L1) cache',
+    registry=registry
+)
+
+cache_memory_bytes = Gauge(
+    'cache_memory_bytes',
+    'Approximate bytes held by the in-process (L1) cache',
+    registry=registry
+)
+
+cache_warm_entries_total = Counter(
+    'cache_warm_entries_total',
+    'Cache entries precomputed by the cache warmer',
+    ['target'],
+    registry=registry
+)
+
+cache_warm_prevented_misses_total = Counter(
+    'cache_warm_prevented_misses_total',
+    'Warmed entries whose first read was a hit instead of a miss',
+    ['target'],
+    registry=registry
+)
+
+cache_warm_throttled_total = Counter(
+    'cache_warm_throttled_total',
+    'Times the cache warmer backed off because the DB pool was busy',
     registry=registry
 )
 
@@ -101,6 +174,77 @@ db_query_duration_seconds = Histogram(
     registry=registry
 )
 
+# Connection pool metrics (fed by db_telemetry.PoolTelemetry)
+db_pool_checked_out = Gauge(
+    'db_pool_checked_out',
+    'Connections currently checked out of the pool',
+    registry=registry
+)
+
+db_pool_checked_in = Gauge(
+    'db_pool_checked_in',
+    'Idle connections currently in the pool',
+    registry=registry
+)
+
+db_pool_overflow = Gauge(
+    'db_pool_overflow',
+    'Connections open beyond pool_size (negative while the pool is not full)',
+    registry=registry
+)
+
+db_pool_size = Gauge(
+    'db_pool_size',
+    'Configured pool size',
+    registry=registry
+)
+
+db_pool_oldest_checkout_seconds = Gauge(
+    'db_pool_oldest_checkout_seconds',
+    'How long the longest-held checked-out connection has been held',
+    registry=registry
+)
+
+db_pool_connection_age_seconds = Gauge(
+    'db_pool_connection_age_seconds',
+    'Age of the oldest pooled connection',
+    registry=registry
+)
+
+db_pool_long_held_checkouts_total = Counter(
+    'db_pool_long_held_checkouts_total',
+    'Checkouts returned after exceeding the leak threshold',
+    registry=registry
+)
+
+db_pool_checkout_wait_seconds = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled connection',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+    registry=registry
+)
+
+db_pool_checkout_hold_seconds = Histogram(
+    'db_pool_checkout_hold_seconds',
+    'Time a connection stayed checked out',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+    registry=registry
+)
+
+db_connections_active.set_function(lambda: pool_telemetry.pool_status()["checked_out"])
+db_pool_checked_out.set_function(lambda: pool_telemetry.pool_status()["checked_out"])
+db_pool_checked_in.set_function(lambda: pool_telemetry.pool_status().get("checked_in", 0))
+db_pool_overflow.set_function(lambda: pool_telemetry.pool_status().get("overflow", 0))
+db_pool_size.set_function(lambda: pool_telemetry.pool_status().get("size", 0))
+db_pool_oldest_checkout_seconds.set_function(pool_telemetry.oldest_checkout_seconds)
+db_pool_connection_age_seconds.set_function(pool_telemetry.oldest_connection_age)
+pool_telemetry.add_listener("wait", db_pool_checkout_wait_seconds.observe)
+pool_telemetry.add_listener("hold", db_pool_checkout_hold_seconds.observe)
+pool_telemetry.add_listener("long_held", lambda _: db_pool_long_held_checkouts_total.inc())
+
+cache_memory_entries.set_function(lambda: len(cache_manager.memory_cache))
+cache_memory_bytes.set_function(lambda: cache_manager.memory_cache.bytes)
+
 class MonitoringMiddleware:
     """Middleware for collecting HTTP metrics"""
     
@@ -283,23 +427,37 @@ class MetricsCollector:
         logger.info(f"WhatsApp message sent - Campaign: {campaign_id}, Status: {status}")
     
     @staticmethod
-    def record_cache_hit():
+    def record_cache_hit(namespace: str = "default", tier: str = "l1"):
         """Record cache hit"""
-        cache_hits_total.inc()
+        cache_hits_total.labels(namespace=namespace, tier=tier).inc()
     
     @staticmethod
-    def record_cache_miss():
+    def record_cache_miss(namespace: str = "default"):
         """Record cache miss"""
-        cache_misses_total.inc()
+        cache_misses_total.labels(namespace=namespace).inc()
     
     @staticmethod
     def record_db_query(operation: str, duration: float):
         """Record database query"""
         db_query_duration_seconds.labels(operation=operation).observe(duration)
 
+cache_manager.add_listener("l1_hit", lambda namespace, _: MetricsCollector.record_cache_hit(namespace, "l1"))
+cache_manager.add_listener("l2_hit", lambda namespace, _: MetricsCollector.record_cache_hit(namespace, "l2"))
+cache_manager.add_listener("miss", lambda namespace, _: MetricsCollector.record_cache_miss(namespace))
+cache_manager.add_listener("set", lambda namespace, _: cache_sets_total.labels(namespace=namespace).inc())
+cache_manager.add_listener("evict", lambda namespace, _: cache_evictions_total.labels(namespace=namespace).inc())
+cache_manager.add_listener("error", lambda namespace, _: cache_errors_total.labels(namespace=namespace).inc())
+cache_manager.add_listener("get_seconds", lambda namespace, seconds: cache_operation_duration_seconds.labels(namespace=namespace, operation="get").observe(seconds))
+cache_manager.add_listener("set_seconds", lambda namespace, seconds: cache_operation_duration_seconds.labels(namespace=namespace, operation="set").observe(seconds))
+cache_manager.add_listener("value_bytes", lambda namespace, size: cache_value_size_bytes.labels(namespace=namespace).observe(size))
+cache_warmer.add_listener("warmed", lambda target: cache_warm_entries_total.labels(target=target).inc())
+cache_warmer.add_listener("prevented_miss", lambda target: cache_warm_prevented_misses_total.labels(target=target).inc())
+cache_warmer.add_listener("throttled", lambda _: cache_warm_throttled_total.inc())
+
 # Prometheus metrics endpoint
 def get_metrics():
     """Get Prometheus metrics"""
+    pool_telemetry.check_leaks()  # logs connections held past the leak threshold
     return Response(
         content=generate_latest(registry),
         media_type=CONTENT_TYPE_LATEST
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from models import Users, Notifications
-from database import get_db
+from database import get_db, SessionLocal
 from auth import get_current_user
 import logging
 import json
@@ -17,6 +17,7 @@ import asyncio
 import aiohttp
 from tenant_utils import get_tenant_record_or_403, get_tenant_from_request
 from realtime import broadcast_notification
+from response_cache import cached_response
 import os
 
 logger = logging.getLogger("notifications")
@@ -187,8 +188,11 @@ class NotificationService:
         
         try:
             # Get user information
-            db = next(get_db())
-            user = db.query(Users).filter(Users.id == notification.user_id).first()
+            db = SessionLocal()
+            try:
+                user = db.query(Users).filter(Users.id == notification.user_id).first()
+            finally:
+                db.close()  # don't hold a connection while sending over the network
             if not user:
                 raise ValueError("User not found")
             
@@ -382,6 +386,7 @@ async def send_notification(
         raise HTTPException(status_code=500, detail="Failed to send notification")
 
 @router.get("/templates", response_model=List[NotificationTemplate], summary="List notification templates", description="Get all available notification templates.")
+@cached_response(ttl=3600, max_age=300)
 def get_notification_templates(db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
     """Get all available notification templates."""
     try:
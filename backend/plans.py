@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from database import get_db
 from models import Users, Plans
 from auth import get_current_user
+from cache import CacheTags
+from response_cache import cached_response
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/plans", tags=["plans"])
@@ -55,6 +57,7 @@ class PlanComparison(BaseModel):
     max_results_per_query: int
 
 @router.get("/", response_model=List[PlanResponse])
+@cached_response(ttl=3600, tags=[CacheTags.plans()])
 async def get_plans(db: Session = Depends(get_db)):
     """Get all available plans"""
     plans = db.query(Plans).filter(Plans.is_active == True).all()
@@ -169,6 +172,7 @@ def get_plan_limits(db: Session = Depends(get_db), user: Users = Depends(get_cur
     )
 
 @router.get("/compare", response_model=List[PlanComparison])
+@cached_response(ttl=3600, max_age=300)
 def compare_plans():
     """Get plan comparison for pricing page and upgrade modal."""
     return [
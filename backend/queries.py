@@ -0,0 +1,82 @@
+"""
+Cached statements for hot-path queries in LeadTap Platform
+Each statement is built once with bindparam() placeholders and reused, so a call only
+binds values: no per-call select() construction or cache-key generation. Scalar counts
+run on the session's Core connection to skip ORM result processing.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+
+from models import Jobs, Leads, Users
+
+_USER_BY_ID = select(Users).where(Users.id == bindparam("user_id"))
+
+@lru_cache(maxsize=None)
+def _count_jobs_stmt(by_status: bool):
+    stmt = select(func.count(Jobs.id)).where(Jobs.user_id == bindparam("user_id"))
+    if by_status:
+        stmt = stmt.where(Jobs.status == bindparam("status"))
+    return stmt
+
+# One row per status: a single grouped scan gives every status count and the job sums
+_JOBS_BY_STATUS = select(
+    Jobs.status,
+    func.count(Jobs.id),
+    func.coalesce(func.sum(Jobs.results_count), 0),
+    func.coalesce(func.sum(Jobs.duration_ms), 0),
+    func.count(Jobs.duration_ms),
+).where(Jobs.user_id == bindparam("user_id")).group_by(Jobs.status)
+
+_LEADS_BY_STATUS = select(Leads.status, func.count(Leads.id)).where(Leads.user_id == bindparam("user_id")).group_by(Leads.status)
+
+@lru_cache(maxsize=None)
+def _count_leads_stmt(by_status: bool, by_statuses: bool, by_since: bool):
+    stmt = select(func.count(Leads.id)).where(Leads.user_id == bindparam("user_id"))
+    if by_status:
+        stmt = stmt.where(Leads.status == bindparam("status"))
+    if by_statuses:
+        stmt = stmt.where(Leads.status.in_(bindparam("statuses", expanding=True)))
+    if by_since:
+        stmt = stmt.where(Leads.created_at >= bindparam("since"))
+    return stmt
+
+def user_by_id(db: Session, user_id: int) -> Optional[Users]:
+    """Load a user by primary key (auth.get_current_user runs this on every request)"""
+    return db.execute(_USER_BY_ID, {"user_id": user_id}).scalars().first()
+
+def count_jobs(db: Session, user_id: int, status: Optional[str] = None) -> int:
+    """Count a user's jobs, optionally with a given status"""
+    stmt = _count_jobs_stmt(status is not None)
+    return db.connection().execute(stmt, {"user_id": user_id, "status": status}).scalar() or 0
+
+def _status_name(status) -> Optional[str]:
+    return getattr(status, "value", status)
+
+def job_status_groups(db: Session, user_id: int) -> Dict[str, Dict[str, int]]:
+    """Per job status: count, results (sum of results_count), timed jobs and their total duration_ms"""
+    rows = db.connection().execute(_JOBS_BY_STATUS, {"user_id": user_id})
+    return {
+        _status_name(status): {"count": count, "results": int(results), "duration_ms": int(duration), "timed": timed}
+        for status, count, results, duration, timed in rows
+    }
+
+def lead_status_counts(db: Session, user_id: int) -> Dict[str, int]:
+    """Lead count per status"""
+    return {_status_name(status): count for status, count in db.connection().execute(_LEADS_BY_STATUS, {"user_id": user_id})}
+
+def count_leads(
+    db: Session,
+    user_id: int,
+    status: Optional[str] = None,
+    statuses: Optional[Sequence[str]] = None,
+    since: Optional[datetime] = None,
+) -> int:
+    """Count a user's leads, optionally filtered by status, status list or creation time"""
+    stmt = _count_leads_stmt(status is not None, statuses is not None, since is not None)
+    params = {"user_id": user_id, "status": status, "statuses": list(statuses or []), "since": since}
+    return db.connection().execute(stmt, params).scalar() or 0
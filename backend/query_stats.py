@@ -0,0 +1,227 @@
+"""
+Per-query yield statistics for LeadTap Platform
+Keeps one QueryStats row per normalised query text, per user and across all users
+(user_id 0), updated in the same transaction as a job finishing. Top-query reports are
+then an indexed lookup instead of decoding every job's queries, and the yield of a query
+can be estimated before running it.
+Run `python query_stats.py backfill` once to build stats from existing jobs.
+"""
+
+import logging
+import re
+import sys
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, desc, event, exists, func, inspect, select
+from sqlalchemy.orm import Session, aliased
+
+from analytics_rollup import parse_queries, upsert_increments
+from models import JobResults, JobStatus, Jobs, QueryStats
+
+logger = logging.getLogger("query_stats")
+
+GLOBAL_USER_ID = 0
+
+STAT_COUNTERS = ("runs", "successes", "results", "new_businesses", "runtime_ms", "timed_runs")
+
+# Jobs that count as a run of their queries
+FINISHED = (JobStatus.COMPLETED, JobStatus.FAILED)
+
+# Below this many runs, estimates use everyone's stats rather than the user's own
+ESTIMATE_MIN_RUNS = 3
+
+BACKFILL_BATCH_SIZE = 1000
+
+def normalise_query(query: str) -> str:
+    """Stats key for a query: case- and whitespace-insensitive"""
+    return re.sub(r"\s+", " ", str(query)).strip().lower()[:255]
+
+def _status(value: Any) -> Optional[JobStatus]:
+    try:
+        return JobStatus(getattr(value, "value", value))
+    except ValueError:
+        return None
+
+def _utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment is None:
+        return None
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+def new_businesses(connection, job_id: int, user_id: int) -> Dict[int, int]:
+    """A job's results whose business (name and address) no other job found, for the
+    owner's jobs and for everyone's. Returns {user_id: count, GLOBAL_USER_ID: count}."""
+    result, other = aliased(JobResults), aliased(JobResults)
+    found_elsewhere = select(other.id).where(
+        other.job_id != job_id,
+        other.business_name == result.business_name,
+        func.coalesce(other.address, "") == func.coalesce(result.address, ""),
+    )
+    by_owner = found_elsewhere.join(Jobs, other.job_id == Jobs.id).where(Jobs.user_id == user_id)
+    base = select(func.count(result.id)).where(result.job_id == job_id, result.business_name.isnot(None))
+    return {
+        user_id: connection.execute(base.where(~exists(by_owner))).scalar() or 0,
+        GLOBAL_USER_ID: connection.execute(base.where(~exists(found_elsewhere))).scalar() or 0,
+    }
+
+def job_increments(
+    connection,
+    job_id: int,
+    user_id: int,
+    status: JobStatus,
+    queries: Any,
+    results_count: Optional[int],
+    duration_ms: Optional[int],
+    finished_at: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Stats rows (per user and global) for one finished job"""
+    texts = OrderedDict()
+    for query in parse_queries(queries):
+        key = normalise_query(query)
+        if key:
+            texts[key] = str(query).strip()[:500]
+    if not texts:
+        return []
+    share = 1 / len(texts)
+    success = status == JobStatus.COMPLETED
+    fresh = new_businesses(connection, job_id, user_id) if success else {user_id: 0, GLOBAL_USER_ID: 0}
+    finished_at = _utc(finished_at) or datetime.now(timezone.utc)
+    rows = []
+    for key, text in texts.items():
+        for owner in (user_id, GLOBAL_USER_ID):
+            rows.append({
+                "user_id": owner,
+                "query_key": key,
+                "query_text": text,
+                "runs": 1,
+                "successes": int(success),
+                "results": (results_count or 0) * share if success else 0,
+                "new_businesses": fresh[owner] * share,
+                "runtime_ms": duration_ms * share if success and duration_ms is not None else 0,
+                "timed_runs": int(success and duration_ms is not None),
+                "last_run_at": finished_at,
+            })
+    return rows
+
+def _merge(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # One row per key: an upsert can't touch the same row twice in a statement
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = (row["user_id"], row["query_key"])
+        if key not in merged:
+            merged[key] = dict(row)
+            continue
+        into = merged[key]
+        for counter in STAT_COUNTERS:
+            into[counter] += row[counter]
+        if row["last_run_at"] >= into["last_run_at"]:
+            into["query_text"], into["last_run_at"] = row["query_text"], row["last_run_at"]
+    return list(merged.values())
+
+def record(connection, rows: List[Dict[str, Any]]):
+    """Add stats rows to the table"""
+    upsert_increments(connection, QueryStats.__table__, ("user_id", "query_key"), STAT_COUNTERS, _merge(rows), replace=("query_text", "last_run_at"))
+
+# --- Live maintenance ---
+
+def _finished_jobs(session: Session):
+    for job in (*session.new, *session.dirty):
+        if not isinstance(job, Jobs) or job.user_id is None:
+            continue
+        state = inspect(job)
+        history = state.attrs.status.history
+        status = _status(state.dict.get("status"))
+        if status not in FINISHED or not history.has_changes():
+            continue
+        previous = _status(history.deleted[0]) if history.deleted else None
+        if previous not in FINISHED:
+            yield job, state.dict, status
+
+@event.listens_for(Session, "after_flush")
+def _record_finished_jobs(session, flush_context):
+    rows = []
+    for job, values, status in _finished_jobs(session):
+        rows.extend(job_increments(
+            session.connection(), job.id, job.user_id, status, values.get("queries"),
+            values.get("results_count"), values.get("duration_ms"), values.get("completed_at"),
+        ))
+    record(session.connection(), rows)
+
+# --- Reading ---
+
+def _with_rates(stats: QueryStats) -> Dict[str, Any]:
+    return {
+        "query": stats.query_text or stats.query_key,
+        "runs": stats.runs,
+        "successes": stats.successes,
+        "success_rate": round(stats.successes / stats.runs * 100, 2) if stats.runs else 0,
+        "average_results": round(stats.results / stats.successes, 2) if stats.successes else 0,
+        "average_new_businesses": round(stats.new_businesses / stats.successes, 2) if stats.successes else 0,
+        "average_runtime_ms": round(stats.runtime_ms / stats.timed_runs, 1) if stats.timed_runs else None,
+        "last_run_at": stats.last_run_at,
+    }
+
+def top_queries(db: Session, user_id: Optional[int] = None, limit: int = 5) -> List[Dict[str, Any]]:
+    """Most successful queries for a user (or across all users), then most run"""
+    owner = GLOBAL_USER_ID if user_id is None else user_id
+    rows = db.execute(
+        select(QueryStats)
+        .where(QueryStats.user_id == owner)
+        .order_by(desc(QueryStats.successes), desc(QueryStats.runs))
+        .limit(limit)
+    ).scalars()
+    return [_with_rates(stats) for stats in rows]
+
+def estimate(db: Session, query: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Expected yield of a query, from the user's own runs if there are enough, else everyone's"""
+    key = normalise_query(query)
+    rows = {
+        stats.user_id: stats
+        for stats in db.execute(
+            select(QueryStats).where(QueryStats.query_key == key, QueryStats.user_id.in_([GLOBAL_USER_ID, user_id or GLOBAL_USER_ID]))
+        ).scalars()
+    }
+    own = rows.get(user_id) if user_id else None
+    chosen = own if own is not None and own.runs >= ESTIMATE_MIN_RUNS else rows.get(GLOBAL_USER_ID)
+    if chosen is None:
+        return None
+    return {**_with_rates(chosen), "scope": "user" if chosen is own else "global"}
+
+# --- Backfill ---
+
+def backfill(db: Session) -> int:
+    """Rebuild all query stats from the current finished jobs. Returns the number of jobs counted."""
+    db.execute(delete(QueryStats))
+    jobs = (
+        select(Jobs.id, Jobs.user_id, Jobs.status, Jobs.queries, Jobs.results_count, Jobs.duration_ms, Jobs.completed_at, Jobs.updated_at)
+        .where(Jobs.status.in_(FINISHED))
+        .order_by(Jobs.id)
+    )
+    connection = db.connection()
+    counted, rows = 0, []
+    for job in connection.execute(jobs).all():
+        rows.extend(job_increments(
+            connection, job.id, job.user_id, _status(job.status), job.queries,
+            job.results_count, job.duration_ms, job.completed_at or job.updated_at,
+        ))
+        counted += 1
+        if len(rows) >= BACKFILL_BATCH_SIZE:
+            record(connection, rows)
+            rows = []
+    record(connection, rows)
+    db.commit()
+    return counted
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("Usage: python query_stats.py backfill")
+        sys.exit(1)
+    session = SessionLocal()
+    try:
+        print(f"Counted {backfill(session)} finished jobs")
+    finally:
+        session.close()
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from typing import Dict, List
-from models import Users
 from auth import get_current_user
 from fastapi import status, HTTPException
 from jose import JWTError, jwt
 from config import SECRET_KEY, ALGORITHM
 from database import SessionLocal
+from queries import user_by_id
 
 """
 This module provides real-time notification delivery via WebSocket for authenticated users.
@@ -26,9 +26,10 @@ def get_user_from_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = int(payload.get("sub"))
         db = SessionLocal()
-        user = db.query(Users).filter(Users.id == user_id).first()
-        db.close()
-        return user
+        try:
+            return user_by_id(db, user_id)
+        finally:
+            db.close()
     except Exception:
         return None
 
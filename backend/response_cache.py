@@ -0,0 +1,141 @@
+"""
+HTTP response caching for read-mostly endpoints
+Stores the serialised JSON body in the cache tiers, answers with a strong ETag and
+Cache-Control, and turns a matching If-None-Match into a 304 without re-serialising.
+"""
+
+import hashlib
+import inspect
+import json
+from functools import wraps
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from cache import CacheTags, cache_manager
+from config import settings
+from models import Users
+
+# What a cached response can vary on, besides path and query string. Each needs the
+# endpoint to take the current user (any parameter annotated Users).
+VARY_DIMENSIONS = ("user", "tenant", "plan")
+
+def etag_for(body: bytes) -> str:
+    """Strong validator: the same bytes always get the same tag"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/"x" matches "x" """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+def render_json(content: Any) -> bytes:
+    """The bytes FastAPI's JSONResponse would send for an endpoint's return value"""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+def _current_user(kwargs: Dict[str, Any]) -> Optional[Users]:
+    return next((value for value in kwargs.values() if isinstance(value, Users)), None)
+
+def _vary_parts(vary: Tuple[str, ...], user: Optional[Users]) -> Tuple[str, set]:
+    """Key segment and invalidation tags for the varying dimensions"""
+    parts, tags = [], set()
+    for dimension in vary:
+        if dimension == "user":
+            parts.append(f"u{user.id}")
+            tags.add(CacheTags.user(user.id))
+        elif dimension == "tenant":
+            parts.append(f"t{user.tenant_id or '-'}")
+            if user.tenant_id:
+                tags.add(CacheTags.tenant(user.tenant_id))
+        elif dimension == "plan":
+            parts.append(f"p{user.plan or '-'}")
+    return "".join(f"{part}:" for part in parts), tags
+
+def _request_digest(request: Request) -> str:
+    query = sorted(request.query_params.multi_items())
+    return hashlib.sha256(json.dumps([request.url.path, query]).encode()).hexdigest()[:16]
+
+def cached_response(ttl: int = None, vary: Iterable[str] = (), tags: Iterable[str] = (), max_age: int = 0):
+    """Cache a JSON endpoint's serialised response.
+
+    ttl is how long the body stays in the cache; max_age is how long clients may reuse
+    it without revalidating (0: revalidate every time, which is then a cheap 304).
+    vary lists the user attributes the body depends on ("user", "tenant", "plan");
+    responses of endpoints that take the current user are marked private."""
+    vary = tuple(vary)
+    unknown = set(vary) - set(VARY_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown vary dimensions: {sorted(unknown)}")
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        authenticated = any(param.annotation is Users for param in signature.parameters.values())
+        if vary and not authenticated:
+            raise TypeError(f"{func.__qualname__} varies by {vary} but doesn't take the current user")
+        inject_request = "request" not in signature.parameters
+        key_prefix = f"response.{func.__module__}.{func.__qualname__}"
+        cache_control = f"{'private' if authenticated else 'public'}, max-age={max_age}, must-revalidate"
+        fresh_ttl = ttl or settings.CACHE_TIMEOUT_SECONDS
+
+        def prepare(kwargs) -> Tuple[Request, str, Optional[list]]:
+            request = kwargs.pop("request") if inject_request else kwargs["request"]
+            vary_key, entry_tags = _vary_parts(vary, _current_user(kwargs) if vary else None)
+            entry_tags.update(tags)
+            return request, f"{key_prefix}:{vary_key}{_request_digest(request)}", sorted(entry_tags) or None
+
+        def respond(request: Request, entry: Dict[str, str]) -> Response:
+            headers = {"ETag": entry["etag"], "Cache-Control": cache_control}
+            if authenticated:
+                headers["Vary"] = "Authorization"
+            if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+                return Response(status_code=304, headers=headers)
+            return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+        def entry_for(result: Any) -> Dict[str, str]:
+            body = render_json(result)
+            # Stored as text: the body is UTF-8 JSON and every cache codec handles str
+            return {"body": body.decode("utf-8"), "etag": etag_for(body)}
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(**kwargs):
+                request, cache_key, entry_tags = prepare(kwargs)
+                entry = await cache_manager.aget(cache_key, tags=entry_tags)
+                if entry is None:
+                    result = await func(**kwargs)
+                    if isinstance(result, Response):
+                        return result
+                    entry = entry_for(result)
+                    await cache_manager.aset(cache_key, entry, fresh_ttl, tags=entry_tags)
+                return respond(request, entry)
+        else:
+            @wraps(func)
+            def wrapper(**kwargs):
+                request, cache_key, entry_tags = prepare(kwargs)
+                entry = cache_manager.get(cache_key, tags=entry_tags)
+                if entry is None:
+                    result = func(**kwargs)
+                    if isinstance(result, Response):
+                        return result
+                    entry = entry_for(result)
+                    cache_manager.set(cache_key, entry, fresh_ttl, tags=entry_tags)
+                return respond(request, entry)
+
+        if inject_request:
+            # FastAPI reads the wrapper's signature, so ask it for the request too
+            parameters = list(signature.parameters.values())
+            parameters.append(inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+            wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+    return decorator
@@ -21,6 +21,7 @@ def run_scraper(job_id: int):
             {"business_name": "Test Business", "address": "123 Main St", "phone": "123-456-7890", "website": "https://example.com"}
         ]
         job.result = json.dumps(dummy_results)
+        job.results_count = len(dummy_results)
         job.status = "completed"
         db.commit()
         # Trigger webhook for job completion
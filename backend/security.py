@@ -215,18 +215,10 @@ def log_security_event(db: Session, user_id: Optional[int], event_type: str, det
 def check_permission(user: Users, resource: str, action: str, db: Session) -> bool:
     """Check if user has permission for specific resource and action"""
     # Admin users have all permissions
-    if user.plan == "business" and user.is_admin:
+    if user.plan == "business" and getattr(user, "is_admin", False):
         return True
     
-    # Get user roles and permissions
-    user_roles = db.query(UserRole).filter(UserRole.user_id == user.id).all()
-    
-    for user_role in user_roles:
-        role = db.query(Roles).filter(Roles.id == user_role.role_id).first()
-        if role:
-            permissions = json.loads(role.permissions) if role.permissions else []
-            if f"{resource}:{action}" in permissions or f"{resource}:*" in permissions:
-                return True
+    # Custom role assignments have no tables yet (see the /roles endpoints), so they grant nothing
     
     # Plan-based permissions
     plan_permissions = {
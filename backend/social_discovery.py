@@ -1,7 +1,6 @@
 
 import os
 import re
-import json
 import time
 import random
 import urllib.parse
@@ -21,6 +20,7 @@ from webdriver_manager.chrome import ChromeDriverManager
 
 from database import SessionLocal
 from models import SocialMediaLeads, LeadSources, LeadCollections
+from lead_ingest import ingest_social_leads
 
 logger = logging.getLogger("social-discovery")
 
@@ -35,9 +35,9 @@ class SocialDiscoveryEngine:
         self._load_existing_leads()
 
     def _load_existing_leads(self):
-        existing = self.db.query(SocialMediaLeads.profile_url).filter(SocialMediaLeads.user_id == self.user_id).all()
-        for lead in existing:
-            self.scraped_links.add(lead.profile_url)
+        # Skip links already stored before scraping them again; the unique index catches the rest
+        existing = self.db.query(SocialMediaLeads.profile_url).filter(SocialMediaLeads.user_id == self.user_id)
+        self.scraped_links.update(profile_url for (profile_url,) in existing.yield_per(5000))
 
     def setup_driver(self, headless: bool = True):
         options = Options()
@@ -144,22 +144,18 @@ def run_discovery_task(user_id: int, platforms: List[str], skills: List[str], ci
             try:
                 new_leads = future.result()
                 if new_leads:
-                    for lead_data in new_leads:
-                        # Save to DB
-                        lead = SocialMediaLeads(
-                            user_id=user_id,
-                            platform=lead_data["platform"],
-                            display_name=lead_data["name"],
-                            email=lead_data["email"],
-                            phone=lead_data["phone"],
-                            bio=lead_data["bio"],
-                            profile_url=lead_data["link"],
-                            collection_id=collection_id,
-                            status="new",
-                            tags=json.dumps([lead_data["query"]])
-                        )
-                        db.add(lead)
-                    db.commit()
+                    # Links stored since the run started (or by a concurrent run) are skipped by the unique index
+                    ingest_social_leads(db, user_id, (
+                        {
+                            "platform": lead_data["platform"],
+                            "display_name": lead_data["name"],
+                            "email": lead_data["email"],
+                            "phone": lead_data["phone"],
+                            "bio": lead_data["bio"],
+                            "profile_url": lead_data["link"],
+                            "tags": [lead_data["query"]],
+                        } for lead_data in new_leads
+                    ), defaults={"collection_id": collection_id, "status": "new"}, on_conflict="ignore")
             except Exception as e:
                 logger.error(f"Discovery Task Error: {e}")
                 db.rollback()
@@ -777,6 +777,7 @@ async def scrape_social_media_task(
 ):
     """Background task to scrape social media platforms"""
     from database import SessionLocal
+    from lead_ingest import ingest_social_leads
     db = SessionLocal()
     
     try:
@@ -795,36 +796,14 @@ async def scrape_social_media_task(
             raise ValueError(f"Unsupported platform: {platform}")
         
         # Process and save leads
-        for lead_data in leads_data:
-            # Calculate engagement score
-            if include_engagement:
+        if include_engagement:
+            for lead_data in leads_data:
                 lead_data["engagement_score"] = scraper.calculate_engagement_score(lead_data)
-            
-            # Create lead record
-            lead = SocialMediaLeads(
-                platform=lead_data["platform"],
-                platform_id=lead_data["platform_id"],
-                username=lead_data.get("username"),
-                display_name=lead_data.get("display_name"),
-                email=lead_data.get("email"),
-                phone=lead_data.get("phone"),
-                bio=lead_data.get("bio"),
-                followers_count=lead_data.get("followers_count"),
-                following_count=lead_data.get("following_count"),
-                posts_count=lead_data.get("posts_count"),
-                location=lead_data.get("location"),
-                website=lead_data.get("website"),
-                profile_url=lead_data.get("profile_url"),
-                avatar_url=lead_data.get("avatar_url"),
-                verified=lead_data.get("verified", False),
-                business_category=lead_data.get("business_category"),
-                engagement_score=lead_data.get("engagement_score"),
-                user_id=user_id,
-                collection_id=collection_id,
-                status="new"
-            )
-            
-            db.add(lead)
+        ingest_social_leads(
+            db, user_id, leads_data,
+            defaults={"collection_id": collection_id, "status": "new", "verified": False},
+            on_conflict="ignore"
+        )
         
         # Update collection status
         collection = db.query(LeadCollections).filter(LeadCollections.id == collection_id).first()
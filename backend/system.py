@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from models import Users, Jobs, Users as UserModel
-from database import get_db
+from database import get_db, SessionLocal, pool_telemetry
 from auth import get_current_user
 from security import check_permission
 import logging
@@ -177,10 +177,16 @@ def get_system_info(db: Session = Depends(get_db), user: Users = Depends(get_cur
         logger.exception("Error getting system info")
         raise HTTPException(status_code=500, detail="Failed to get system info. Please try again later.")
 
+@router.get("/db-pool", summary="Get connection pool status", description="Get connection pool occupancy, wait statistics and long-held checkouts (with stack traces when DB_POOL_LEAK_DEBUG is on). Admin access required.")
+def db_pool_status(db: Session = Depends(get_db), user: Users = Depends(get_current_user)):
+    if not check_permission(user, "admin", "read", db):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return pool_telemetry.snapshot()
+
 def log_system_event(level: str, module: str, message: str, details: Optional[Dict] = None, user_id: Optional[int] = None, request: Optional[Any] = None):
     """Helper function to log system events"""
+    db = SessionLocal()
     try:
-        db = next(get_db())
         log_entry = SystemLogs(
             level=level,
             module=module,
@@ -193,4 +199,6 @@ def log_system_event(level: str, module: str, message: str, details: Optional[Di
         db.add(log_entry)
         db.commit()
     except Exception as e:
-        logger.exception("Error logging system event") 
\ No newline at end of file
+        logger.exception("Error logging system event")
+    finally:
+        db.close() 
\ No newline at end of file
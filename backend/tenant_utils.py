@@ -1,6 +1,6 @@
 from fastapi import Request, HTTPException, Depends, FastAPI
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionLocal
 from models import Tenant
 from auth import get_current_user
 
@@ -28,9 +28,13 @@ def tenant_from_domain_middleware(app: FastAPI):
     @app.middleware('http')
     async def extract_tenant_from_domain(request: Request, call_next):
         host = request.headers.get('host', '').split(':')[0]
-        db = next(get_db())
-        tenant = db.query(Tenant).filter_by(custom_domain=host).first()
-        if tenant:
-            request.state.tenant_slug = tenant.slug
+        # Release the connection before handing off, so it isn't held for the whole request
+        db = SessionLocal()
+        try:
+            tenant = db.query(Tenant).filter_by(custom_domain=host).first()
+            if tenant:
+                request.state.tenant_slug = tenant.slug
+        finally:
+            db.close()
         response = await call_next(request)
         return response 
\ No newline at end of file
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the Parquet/DuckDB analytics engine and the live report fallbacks
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import timeseries
+from cache import CacheManager
+from database import Base
+from config import settings
+from models import BulkWhatsAppCampaigns, BulkWhatsAppMessages, JobResults, Jobs, Leads, Users
+from analytics_engine import AnalyticsEngine
+from enhanced_analytics import get_analytics_trends, get_query_performance
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    monkeypatch.setattr(timeseries, "cache_manager", CacheManager())
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = Users(email="reports@example.com", hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    return user
+
+def _seed(db, user):
+    now = datetime.now(timezone.utc)
+    jobs = [
+        Jobs(user_id=user.id, status="completed", queries=["cafes in Kandy", "hotels in Galle"], results_count=20,
+             duration_ms=4000, created_at=now - timedelta(days=2)),
+        Jobs(user_id=user.id, status="completed", queries=["cafes in Kandy"], results_count=10,
+             duration_ms=2000, created_at=now - timedelta(days=1)),
+        Jobs(user_id=user.id, status="failed", queries='["hotels in Galle"]', created_at=now - timedelta(days=1)),
+    ]
+    db.add_all(jobs)
+    db.add_all([Leads(user_id=user.id, name=f"Lead {i}", status="new") for i in range(3)])
+    campaign = BulkWhatsAppCampaigns(name="Launch", message_content="Hi", user_id=user.id)
+    db.add(campaign)
+    db.commit()
+    db.add_all([
+        JobResults(job_id=jobs[0].id, business_name="A", rating=4.0),
+        JobResults(job_id=jobs[1].id, business_name="B", rating=5.0),
+        BulkWhatsAppMessages(campaign_id=campaign.id, phone_number="1", message_content="Hi", status="read"),
+        BulkWhatsAppMessages(campaign_id=campaign.id, phone_number="2", message_content="Hi", status="failed"),
+    ])
+    db.commit()
+    return jobs
+
+def test_reports_run_live_without_engine(db, user):
+    _seed(db, user)
+
+    trends = get_analytics_trends(days=30, db=db, user=user)
+    assert trends["source"] == "live"
+    assert sum(day["count"] for day in trends["job_trends"]) == 3
+    assert sum(day["count"] for day in trends["lead_trends"]) == 3
+    assert trends["message_trends"][0]["read"] == 1 and trends["message_trends"][0]["failed"] == 1
+
+    report = get_query_performance(days=30, limit=10, db=db, user=user)
+    by_query = {row["query"]: row for row in report["queries"]}
+    assert by_query["cafes in Kandy"]["jobs"] == 2 and by_query["cafes in Kandy"]["results"] == 30
+    assert by_query["cafes in Kandy"]["average_duration_ms"] == 3000
+    assert by_query["hotels in Galle"]["success_rate"] == 50
+
+def test_snapshot_export_and_reports_match_live(db, user, session_factory, tmp_path, monkeypatch):
+    pytest.importorskip("duckdb")
+    jobs = _seed(db, user)
+    engine = AnalyticsEngine(directory=str(tmp_path), session_factory=session_factory)
+
+    assert engine.export_snapshots() == {"jobs": 3, "leads": 3, "job_results": 2, "bulk_whatsapp_messages": 2}
+    since = datetime.utcnow() - timedelta(days=30)
+    assert engine.daily_counts("jobs", user.id, since) == get_analytics_trends(days=30, db=db, user=user)["job_trends"]
+    snapshot_rows = {row["query"]: row for row in engine.query_performance(user.id, since, 10)}
+    assert snapshot_rows["cafes in Kandy"]["results"] == 30
+    assert snapshot_rows["cafes in Kandy"]["average_rating"] == 4.5
+    assert snapshot_rows["hotels in Galle"]["completed_jobs"] == 1
+
+    # Incremental: only changed rows are exported, and views keep the newest copy
+    jobs[2].status = "completed"
+    jobs[2].results_count = 7
+    db.commit()
+    exported = engine.export_snapshots()
+    assert exported["job_results"] == 0 and exported["jobs"] >= 1
+    assert engine.query("SELECT count(*) FROM jobs")[0][0] == 3
+    assert engine.query("SELECT status, results_count FROM jobs WHERE id = ?", [jobs[2].id]) == [("completed", 7)]
+
+    # Compaction folds parts into one without changing the view
+    assert engine.compact("jobs")
+    assert len(engine._parts("jobs")) == 1
+    assert engine.query("SELECT count(*) FROM jobs")[0][0] == 3
+
+    monkeypatch.setattr(settings, "ANALYTICS_ENGINE_ENABLED", True)
+    assert engine.available
+    monkeypatch.setattr("enhanced_analytics.analytics_engine", engine)
+    report = get_query_performance(days=30, limit=10, db=db, user=user)
+    assert report["source"] == "snapshot"
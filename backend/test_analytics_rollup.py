@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for the daily analytics rollups
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Analytics, JobResults, Jobs, LeadScores, Leads, Users
+from analytics_rollup import backfill, day_of, rollup_totals
+from lead_ingest import ingest_leads
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = Users(email="analyst@example.com", hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    return user
+
+def test_job_lifecycle_updates_todays_rollup(db, user):
+    job = Jobs(user_id=user.id, status="pending", queries='["cafes in Kandy", "hotels in Galle"]')
+    db.add(job)
+    db.commit()
+    job.status = "running"
+    db.commit()
+    job.status = "completed"
+    job.results_count = 12
+    job.completed_at = datetime.now(timezone.utc)
+    db.commit()
+    failed = Jobs(user_id=user.id, status="pending", queries=["dentists"])
+    db.add(failed)
+    db.commit()
+    failed.status = "failed"
+    db.commit()
+
+    rows = db.execute(select(Analytics)).scalars().all()
+    assert len(rows) == 1 and rows[0].date.replace(tzinfo=timezone.utc) == day_of()
+    totals = rollup_totals(db, user.id)
+    assert totals["jobs_created"] == 2
+    assert totals["queries_run"] == 3
+    assert totals["jobs_completed"] == 1 and totals["jobs_failed"] == 1
+    assert totals["leads_generated"] == 12
+    assert totals["jobs_timed"] == 1
+
+def test_status_changes_stamp_job_timing_and_results(db, user):
+    job = Jobs(user_id=user.id, status="pending", queries=["florists"])
+    db.add(job)
+    db.commit()
+    assert job.started_at is None and job.duration_ms is None
+
+    job.status = "running"
+    db.commit()
+    started_at = job.started_at
+    assert started_at is not None
+    db.add_all([JobResults(job_id=job.id, business_name="A"), JobResults(job_id=job.id, business_name="B")])
+    db.commit()
+    job.started_at = started_at - timedelta(seconds=90)  # as if it ran for a while
+    job.status = "completed"
+    db.commit()
+
+    assert job.completed_at is not None and job.results_count == 2
+    assert job.duration_ms == pytest.approx(90000, abs=1000)
+    totals = rollup_totals(db, user.id)
+    assert totals["leads_generated"] == 2
+    assert totals["job_duration_seconds"] == pytest.approx(90, abs=1)
+
+    cancelled = Jobs(user_id=user.id, status="pending", queries=["x"])
+    db.add(cancelled)
+    db.commit()
+    cancelled.status = "cancelled"
+    db.commit()
+    assert cancelled.started_at is None and cancelled.duration_ms is not None
+
+def test_rollups_roll_back_with_the_write(db, user):
+    db.add(Jobs(user_id=user.id, status="pending", queries=["x"]))
+    db.flush()
+    assert rollup_totals(db, user.id)["jobs_created"] == 1
+    db.rollback()
+    assert rollup_totals(db, user.id)["jobs_created"] == 0
+
+def test_conversions_and_scores(db, user):
+    lead = Leads(user_id=user.id, name="Acme", status="new")
+    db.add(lead)
+    db.commit()
+    lead.status = "converted"
+    score = LeadScores(lead_id=lead.id, overall_score=80, factors={}, recommendations=[], risk_level="low", conversion_probability=0.6)
+    db.add(score)
+    db.commit()
+    score.overall_score = 90
+    db.commit()
+
+    totals = rollup_totals(db, user.id)
+    assert totals["conversions"] == 1
+    assert (totals["lead_scores"], totals["lead_score_total"]) == (1, 90)
+
+    db.delete(score)
+    db.commit()
+    assert rollup_totals(db, user.id)["lead_scores"] == 0
+
+def test_conversions_are_taken_back_and_counted_from_bulk_ingest(db, user):
+    lead = Leads(user_id=user.id, name="Acme", status="converted")
+    db.add(lead)
+    db.commit()
+    for status in ("lost", "converted", "converted", "qualified", "converted"):
+        lead.status = status
+        db.commit()
+    assert rollup_totals(db, user.id)["conversions"] == 1
+
+    result = ingest_leads(db, user.id, [
+        {"name": "Bulk A", "email": "a@example.com", "status": "converted"},
+        {"name": "Bulk B", "email": "b@example.com", "status": "new"},
+        {"name": "Bulk C", "email": "c@example.com", "status": "converted"},
+    ])
+    assert result["inserted"] == 3
+    ingest_leads(db, user.id, [{"name": "Again", "email": "A@example.com", "status": "converted"}], on_conflict="ignore")
+    assert rollup_totals(db, user.id)["conversions"] == 3
+
+def test_backfill_rebuilds_history_by_day(db, user):
+    now = datetime.now(timezone.utc)
+    three_days_ago = day_of(now) - timedelta(days=3, hours=-12)  # midday
+    db.add_all([
+        Jobs(user_id=user.id, status="completed", queries=["a", "b"], results_count=45,
+             created_at=three_days_ago - timedelta(hours=1), completed_at=three_days_ago),
+        Jobs(user_id=user.id, status="completed", queries=["c"], results_count=5,
+             created_at=now - timedelta(days=40), completed_at=now - timedelta(days=40)),
+    ])
+    db.commit()
+    db.execute(Analytics.__table__.delete())  # as if the jobs predate the rollups
+    db.commit()
+
+    assert backfill(db) == 2
+    assert rollup_totals(db, user.id)["leads_generated"] == 50
+    last_week = rollup_totals(db, user.id, since=now - timedelta(days=7))
+    assert (last_week["jobs_created"], last_week["leads_generated"]) == (1, 45)
+    assert last_week["job_duration_seconds"] == pytest.approx(3600, abs=1)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for hot/cold archival of aged rows
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+from starlette.requests import Request
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import ArchivedRecords, AuditLogs, JobResults, Jobs, Tenant, Users
+import admin
+import archive
+import jobs
+from archive import ArchiveManager, count_archived, fetch_archived, run_archive_now
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def _make_user(db):
+    user = Users(email="archive@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+def test_archives_old_completed_jobs_with_children(db):
+    user = _make_user(db)
+    old = datetime.now(timezone.utc) - timedelta(days=400)
+    old_job = Jobs(user_id=user.id, status="completed", queries='["cafes"]', created_at=old)
+    running_job = Jobs(user_id=user.id, status="running", queries='["bars"]', created_at=old)
+    new_job = Jobs(user_id=user.id, status="completed", queries='["gyms"]')
+    db.add_all([old_job, running_job, new_job])
+    db.commit()
+    db.add(JobResults(job_id=old_job.id, business_name="Cafe One"))
+    db.commit()
+    old_id, kept_ids = old_job.id, {running_job.id, new_job.id}
+
+    moved = ArchiveManager(batch_size=10, pause_seconds=0).archive_table(db, "jobs")
+
+    assert moved == 1
+    assert {job.id for job in db.query(Jobs).all()} == kept_ids
+    assert db.query(JobResults).count() == 0
+    archived = fetch_archived(db, "jobs", user_id=user.id)
+    assert len(archived) == 1
+    assert archived[0]["id"] == old_id
+    assert archived[0]["archived"] is True
+    assert archived[0]["_children"]["results"][0]["business_name"] == "Cafe One"
+
+def test_archives_in_batches_and_counts(db):
+    user = _make_user(db)
+    old = datetime.now(timezone.utc) - timedelta(days=800)
+    db.add_all([AuditLogs(user_id=user.id, action=f"action_{i}", created_at=old) for i in range(7)])
+    db.commit()
+
+    moved = ArchiveManager(batch_size=3, pause_seconds=0).archive_table(db, "audit_logs")
+
+    assert moved == 7
+    assert db.query(AuditLogs).count() == 0
+    assert db.query(ArchivedRecords).count() == 7
+    assert count_archived(db, "audit_logs", user_id=user.id) == 7
+    assert len(fetch_archived(db, "audit_logs", offset=5, limit=5)) == 2
+
+    # A row archived by a concurrent pass can't be archived twice
+    first = db.query(ArchivedRecords).first()
+    db.add(ArchivedRecords(source_table="audit_logs", source_id=first.source_id, payload=first.payload))
+    with pytest.raises(IntegrityError):
+        db.commit()
+
+def test_run_now_is_handed_to_the_worker(db, monkeypatch):
+    user = _make_user(db)
+    monkeypatch.setattr(archive, "check_permission", lambda *args: True)
+
+    tasks = BackgroundTasks()
+    assert run_archive_now(background_tasks=tasks, db=db, user=user) == {"status": "scheduled"}
+    assert [task.func for task in tasks.tasks] == [archive.archive_manager.run_once]  # no worker: run after the response
+
+    monkeypatch.setattr(archive.archive_worker, "running", True)
+    tasks = BackgroundTasks()
+    run_archive_now(background_tasks=tasks, db=db, user=user)
+    assert not tasks.tasks and archive.archive_worker._wake_event.is_set()
+    archive.archive_worker._wake_event.clear()
+
+def test_filtered_audit_logs_refuse_the_archive(db, monkeypatch):
+    user = _make_user(db)
+    monkeypatch.setattr(admin, "check_permission", lambda *args: True)
+    with pytest.raises(HTTPException) as rejected:
+        admin.get_audit_logs(db=db, user=user, page=1, page_size=20, action="ban_user", admin_email=None, target_type=None, include_archive=True)
+    assert rejected.value.status_code == 400
+
+def test_job_listing_pages_into_the_archive(db):
+    user = _make_user(db)
+    db.add(Tenant(name="Acme", slug="acme"))
+    old = datetime.now(timezone.utc) - timedelta(days=400)
+    db.add_all([Jobs(user_id=user.id, status="completed", queries='["old"]', created_at=old) for _ in range(3)])
+    db.commit()
+    ArchiveManager(batch_size=10, pause_seconds=0).archive_table(db, "jobs")
+    db.add_all([Jobs(user_id=user.id, status="completed", queries='["new"]') for _ in range(3)])
+    db.commit()
+    request = Request({"type": "http", "headers": [(b"x-tenant", b"acme")]})
+
+    def page(number):
+        listing = jobs.list_user_jobs(request=request, include_archive=True, page=number, page_size=2, db=db, user=user)
+        assert listing["total"] == 6
+        return [bool(job.get("archived")) for job in listing["jobs"]]
+
+    assert [page(1), page(2), page(3), page(4)] == [[False, False], [False, True], [True, True], []]
+    unpaginated = jobs.list_user_jobs(request=request, include_archive=False, page=None, page_size=None, db=db, user=user)
+    assert unpaginated == {"jobs": unpaginated["jobs"]} and len(unpaginated["jobs"]) == 3
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+Tests for the cache tiers and tag invalidation
+"""
+
+import asyncio
+import fnmatch
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import cache
+import cache_invalidation
+from cache import CacheManager, CacheTags, MemoryCache, async_cached, cached
+from cache_codec import SERIALIZERS, CacheCodec, CodecError, _AVAILABLE
+from database import Base
+from models import AuditLogs, Leads, Users
+
+def test_lru_evicts_least_recently_used_when_full():
+    cache = MemoryCache(max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key, ttl=60)
+    cache.get("a")  # a is now most recently used
+
+    cache.set("d", "d", ttl=60)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+    assert cache.evictions == 1
+    assert len(cache) == 3
+
+def test_byte_bound_evicts_until_under_budget():
+    cache = MemoryCache(max_entries=100, max_bytes=100)
+    cache.set("first", "x" * 60, ttl=60)
+    cache.set("second", "y" * 60, ttl=60)
+
+    assert "first" not in cache
+    assert cache.get("second") == "y" * 60
+    assert cache.bytes == 60
+
+def test_entries_expire_lazily_and_through_the_wheel():
+    cache = MemoryCache(resolution=0.01)
+    cache.set("short", 1, ttl=0.02)
+    cache.set("long", 2, ttl=60)
+    time.sleep(0.05)
+
+    assert cache.get("short") is None
+    cache.set("other", 3, ttl=0.01)
+    time.sleep(0.05)
+    cache.set("trigger", 4, ttl=60)  # drains elapsed wheel buckets
+
+    assert "other" not in cache.keys()
+    assert cache.expirations == 2
+    assert cache.get("long") == 2
+
+def test_wheel_keeps_draining_after_idling_and_drops_empty_buckets():
+    cache = MemoryCache(resolution=0.01)
+    cache.set("long", 1, ttl=60)
+    time.sleep(0.05)
+    cache.set("first", 2, ttl=60)  # idle past the wheel's span: the cursor must not jump to the 60s bucket
+    cache.set("short", 3, ttl=0.02)
+    time.sleep(0.05)
+    cache.set("trigger", 4, ttl=60)
+    assert "short" not in cache.keys()
+
+    for key in ("long", "first", "trigger"):
+        cache.delete(key)
+    assert cache._wheel == {}
+
+class _FakeRedis:
+    """Just enough of the redis client for CacheManager's L2 path"""
+
+    def __init__(self):
+        self.store = {}
+        self.published = []
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def pttl(self, key):
+        return 60_000 if key in self.store else -2
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    unlink = delete
+
+    def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    def incr(self, key):
+        self.store[key] = int(self.store.get(key, 0)) + 1
+        return self.store[key]
+
+    def scan_iter(self, match, count=None):
+        return [key for key in list(self.store) if fnmatch.fnmatchcase(key, match)]
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def pipeline(self, transaction=True):
+        redis_client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+
+            def execute(self):
+                return [getattr(redis_client, name)(*args) for name, args in self.calls]
+
+        return Pipeline()
+
+def _manager(redis_client):
+    manager = CacheManager()
+    manager.redis_client = redis_client
+    return manager
+
+def test_two_tier_promotes_l2_hits_and_broadcasts_invalidation():
+    shared = _FakeRedis()
+    worker_a, worker_b = _manager(shared), _manager(shared)
+
+    worker_a.set("stats", {"total": 1})
+    assert worker_b.get("stats") == {"total": 1}
+    assert worker_b.cache_stats["l2_hits"] == 1
+    assert worker_b.get("stats") == {"total": 1}
+    assert worker_b.cache_stats["l1_hits"] == 1
+
+    worker_a.set("stats", {"total": 2})
+    for _, message in shared.published:
+        worker_a._handle_invalidation(message)  # own messages are ignored
+        worker_b._handle_invalidation(message)
+    assert worker_a.cache_stats["invalidations_received"] == 0
+    assert worker_b.get("stats") == {"total": 2}
+
+def _broadcast(redis_client, *workers):
+    for _, message in redis_client.published:
+        for worker in workers:
+            worker._handle_invalidation(message)
+    redis_client.published.clear()
+
+def test_tag_invalidation_bumps_version_on_every_worker():
+    shared = _FakeRedis()
+    worker_a, worker_b = _manager(shared), _manager(shared)
+    tags = [CacheTags.user(42)]
+
+    worker_a.set("leads:stats:42", {"total": 1}, tags=tags)
+    worker_a.set("leads:stats:7", {"total": 9}, tags=[CacheTags.user(7)])
+    assert worker_b.get("leads:stats:42", tags=tags) == {"total": 1}
+
+    assert worker_a.invalidate_tags(CacheTags.user(42)) == {"user:42": 1}
+    _broadcast(shared, worker_a, worker_b)
+
+    assert worker_a.get("leads:stats:42", tags=tags) is None
+    assert worker_b.get("leads:stats:42", tags=tags) is None
+    assert worker_b.get("leads:stats:7", tags=[CacheTags.user(7)]) == {"total": 9}
+
+def test_tag_invalidation_without_redis():
+    manager = _manager(None)
+    manager.set("analytics:summary:1", [1, 2], tags=["user:1", "tenant:acme"])
+    manager.invalidate_tags("tenant:acme")
+    assert manager.get("analytics:summary:1", tags=["user:1", "tenant:acme"]) is None
+
+def test_clear_pattern_matches_readable_keys():
+    shared = _FakeRedis()
+    manager = _manager(shared)
+    manager.set("leads:stats:1", 1)
+    manager.set("leads:stats:2", 2)
+    manager.set("plan:features:1", 3)
+
+    manager.clear("leads:stats:*")
+
+    assert sorted(shared.store) == ["leadtap:plan:features:1"]
+    assert manager.get("leads:stats:1") is None
+    assert manager.get("plan:features:1") == 3
+
+def test_committed_lead_writes_invalidate_the_owner_tag(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache_invalidation, "cache_manager", manager)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = Users(email="owner@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    tags = [CacheTags.user(user.id)]
+    manager.set("leads:stats", {"total": 0}, tags=tags)
+
+    db.add(Leads(user_id=user.id, name="Rolled back"))
+    db.flush()
+    db.rollback()
+    assert manager.get("leads:stats", tags=tags) == {"total": 0}
+
+    db.add(Leads(user_id=user.id, name="Acme"))
+    db.commit()
+    assert manager.get("leads:stats", tags=tags) is None
+
+    user.full_name = "Renamed"  # not a plan attribute
+    manager.set("leads:stats", {"total": 1}, tags=tags)
+    db.commit()
+    assert manager.get("leads:stats", tags=tags) == {"total": 1}
+    db.close()
+
+def test_concurrent_misses_are_coalesced_into_one_recompute(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache, "cache_manager", manager)
+    calls = []
+
+    @cached(ttl=60, key_prefix="slow")
+    def slow_report():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"total": 5}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow_report())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [{"total": 5}] * 8
+    assert len(calls) == 1
+    assert manager.cache_stats["recomputes"] == 1
+    assert manager.cache_stats["coalesced"] == 7
+
+def test_stale_entry_is_served_while_a_background_refresh_runs(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache, "cache_manager", manager)
+    version = [0]
+    refreshing, release = threading.Event(), threading.Event()
+
+    @cached(ttl=1, key_prefix="report", stale=60, beta=0)
+    def report():
+        version[0] += 1
+        if version[0] > 1:
+            refreshing.set()
+            release.wait(5)
+        return version[0]
+
+    assert report() == 1
+    time.sleep(1.1)
+    assert report() == 1  # the caller that triggers the refresh isn't kept waiting either
+    assert refreshing.wait(5)
+    assert report() == 1
+    release.set()
+    deadline = time.monotonic() + 5
+    while report() != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert version[0] == 2
+    assert manager.cache_stats["background_refreshes"] == 1
+
+def test_session_bound_calls_revalidate_inline(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache, "cache_manager", manager)
+    version = [0]
+    refreshing, release = threading.Event(), threading.Event()
+    db = sessionmaker()()
+
+    @cached(ttl=1, key_prefix="report", stale=60, beta=0)
+    def report(db=None):
+        version[0] += 1
+        if version[0] > 1:
+            refreshing.set()
+            release.wait(5)
+        return version[0]
+
+    assert report(db=db) == 1
+    time.sleep(1.1)
+    refresher = threading.Thread(target=report, kwargs={"db": db})
+    refresher.start()
+    assert refreshing.wait(5)
+
+    assert report(db=db) == 1  # stale, not blocked behind the refresh
+    release.set()
+    refresher.join()
+    assert report(db=db) == 2
+    assert manager.cache_stats["stale_served"] == 1
+
+def test_async_stale_entry_is_refreshed_in_a_task(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache, "cache_manager", manager)
+    version = [0]
+
+    @async_cached(ttl=1, key_prefix="async-stale", stale=60, beta=0)
+    async def report():
+        version[0] += 1
+        await asyncio.sleep(0.05)
+        return version[0]
+
+    async def main():
+        first = await report()
+        await asyncio.sleep(1.1)
+        stale = await report()
+        await asyncio.sleep(0.2)
+        return first, stale, await report()
+
+    assert asyncio.run(main()) == (1, 1, 2)
+    assert manager.cache_stats["background_refreshes"] == 1
+
+def test_async_cached_coalesces_concurrent_callers(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache, "cache_manager", manager)
+    calls = []
+
+    @async_cached(ttl=60, key_prefix="async-report")
+    async def report():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return [1, 2, 3]
+
+    async def main():
+        return await asyncio.gather(*(report() for _ in range(5)))
+
+    assert asyncio.run(main()) == [[1, 2, 3]] * 5
+    assert len(calls) == 1
+    assert manager.cache_stats["coalesced"] == 4
+
+def test_cache_keys_ignore_injected_dependencies_and_key_users_by_id(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache, "cache_manager", manager)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    setup = Session()
+    setup.add_all([Users(email="a@example.com", hashed_password="x"), Users(email="b@example.com", hashed_password="x")])
+    setup.commit()
+    setup.close()
+    calls = []
+
+    @cached(ttl=60, key_prefix="summary")
+    def summary(days: int = 30, db=None, user=None):
+        calls.append(user.id)
+        return {"user": user.id, "days": days}
+
+    def request(email, **kwargs):
+        db = Session()  # a fresh session and user object per request, as with Depends
+        try:
+            return summary(db=db, user=db.query(Users).filter(Users.email == email).one(), **kwargs)
+        finally:
+            db.close()
+
+    assert request("a@example.com") == request("a@example.com") == {"user": 1, "days": 30}
+    assert request("a@example.com", days=30) == {"user": 1, "days": 30}
+    assert request("b@example.com") == {"user": 2, "days": 30}
+    assert calls == [1, 2]
+
+    db = Session()
+    user = db.get(Users, 1)
+    key = summary.cache_key(db=db, user=user)
+    assert key == summary.cache_key(user=user, days=30)
+    assert key.startswith("summary:u1:")
+    db.close()
+
+def test_uncacheable_arguments_bypass_the_cache(monkeypatch):
+    manager = _manager(None)
+    monkeypatch.setattr(cache, "cache_manager", manager)
+    calls = []
+
+    @cached(ttl=60)
+    def describe(thing):
+        calls.append(thing)
+        return "ok"
+
+    marker = object()
+    assert describe(marker) == describe(marker) == "ok"
+    assert len(calls) == 2
+    assert manager.cache_stats["sets"] == 0
+
+def test_codecs_round_trip_and_compress_large_values():
+    payload = {"leads": [{"id": i, "name": f"Business {i}", "score": i / 3} for i in range(200)], "total": 200}
+    for name, _, _ in SERIALIZERS.values():
+        if not _AVAILABLE[name]:
+            continue
+        codec = CacheCodec(serializer=name, compression="zlib", min_compress_bytes=1024)
+        encoded = codec.encode(payload)
+        assert encoded[:3] == bytes((1, codec.serializer_id, 1))
+        assert codec.decode(encoded) == payload
+        small = codec.encode({"total": 1})
+        assert small[2] == 0  # below the threshold: stored uncompressed
+        assert codec.decode(small) == {"total": 1}
+
+def test_codec_reads_legacy_json_and_rejects_unknown_frames():
+    codec = CacheCodec(serializer="json", compression="none")
+    assert codec.decode(b'{"total": 3}') == {"total": 3}
+    try:
+        codec.decode(bytes((1, 99, 0)) + b"{}")
+    except CodecError:
+        pass
+    else:
+        raise AssertionError("unknown serializer id should not decode")
+
+class _UnreachableAsyncRedis:
+    """redis.asyncio stand-in whose every command times out"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc_info):
+                return False
+
+            def __getattr__(self, name):
+                return lambda *args: None
+
+            async def execute(self):
+                client.calls += 1
+                raise TimeoutError("Timeout reading from socket")
+
+        return Pipeline()
+
+    async def setex(self, *args):
+        self.calls += 1
+        raise TimeoutError("Timeout reading from socket")
+
+def test_async_client_trips_breaker_and_falls_back_to_l1():
+    manager = _manager(_FakeRedis())
+    manager.async_redis = _UnreachableAsyncRedis()
+    manager.breaker.failure_threshold = 3
+    manager.breaker.reset_seconds = 0.05
+
+    async def scenario():
+        assert await manager.aset("stats", {"total": 1}) is True  # failure 1, L1 still written
+        assert await manager.aget("stats") == {"total": 1}
+        for _ in range(3):
+            assert await manager.aget("missing") is None
+        calls = manager.async_redis.calls
+        assert manager.breaker.state == "open"
+        assert await manager.aget("missing") is None
+        assert manager.async_redis.calls == calls  # failed fast, Redis not touched
+
+        await asyncio.sleep(0.06)
+        assert manager.breaker.state == "half_open"
+        await manager.aget("missing")  # single trial call fails and re-opens
+        assert manager.async_redis.calls == calls + 1
+        assert manager.breaker.state == "open"
+
+    asyncio.run(scenario())
+    assert manager.breaker.trips == 1
+    assert manager.get_stats()["circuit_breaker"]["state"] == "open"
+
+def test_listeners_receive_events_by_namespace():
+    manager = _manager(None)
+    manager.memory_cache.max_entries = 2
+    events = []
+    for kind in ("l1_hit", "miss", "set", "evict", "value_bytes", "get_seconds"):
+        manager.add_listener(kind, lambda namespace, value, kind=kind: events.append((kind, namespace, value)))
+
+    manager.set("analytics:summary:1", {"total": 1})
+    manager.get("analytics:summary:1")
+    manager.get("user:profile:1")
+    manager.set("plan:features:1", [1])
+    manager.set("search:results:abc", [])  # evicts the analytics entry
+
+    kinds = [(kind, namespace) for kind, namespace, _ in events]
+    assert ("set", "analytics") in kinds
+    assert ("l1_hit", "analytics") in kinds
+    assert ("miss", "user") in kinds
+    assert ("evict", "analytics") in kinds
+    assert [value for kind, namespace, value in events if kind == "value_bytes" and namespace == "analytics"] == [len('{"total": 1}')]
+    assert len([1 for kind, _, value in events if kind == "get_seconds" and value >= 0]) == 2
+
+def _request(path: str, if_none_match: str = None, query: str = ""):
+    from starlette.requests import Request
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": headers})
+
+def test_response_cache_serves_etag_and_304(monkeypatch):
+    from fastapi import FastAPI
+    import response_cache
+    from response_cache import cached_response
+
+    monkeypatch.setattr(response_cache, "cache_manager", _manager(None))
+    calls = []
+
+    @cached_response(ttl=60, max_age=300)
+    def criteria():
+        calls.append(1)
+        return [{"name": "rating", "weight": 0.15}]
+
+    app = FastAPI()
+    app.get("/criteria")(criteria)
+    assert app.routes[-1].dependant.request_param_name == "request"  # injected for FastAPI
+
+    first = criteria(request=_request("/criteria"))
+    etag = first.headers["etag"]
+    assert first.body == b'[{"name":"rating","weight":0.15}]'
+    assert first.headers["cache-control"] == "public, max-age=300, must-revalidate"
+
+    second = criteria(request=_request("/criteria"))
+    assert second.body == first.body and second.headers["etag"] == etag
+    assert criteria(request=_request("/criteria", f'"other", W/{etag}')).status_code == 304
+    assert criteria(request=_request("/criteria", '"other"')).status_code == 200
+    assert len(calls) == 1
+
+def test_response_cache_varies_by_tenant_and_plan(monkeypatch):
+    import response_cache
+    from response_cache import cached_response
+
+    manager = _manager(None)
+    monkeypatch.setattr(response_cache, "cache_manager", manager)
+    calls = []
+
+    @cached_response(ttl=60, vary=("tenant", "plan"))
+    async def limits(user: Users):
+        calls.append(user.email)
+        return {"plan": user.plan, "tenant": user.tenant_id}
+
+    alice = Users(id=1, email="alice@acme.com", plan="pro", tenant_id="acme")
+    bob = Users(id=2, email="bob@acme.com", plan="pro", tenant_id="acme")
+    carol = Users(id=3, email="carol@globex.com", plan="free", tenant_id="globex")
+    call = lambda user, etag=None: asyncio.run(limits(user=user, request=_request("/limits", etag)))
+
+    first = call(alice)
+    assert first.headers["cache-control"].startswith("private")
+    assert call(bob).body == first.body  # same tenant and plan share the entry
+    assert call(carol).body == b'{"plan":"free","tenant":"globex"}'
+    assert calls == ["alice@acme.com", "carol@globex.com"]
+
+    assert call(bob, first.headers["etag"]).status_code == 304
+    manager.invalidate_tags(CacheTags.tenant("acme"))
+    assert call(bob).status_code == 200
+    assert calls[-1] == "bob@acme.com"
+
+def test_warming_fills_active_users_and_counts_prevented_misses(monkeypatch):
+    import cache_warming
+    import crm
+
+    manager = _manager(None)
+    monkeypatch.setattr(cache_warming, "cache_manager", manager)
+    monkeypatch.setattr(crm, "cache_manager", manager)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    active = Users(email="active@example.com", hashed_password="x")
+    idle = Users(email="idle@example.com", hashed_password="x")
+    db.add_all([active, idle])
+    db.flush()
+    db.add_all([
+        Leads(user_id=active.id, name="Acme", status="new", source="gmaps"),
+        AuditLogs(user_id=active.id, action="login_success", target_type="auth"),
+        AuditLogs(user_id=idle.id, action="profile_updated", target_type="profile"),
+    ])
+    db.commit()
+
+    warmer = cache_warming.CacheWarmer(targets={"crm_stats": cache_warming._warm_crm_stats}, session_factory=Session)
+    manager.on_lookup = warmer.record_lookup
+    assert warmer.warm_recently_active() == 1
+    assert warmer.stats["entries_warmed"] == 1
+    assert warmer.warm_user(active.id) == 0  # already cached; the warmer's own read isn't a prevented miss
+    assert warmer.stats["prevented_misses"] == 0
+
+    stats = asyncio.run(crm.get_crm_stats(current_user=active, db=db))
+    assert stats["total_leads"] == 1 and stats["status_breakdown"] == {"new": 1}
+    assert warmer.stats["prevented_misses"] == 1
+    asyncio.run(crm.get_crm_stats(current_user=active, db=db))
+    assert warmer.stats["prevented_misses"] == 1  # only the first read counts
+    db.close()
+
+def test_crm_stats_miss_is_computed_off_the_event_loop(monkeypatch):
+    import crm
+    monkeypatch.setattr(crm, "cache_manager", _manager(None))
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = Users(email="stats@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    db.add(Leads(user_id=user.id, name="Acme", status="converted"))
+    db.commit()
+    threads = []
+    compute = crm.compute_crm_stats
+    monkeypatch.setattr(crm, "compute_crm_stats", lambda *args: threads.append(threading.get_ident()) or compute(*args))
+
+    stats = asyncio.run(crm.get_crm_stats(current_user=user, db=db))
+    assert stats["status_breakdown"] == {"converted": 1}
+    assert threads and threads[0] != threading.get_ident()
+    db.close()
+
+def test_warming_backs_off_while_the_pool_is_busy(monkeypatch):
+    import cache_warming
+
+    warmer = cache_warming.CacheWarmer(targets={})
+    busy = iter([True, True, False])
+    monkeypatch.setattr(warmer, "db_busy", lambda: next(busy))
+    monkeypatch.setattr(cache_warming.settings, "CACHE_WARM_BUSY_BACKOFF_SECONDS", 0.01)
+    throttled = []
+    warmer.add_listener("throttled", throttled.append)
+
+    assert warmer._wait_for_db()
+    assert warmer.stats["throttled"] == 2 and throttled == ["db", "db"]
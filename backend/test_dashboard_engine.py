@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for batched custom dashboard evaluation
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import timeseries
+import user_metrics
+from analytics import evaluate_dashboard
+from cache import CacheManager
+from database import Base
+from models import CustomDashboards, Jobs, Leads, Users
+
+WIDGETS = [
+    {"id": "jobs", "type": "stat", "metric": "total_jobs"},
+    {"id": "leads", "type": "stat", "metric": "total_leads"},
+    {"id": "converted", "type": "stat", "metric": "leads.converted"},
+    {"id": "conversion", "type": "stat", "metric": "conversion_rate"},
+    {"id": "job_status", "type": "breakdown", "metric": "jobs"},
+    {"id": "week_jobs", "type": "stat", "metric": "jobs_created", "days": 7},
+    {"id": "month_jobs", "type": "stat", "metric": "jobs_created", "days": 30},
+    {"id": "success", "type": "stat", "metric": "success_rate", "days": 30},
+    {"id": "lead_growth", "type": "timeseries", "metric": "leads", "days": 30},
+    {"id": "job_growth", "type": "timeseries", "metric": "jobs", "interval": "week", "days": 90},
+    {"id": "top3", "type": "top_queries", "limit": 3},
+    {"id": "top10", "type": "top_queries", "limit": 10},
+]
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(timeseries, "cache_manager", CacheManager())
+    monkeypatch.setattr(user_metrics, "cache_manager", CacheManager())
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = Users(email="dashboards@example.com", hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    return user
+
+def _seed(db, user):
+    now = datetime.now(timezone.utc)
+    for days_ago, status, query in [(1, "completed", "cafes"), (3, "completed", "cafes"), (20, "failed", "gyms"), (60, "pending", "bars")]:
+        job = Jobs(user_id=user.id, status="pending", queries=[query], created_at=now - timedelta(days=days_ago))
+        db.add(job)
+        db.commit()
+        job.status = status
+        db.commit()
+    db.add_all([Leads(user_id=user.id, name=f"Lead {i}", status=status) for i, status in enumerate(["new", "converted", "converted", "lost"])])
+    db.commit()
+
+def test_dashboard_widgets_share_queries(db, user, engine):
+    _seed(db, user)
+    dashboard = CustomDashboards(user_id=user.id, name="Overview", config={"widgets": WIDGETS})
+    db.add(dashboard)
+    db.commit()
+    dash_id, _ = dashboard.id, user.id  # reload after commit
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    result = evaluate_dashboard(dash_id=dash_id, db=db, user=user)
+
+    widgets = result["widgets"]
+    assert len(widgets) == 12 and result["sources"] == 5
+    assert widgets["jobs"]["value"] == 4 and widgets["leads"]["value"] == 4
+    assert widgets["converted"]["value"] == 2 and widgets["conversion"]["value"] == 50
+    assert widgets["job_status"]["values"]["completed"] == 2
+    assert (widgets["week_jobs"]["value"], widgets["month_jobs"]["value"]) == (2, 3)
+    assert widgets["success"]["value"] == pytest.approx(66.67)
+    assert sum(point["value"] for point in widgets["lead_growth"]["points"]) == 4
+    assert widgets["job_growth"]["interval"] == "week"
+    assert [row["query"] for row in widgets["top10"]["queries"]] == ["cafes", "gyms"]
+    assert len(widgets["top3"]["queries"]) == 2
+    # dashboard load, snapshot (2), rollup windows (1), two series (2 each), top queries (1)
+    assert len(statements) <= 9
+
+def test_invalid_widgets_report_errors(db, user):
+    other = Users(email="other@example.com", hashed_password="x", plan="business")
+    db.add(other)
+    db.commit()
+    dashboard = CustomDashboards(user_id=user.id, name="Broken", config={"widgets": [
+        {"id": "a", "type": "pie"},
+        {"id": "b", "type": "stat", "metric": "nope"},
+        {"id": "c", "type": "stat", "metric": "conversions", "days": 0},
+        {"id": "d", "type": "stat", "metric": "total_leads"},
+    ]})
+    db.add(dashboard)
+    db.commit()
+
+    widgets = evaluate_dashboard(dash_id=dashboard.id, db=db, user=user)["widgets"]
+    assert all("error" in widgets[widget_id] for widget_id in "abc")
+    assert widgets["d"] == {"type": "stat", "value": 0}
+
+    with pytest.raises(HTTPException) as denied:
+        evaluate_dashboard(dash_id=dashboard.id, db=db, user=other)
+    assert denied.value.status_code == 404
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for connection-pool telemetry and leak detection
+"""
+
+import logging
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from db_telemetry import InstrumentedQueuePool, PoolTelemetry
+from models import Users
+from system import db_pool_status
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool, pool_size=2, max_overflow=1)
+
+def test_tracks_checkouts_wait_and_hold(tmp_path):
+    engine = _engine(tmp_path)
+    telemetry = PoolTelemetry().install(engine)
+    waits, holds = [], []
+    telemetry.add_listener("wait", waits.append)
+    telemetry.add_listener("hold", holds.append)
+
+    with engine.connect() as first, engine.connect() as second:
+        first.execute(text("SELECT 1"))
+        second.execute(text("SELECT 1"))
+        status = telemetry.pool_status()
+        assert status["checked_out"] == 2
+        assert status["size"] == 2
+        assert telemetry.oldest_connection_age() >= 0
+
+    snapshot = telemetry.snapshot()
+    assert snapshot["checked_out"] == 0
+    assert snapshot["checked_in"] == 2
+    assert snapshot["checkouts"] == 2
+    assert len(waits) == 2
+    assert len(holds) == 2
+
+def test_leak_debug_reports_stack_of_long_held_connection(tmp_path, caplog):
+    engine = _engine(tmp_path)
+    telemetry = PoolTelemetry(leak_debug=True, leak_threshold_seconds=0).install(engine)
+    returned = []
+    telemetry.add_listener("long_held", returned.append)
+
+    connection = engine.connect()
+    with caplog.at_level(logging.WARNING, logger="db_telemetry"):
+        leaks = telemetry.check_leaks()
+        telemetry.check_leaks()  # already reported, not logged twice
+    assert len(leaks) == 1
+    assert "test_leak_debug_reports_stack_of_long_held_connection" in leaks[0]["stack"]
+    assert len([record for record in caplog.records if "still checked out" in record.message]) == 1
+
+    connection.close()
+    assert telemetry.long_held == 1 and len(returned) == 1
+    assert telemetry.check_leaks() == []
+
+def test_pool_status_endpoint_requires_admin():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = Users(email="pool@example.com", hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    with pytest.raises(HTTPException) as denied:
+        db_pool_status(db=db, user=user)
+    assert denied.value.status_code == 403
+    db.close()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Tests for background export jobs, range downloads and streamed lead exports
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.gzip import GZipMiddleware
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import cache_invalidation
+import export
+import export_jobs
+import user_metrics
+from auth import get_current_user
+from cache import CacheManager
+from database import Base, get_db
+from export_formats import xlsxwriter
+from export_jobs import ExportManager, file_response, lead_columns, lead_query, stream_query
+from models import AuditLogs, ExportJobs, JobResults, Jobs, LeadStatus, Leads, Users
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    manager = CacheManager()
+    for module in (export_jobs, cache_invalidation, user_metrics):
+        monkeypatch.setattr(module, "cache_manager", manager)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = Users(email="exports@example.com", hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.fixture
+def manager(session_factory, tmp_path):
+    return ExportManager(directory=str(tmp_path), session_factory=session_factory, batch_size=2)
+
+@pytest.fixture
+def client(session_factory, user, monkeypatch):
+    monkeypatch.setattr(export_jobs, "SessionLocal", session_factory)
+    app = FastAPI()
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    app.include_router(export.router)
+    app.include_router(export_jobs.router)
+
+    def get_test_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    def call(method, url, **kwargs):
+        async def send():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+                return await http.request(method, url, **kwargs)
+        return asyncio.run(send())
+    return call
+
+def _body(response):
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(collect())
+
+def test_export_runs_in_batches_and_is_reused_until_data_changes(db, user, manager):
+    db.add_all([Leads(user_id=user.id, name=f"Lead {i}", email=f"lead{i}@example.com", notes="a, \"quoted\" note") for i in range(5)])
+    db.commit()
+
+    export, reused = manager.request(db, user.id, "leads", "csv")
+    assert export.status == "pending" and not reused
+    assert manager.run_once() == 1
+    db.refresh(export)
+    assert (export.status, export.rows_total, export.rows_written) == ("completed", 5, 5)
+    with open(export.file_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["name"] for row in rows] == [f"Lead {i}" for i in range(5)]
+    assert rows[0]["notes"] == 'a, "quoted" note' and rows[0]["status"] == "new"
+
+    again, reused = manager.request(db, user.id, "leads", "csv")
+    assert reused and again.id == export.id
+    db.add(Leads(user_id=user.id, name="Lead 5"))
+    db.commit()
+    fresh, reused = manager.request(db, user.id, "leads", "csv")
+    assert not reused and fresh.id != export.id
+
+def test_ndjson_parquet_and_failures(db, user, manager):
+    job = Jobs(user_id=user.id, status="completed", queries=["cafes in Kandy"], results_count=3)
+    db.add(job)
+    db.commit()
+    db.add_all([JobResults(job_id=job.id, business_name=f"Cafe {i}", rating=4.5) for i in range(3)])
+    db.commit()
+
+    results, _ = manager.request(db, user.id, "job_results", "ndjson")
+    analytics, _ = manager.request(db, user.id, "analytics", "ndjson")
+    manager.run_once()
+    db.refresh(results)
+    db.refresh(analytics)
+    with open(results.file_path) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["business_name"] for line in lines] == ["Cafe 0", "Cafe 1", "Cafe 2"] and lines[0]["rating"] == 4.5
+    with open(analytics.file_path) as f:
+        metrics = {line["metric"]: line["value"] for line in map(json.loads, f)}
+    assert metrics["total_jobs"] == 1 and metrics["jobs.completed"] == 1 and metrics["job_results"] == 3
+
+    if xlsxwriter is None:
+        xlsx, _ = manager.request(db, user.id, "jobs", "xlsx")
+        manager.run_once()
+        db.refresh(xlsx)
+        assert xlsx.status == "failed" and "xlsxwriter" in xlsx.error
+
+    pyarrow = pytest.importorskip("pyarrow.parquet")
+    jobs, _ = manager.request(db, user.id, "jobs", "parquet")
+    manager.run_once()
+    db.refresh(jobs)
+    table = pyarrow.read_table(jobs.file_path)
+    assert table.column("results_count").to_pylist() == [3]
+    assert table.column("queries").to_pylist() == ['["cafes in Kandy"]']
+
+def test_range_downloads(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes(b"0123456789")
+
+    whole = file_response(str(path), "text/csv", "export.csv")
+    assert whole.status_code == 200 and whole.headers["accept-ranges"] == "bytes" and _body(whole) == b"0123456789"
+
+    part = file_response(str(path), "text/csv", "export.csv", "bytes=2-5")
+    assert part.status_code == 206 and part.headers["content-range"] == "bytes 2-5/10" and _body(part) == b"2345"
+    assert _body(file_response(str(path), "text/csv", "export.csv", "bytes=7-")) == b"789"
+    assert _body(file_response(str(path), "text/csv", "export.csv", "bytes=-3")) == b"789"
+
+    with pytest.raises(HTTPException) as unsatisfiable:
+        file_response(str(path), "text/csv", "export.csv", "bytes=10-")
+    assert unsatisfiable.value.status_code == 416
+    assert unsatisfiable.value.headers["Content-Range"] == "bytes */10"
+
+def test_lead_stream_filters_projects_and_gzips(db, user, session_factory):
+    other = Users(email="other@example.com", hashed_password="x")
+    db.add(other)
+    db.commit()
+    db.add_all([
+        Leads(user_id=user.id, name=f"Lead {i}", email=f"lead{i}@example.com", status="new" if i % 2 else "converted",
+              score=i * 10, created_at=datetime(2026, 1, 1 + i, tzinfo=timezone.utc))
+        for i in range(7)
+    ])
+    db.add(Leads(user_id=other.id, name="Not mine", status="new"))
+    db.commit()
+
+    stmt = lead_query(user.id, lead_columns("name, email"), statuses=[LeadStatus.NEW], min_score=20)
+    chunks = list(stream_query(stmt, "csv", session_factory=session_factory, batch_size=1))
+    assert len(chunks) > 2  # written a batch at a time
+    assert b"".join(chunks).decode().splitlines() == ["name,email", "Lead 3,lead3@example.com", "Lead 5,lead5@example.com"]
+
+    stmt = lead_query(user.id, lead_columns("id,status"), created_before=datetime(2026, 1, 3, tzinfo=timezone.utc))
+    body = gzip.decompress(b"".join(stream_query(stmt, "ndjson", compress=True, session_factory=session_factory, batch_size=1)))
+    assert [json.loads(line)["status"] for line in body.splitlines()] == ["converted", "new"]
+
+    with pytest.raises(ValueError):
+        lead_columns("name,password")
+
+    parquet = pytest.importorskip("pyarrow.parquet")
+    stmt = lead_query(user.id, lead_columns("name,score,created_at"))
+    table = parquet.read_table(io.BytesIO(b"".join(stream_query(stmt, "parquet", session_factory=session_factory, batch_size=3))))
+    assert table.num_rows == 7 and table.column("score").to_pylist()[-1] == 60
+
+def test_request_export_route(db, user, client):
+    response = client("POST", "/api/export/jobs", json={"kind": "leads", "format": "csv"})
+    assert response.status_code == 202 and response.json()["status"] == "pending"
+    assert db.query(ExportJobs).count() == 1
+    assert client("POST", "/api/export/jobs", json={"kind": "leads", "format": "csv"}).json()["reused"]
+    assert [log.action for log in db.query(AuditLogs)] == ["request_export", "request_export"]
+
+def test_download_ranges_pass_through_gzip(db, user, manager, client):
+    db.add_all([Leads(user_id=user.id, name=f"Lead {i}", email=f"lead{i}@example.com") for i in range(200)])
+    db.commit()
+    export, _ = manager.request(db, user.id, "leads", "csv")
+    manager.run_once()
+    db.refresh(export)
+    with open(export.file_path, "rb") as f:
+        content = f.read()
+
+    url = f"/api/export/jobs/{export.id}/download"
+    whole = client("GET", url, headers={"Accept-Encoding": "gzip"})
+    assert whole.headers["content-encoding"] == "identity" and whole.headers["content-length"] == str(len(content))
+    assert whole.content == content
+
+    part = client("GET", url, headers={"Accept-Encoding": "gzip", "Range": "bytes=100-2099"})
+    assert part.status_code == 206 and part.headers["content-range"] == f"bytes 100-2099/{len(content)}"
+    assert part.headers["content-length"] == "2000" and part.content == content[100:2100]
+
+def test_export_leads_route(db, user, client):
+    db.add_all([Leads(user_id=user.id, name=f"Lead {i}", email=f"lead{i}@example.com", status="converted" if i else "new") for i in range(3)])
+    db.commit()
+
+    response = client("GET", "/api/export/leads", params={"columns": "name,status", "status": "converted", "gzip": "true"})
+    assert response.status_code == 200 and response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-disposition"] == "attachment; filename=leads.csv"
+    assert response.text.splitlines() == ["name,status", "Lead 1,converted", "Lead 2,converted"]  # httpx decodes gzip
+
+    response = client("GET", "/api/export/leads", params={"format": "ndjson", "columns": "email"}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert json.loads(response.text.splitlines()[0]) == {"email": "lead0@example.com"}
+    assert client("GET", "/api/export/leads", params={"columns": "password"}).status_code == 400
+    assert [log.action for log in db.query(AuditLogs)] == ["export_leads", "export_leads"]
+
+def test_stale_running_exports_are_failed_and_not_reused(db, user, manager):
+    export, _ = manager.request(db, user.id, "leads", "csv")
+    export.status, export.started_at = "running", datetime(2026, 1, 1, tzinfo=timezone.utc)  # its worker died
+    db.commit()
+
+    again, reused = manager.request(db, user.id, "leads", "csv")
+    assert not reused and again.id != export.id
+    assert manager.run_once() == 1
+    db.refresh(export)
+    db.refresh(again)
+    assert export.status == "failed" and "worker stopped" in export.error
+    assert again.status == "completed" and again.heartbeat_at is not None
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for analytics goals and batched goal progress
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from enhanced_analytics import GoalCreate, create_goal, get_goals
+from models import Jobs, Leads, Users
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = Users(email="goals@example.com", hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    return user
+
+def _goal(goal_type, period, target):
+    return GoalCreate(name=f"{period} {goal_type}", target=target, goal_type=goal_type, period=period,
+                      deadline=datetime.now(timezone.utc) + timedelta(days=30))
+
+def test_goal_progress_is_batched(db, user, engine):
+    now = datetime.now(timezone.utc)
+    db.add_all([Leads(user_id=user.id, name=f"Lead {days}", created_at=now - timedelta(days=days, hours=1)) for days in (0, 3, 10)])
+    db.add_all([
+        Jobs(user_id=user.id, status="completed", queries=["q"], created_at=now - timedelta(hours=2)),
+        Jobs(user_id=user.id, status="failed", queries=["q"], created_at=now - timedelta(days=5)),
+        Jobs(user_id=user.id, status="completed", queries=["q"], created_at=now - timedelta(days=40)),
+    ])
+    db.commit()
+    for spec in [("leads", "daily", 2), ("leads", "weekly", 4), ("revenue", "monthly", 100), ("jobs", "weekly", 2), ("exports", "monthly", 4)]:
+        create_goal(goal_data=_goal(*spec), db=db, user=user)
+    db.refresh(user)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    goals = {goal.name: goal for goal in get_goals(db=db, user=user)}
+
+    assert goals["daily leads"].current == 1 and goals["daily leads"].progress_percentage == 50
+    assert goals["weekly leads"].current == 2
+    assert goals["monthly revenue"].current == 150 and goals["monthly revenue"].completed
+    assert goals["weekly jobs"].current == 2 and goals["weekly jobs"].completed
+    assert goals["monthly exports"].current == 1
+    assert len(statements) == 3  # goals, then one query for leads and one for jobs
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the bulk lead ingestion path
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import LeadStatus, Leads, SocialMediaLeads, Users
+from crm import LeadUpdate, update_lead
+from lead_ingest import BulkLeadIngestor, ingest_leads, ingest_social_leads
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = Users(email="ingest@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+def test_ingest_reports_per_row_outcomes(db, user):
+    leads = [
+        {"name": "Cafe One", "email": "one@example.com", "address": "1 Main St"},
+        {"name": "", "email": "two@example.com"},
+        {"name": "Cafe Three", "email": "not-an-email"},
+        {"name": "Cafe Four", "status": "QUALIFIED", "score": "7.5"},
+        {"name": "Cafe Five", "status": "bogus"},
+    ]
+
+    result = ingest_leads(db, user.id, iter(leads), chunk_size=2)
+
+    assert result["inserted"] == 2
+    assert result["invalid"] == 3
+    assert [outcome["status"] for outcome in result["outcomes"]] == ["inserted", "invalid", "invalid", "inserted", "invalid"]
+    assert result["outcomes"][1]["error"] == "name is required"
+    stored = {lead.name: lead for lead in db.query(Leads).all()}
+    assert set(stored) == {"Cafe One", "Cafe Four"}
+    assert stored["Cafe One"].enriched_data == {"address": "1 Main St"}
+    assert stored["Cafe Four"].score == 7.5
+
+def test_ingest_returns_ids_in_input_order(db, user):
+    result = BulkLeadIngestor(db, user.id, return_ids=True).ingest(
+        {"name": f"Lead {i}"} for i in range(5)
+    )
+
+    ids = [outcome["id"] for outcome in result["outcomes"]]
+    assert ids == sorted(ids)
+    assert [db.get(Leads, lead_id).name for lead_id in ids] == [f"Lead {i}" for i in range(5)]
+
+def test_ingest_social_leads_applies_defaults(db, user):
+    result = ingest_social_leads(
+        db, user.id,
+        [{"platform": "linkedin", "profile_url": "https://x/1", "followers_count": "12", "tags": ["q"]}, {"username": "nobody"}],
+        defaults={"status": "new"}
+    )
+
+    assert result["inserted"] == 1
+    lead = db.query(SocialMediaLeads).one()
+    assert (lead.followers_count, lead.status, lead.tags, lead.verified) == (12, "new", ["q"], False)
+
+def test_ingest_ignores_duplicates_on_natural_key(db, user):
+    ingest_leads(db, user.id, [{"name": "Cafe One", "email": "Owner@Example.com"}])
+
+    result = ingest_leads(db, user.id, [
+        {"name": "Cafe One again", "email": "owner@example.com"},
+        {"name": "Cafe Two", "email": "two@example.com"},
+        {"name": "Cafe Two again", "email": "TWO@example.com"},
+        {"name": "No email"},
+    ], on_conflict="ignore")
+
+    assert [outcome["status"] for outcome in result["outcomes"]] == ["duplicate", "inserted", "duplicate", "inserted"]
+    assert result["outcomes"][1]["id"] is not None
+    assert sorted(lead.name for lead in db.query(Leads).all()) == ["Cafe One", "Cafe Two", "No email"]
+
+def test_ingest_updates_social_leads_on_conflict(db, user):
+    ingest_social_leads(db, user.id, [{"platform": "linkedin", "profile_url": "https://x/1", "followers_count": 1, "status": "contacted"}])
+
+    result = ingest_social_leads(db, user.id, [
+        {"platform": "linkedin", "profile_url": "https://x/1", "followers_count": 50},
+        {"platform": "linkedin", "profile_url": "https://x/2"},
+    ], on_conflict="update")
+
+    assert [outcome["status"] for outcome in result["outcomes"]] == ["updated", "inserted"]
+    lead = db.query(SocialMediaLeads).filter(SocialMediaLeads.profile_url == "https://x/1").one()
+    db.refresh(lead)
+    assert (lead.followers_count, lead.status) == (50, "contacted")
+    assert db.query(SocialMediaLeads).count() == 2
+
+def test_changing_a_lead_email_to_a_taken_one_conflicts(db, user):
+    first, second = Leads(user_id=user.id, name="A", email="a@example.com"), Leads(user_id=user.id, name="B", email="b@example.com")
+    db.add_all([first, second])
+    db.commit()
+
+    with pytest.raises(HTTPException) as conflict:
+        asyncio.run(update_lead(lead_id=second.id, lead_data=LeadUpdate(email="A@example.com"), current_user=user, db=db))
+    assert conflict.value.status_code == 409
+    assert db.get(Leads, second.id).email == "b@example.com"
+
+def test_copy_rows_carry_model_defaults(db, user):
+    ingestor = BulkLeadIngestor(db, user.id)
+    copied = []
+    ingestor._copy_rows = lambda rows: copied.extend(rows) or True
+
+    ingestor.ingest([{"name": "No email"}, {"name": "Scored", "score": "3"}])
+
+    assert [(row["status"], row["source"], row["score"]) for row in copied] == [
+        (LeadStatus.NEW, "gmaps", 0.0), (LeadStatus.NEW, "gmaps", 3.0)
+    ]
+
+def test_malformed_json_is_kept_as_text(db, user):
+    result = ingest_leads(db, user.id, [{"name": "Broken", "enriched_data": "[foo"}, {"name": "Fine", "enriched_data": '{"a": 1}'}])
+
+    assert result["inserted"] == 2
+    stored = {lead.name: lead.enriched_data for lead in db.query(Leads).all()}
+    assert stored == {"Broken": "[foo", "Fine": {"a": 1}}
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for cached hot-path statements and permission checks
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Jobs, Leads, UserRole, Users
+from queries import count_jobs, count_leads, job_status_groups, lead_status_counts, user_by_id
+from security import check_permission
+from user_metrics import metrics_snapshot
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def _make_user(db, email="queries@example.com", **fields):
+    user = Users(email=email, hashed_password="x", **fields)
+    db.add(user)
+    db.commit()
+    return user
+
+def test_cached_counts_apply_optional_filters(db):
+    user = _make_user(db)
+    other = _make_user(db, email="other@example.com")
+    db.add_all([
+        Jobs(user_id=user.id, status="completed", queries="[]"),
+        Jobs(user_id=user.id, status="failed", queries="[]"),
+        Jobs(user_id=other.id, status="completed", queries="[]"),
+        Leads(user_id=user.id, name="A", status="converted"),
+        Leads(user_id=user.id, name="B", status="new"),
+        Leads(user_id=user.id, name="C", status="lost", created_at=datetime.now(timezone.utc) - timedelta(days=90)),
+    ])
+    db.commit()
+
+    assert user_by_id(db, user.id).email == "queries@example.com"
+    assert user_by_id(db, 999) is None
+    assert count_jobs(db, user.id) == 2
+    assert count_jobs(db, user.id, status="completed") == 1
+    assert count_leads(db, user.id) == 3
+    assert count_leads(db, user.id, status="converted") == 1
+    assert count_leads(db, user.id, statuses=["new", "converted"]) == 2
+    assert count_leads(db, user.id, since=datetime.now(timezone.utc) - timedelta(days=30)) == 2
+
+def test_status_groups_in_one_query_per_table(db):
+    user = _make_user(db)
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        Jobs(user_id=user.id, status="completed", queries="[]", results_count=30, duration_ms=2000),
+        Jobs(user_id=user.id, status="completed", queries="[]", results_count=10, duration_ms=4000),
+        Jobs(user_id=user.id, status="failed", queries="[]", results_count=99, started_at=now - timedelta(seconds=5)),
+        Jobs(user_id=user.id, status="running", queries="[]"),
+        Leads(user_id=user.id, name="A", status="converted"),
+        Leads(user_id=user.id, name="B", status="new"),
+        Leads(user_id=user.id, name="C", status="new"),
+    ])
+    db.commit()
+
+    groups = job_status_groups(db, user.id)
+    assert groups["completed"] == {"count": 2, "results": 40, "duration_ms": 6000, "timed": 2}
+    assert groups["failed"]["count"] == 1 and groups["running"]["count"] == 1
+    assert lead_status_counts(db, user.id) == {"new": 2, "converted": 1}
+    assert job_status_groups(db, 999) == {} and lead_status_counts(db, 999) == {}
+
+def test_metrics_snapshot_memoised_cached_and_invalidated(db):
+    user = _make_user(db, email="snapshot@example.com")
+    db.add_all([Jobs(user_id=user.id, status="completed", queries="[]", results_count=5), Leads(user_id=user.id, name="A", status="qualified")])
+    db.commit()
+
+    snapshot = metrics_snapshot(db, user.id)
+    assert (snapshot["total_jobs"], snapshot["jobs"]["completed"], snapshot["jobs"]["failed"]) == (1, 1, 0)
+    assert (snapshot["total_leads"], snapshot["leads"]["qualified"], snapshot["job_results"]) == (1, 1, 5)
+    assert metrics_snapshot(db, user.id) is snapshot  # memoised on the session
+
+    db.add(Jobs(user_id=user.id, status="pending", queries="[]"))
+    db.flush()
+    assert metrics_snapshot(db, user.id)["active_jobs"] == 1  # sees its own uncommitted write
+    db.commit()
+
+    other_request = sessionmaker(bind=db.get_bind())()
+    try:
+        assert metrics_snapshot(other_request, user.id)["total_jobs"] == 2  # the commit invalidated the cached one
+    finally:
+        other_request.close()
+
+def test_check_permission_uses_plan_permissions(db):
+    free = _make_user(db, email="free@example.com", plan="free")
+    business = _make_user(db, email="business@example.com", plan="business", role=UserRole.ADMIN)
+
+    assert check_permission(free, "leads", "read", db)
+    assert not check_permission(free, "leads", "write", db)
+    assert check_permission(business, "export", "write", db)
+    assert not check_permission(business, "admin", "read", db)  # users.role doesn't grant admin
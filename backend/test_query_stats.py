@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for per-query yield statistics
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import JobResults, Jobs, QueryStats, Users
+from query_stats import GLOBAL_USER_ID, backfill, estimate, normalise_query, top_queries
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def _make_user(db, email):
+    user = Users(email=email, hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    return user
+
+def _run(db, user, queries, businesses, status="completed", seconds=60):
+    job = Jobs(user_id=user.id, status="pending", queries=queries)
+    db.add(job)
+    db.commit()
+    job.status = "running"
+    job.started_at = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    db.commit()
+    db.add_all([JobResults(job_id=job.id, business_name=name, address="Main St") for name in businesses])
+    job.status = status
+    db.commit()
+    return job
+
+def _stats(db, user_id, query):
+    return db.execute(select(QueryStats).where(QueryStats.user_id == user_id, QueryStats.query_key == normalise_query(query))).scalar_one()
+
+def test_finished_jobs_update_user_and_global_stats(db):
+    alice, bob = _make_user(db, "alice@example.com"), _make_user(db, "bob@example.com")
+    _run(db, alice, ["Cafes  in Kandy"], ["Cafe A", "Cafe B"], seconds=30)
+    job = _run(db, alice, ["cafes in kandy", "hotels in galle"], ["Cafe B", "Cafe C", "Hotel D", "Hotel E"], seconds=90)
+    _run(db, bob, ["cafes in Kandy"], ["Cafe A", "Cafe Z"])
+    _run(db, alice, ["cafes in kandy"], [], status="failed")
+
+    mine = _stats(db, alice.id, "Cafes in Kandy")
+    assert (mine.runs, mine.successes) == (3, 2)
+    assert mine.results == pytest.approx(2 + 4 / 2)  # the second job's results are split over two queries
+    assert mine.new_businesses == pytest.approx(2 + 3 / 2)  # Cafe B was already found
+    assert mine.runtime_ms / mine.timed_runs == pytest.approx((30000 + 45000) / 2, rel=0.05)
+
+    everyone = _stats(db, GLOBAL_USER_ID, "cafes in kandy")
+    assert (everyone.runs, everyone.successes, everyone.results) == (4, 3, pytest.approx(6))
+    assert everyone.new_businesses == pytest.approx(2 + 3 / 2 + 1)  # only Cafe Z is new in Bob's job
+    assert everyone.query_text == "cafes in kandy"
+
+    job.results_count = 5  # later edits to a finished job don't count it again
+    db.commit()
+    assert _stats(db, alice.id, "cafes in kandy").runs == 3
+
+def test_top_queries_estimates_and_backfill(db):
+    alice, bob = _make_user(db, "alice@example.com"), _make_user(db, "bob@example.com")
+    for _ in range(3):
+        _run(db, alice, ["dentists in Colombo"], ["Dr A"])
+    _run(db, alice, ["gyms in Kandy"], ["Gym A", "Gym B"])
+    _run(db, bob, ["gyms in kandy"], ["Gym C"], status="failed")
+
+    assert [row["query"] for row in top_queries(db, alice.id)] == ["dentists in Colombo", "gyms in Kandy"]
+    assert top_queries(db, alice.id)[0]["success_rate"] == 100
+    assert [row["runs"] for row in top_queries(db)] == [3, 2]
+
+    assert estimate(db, "Dentists in colombo", alice.id)["scope"] == "user"
+    gyms = estimate(db, "gyms in kandy", alice.id)
+    assert gyms["scope"] == "global" and gyms["success_rate"] == 50 and gyms["average_results"] == 2
+    assert estimate(db, "florists", alice.id) is None
+
+    live = {(row.user_id, row.query_key): (row.runs, row.successes, row.results, row.new_businesses) for row in db.query(QueryStats)}
+    assert backfill(db) == 5
+    rebuilt = {(row.user_id, row.query_key): (row.runs, row.successes, row.results, row.new_businesses) for row in db.query(QueryStats)}
+    assert rebuilt.keys() == live.keys()
+    assert all(rebuilt[key][:3] == live[key][:3] for key in live)
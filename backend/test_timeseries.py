@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for bucketed, cached time series
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import timeseries
+from cache import CacheManager
+from database import Base
+from models import Jobs, Leads, Users
+
+NOW = datetime(2026, 3, 18, 10, 30, tzinfo=timezone.utc)  # a Wednesday
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(timeseries, "cache_manager", CacheManager())
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = Users(email="charts@example.com", hashed_password="x", plan="business")
+    db.add(user)
+    db.commit()
+    return user
+
+def _job(db, user, created_at, **values):
+    db.add(Jobs(user_id=user.id, status=values.pop("status", "pending"), queries=["q"], created_at=created_at, **values))
+    db.commit()
+
+def _seed(db, user):
+    _job(db, user, NOW - timedelta(minutes=20))
+    _job(db, user, datetime(2026, 3, 18, 8, 15, tzinfo=timezone.utc))
+    _job(db, user, datetime(2026, 3, 17, 23, 0, tzinfo=timezone.utc), status="completed",
+         completed_at=datetime(2026, 3, 18, 1, 0, tzinfo=timezone.utc), results_count=5)
+    _job(db, user, datetime(2026, 3, 2, 4, 0, tzinfo=timezone.utc), status="completed",
+         completed_at=datetime(2026, 3, 2, 5, 0, tzinfo=timezone.utc), results_count=3)
+    _job(db, user, datetime(2026, 2, 10, 12, 0, tzinfo=timezone.utc))
+    db.add(Leads(user_id=user.id, name="Lead", status="new", created_at=datetime(2026, 3, 18, 9, 0, tzinfo=timezone.utc)))
+    db.commit()
+
+def _values(result):
+    return {point["start"]: point["value"] for point in result["points"] if point["value"]}
+
+def test_buckets_by_interval(db, user):
+    _seed(db, user)
+    midnight = datetime(2026, 3, 18, tzinfo=timezone.utc)
+
+    hourly = timeseries.series(db, user.id, "jobs", "hour", midnight, now=NOW)
+    assert len(hourly["points"]) == 11 and hourly["points"][-1]["end"] == NOW.replace(minute=0) + timedelta(hours=1)
+    assert _values(hourly) == {midnight + timedelta(hours=8): 1, midnight + timedelta(hours=10): 1}
+    assert _values(timeseries.series(db, user.id, "completed_jobs", "hour", midnight, now=NOW)) == {midnight + timedelta(hours=1): 1}
+    assert _values(timeseries.series(db, user.id, "leads", "hour", midnight, now=NOW)) == {midnight + timedelta(hours=9): 1}
+
+    daily = timeseries.series(db, user.id, "jobs", "day", datetime(2026, 2, 1), now=NOW)
+    assert len(daily["points"]) == 46 and sum(point["value"] for point in daily["points"]) == 5
+    weekly = timeseries.series(db, user.id, "results", "week", datetime(2026, 2, 1), now=NOW)
+    assert weekly["points"][0]["start"] == datetime(2026, 1, 26, tzinfo=timezone.utc)
+    assert _values(weekly) == {datetime(2026, 3, 2, tzinfo=timezone.utc): 3, datetime(2026, 3, 16, tzinfo=timezone.utc): 5}
+    monthly = timeseries.series(db, user.id, "jobs", "month", datetime(2026, 1, 15), now=NOW)
+    assert [point["value"] for point in monthly["points"]] == [0, 1, 4]
+
+def test_downsampling_keeps_under_max_points(db, user):
+    _seed(db, user)
+
+    month = timeseries.series(db, user.id, "jobs", "hour", NOW - timedelta(days=30), now=NOW, max_points=200)
+    assert month["interval"] == "day" and month["requested_interval"] == "hour"
+    assert sum(point["value"] for point in month["points"]) == 4
+
+    years = timeseries.series(db, user.id, "jobs", "day", NOW - timedelta(days=730), now=NOW, max_points=50)
+    assert years["interval"] == "month" and len(years["points"]) <= 50
+    grouped = timeseries.series(db, user.id, "jobs", "month", NOW - timedelta(days=730), now=NOW, max_points=5)
+    assert grouped["buckets_per_point"] == 5 and len(grouped["points"]) == 5
+    assert sum(point["value"] for point in grouped["points"]) == 5
+
+def test_only_the_current_bucket_is_recomputed(db, user, engine):
+    _seed(db, user)
+    user_id = user.id
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    first = timeseries.series(db, user_id, "jobs", "day", datetime(2026, 2, 1), now=NOW)
+    assert len(statements) == 2  # February and March-to-yesterday in one query, then today
+    statements.clear()
+
+    # Late writes to completed buckets aren't seen; the current bucket always is
+    _job(db, user, datetime(2026, 2, 11, tzinfo=timezone.utc))
+    _job(db, user, datetime(2026, 3, 17, 12, 0, tzinfo=timezone.utc))
+    _job(db, user, NOW - timedelta(minutes=5))
+    statements.clear()
+    again = timeseries.series(db, user_id, "jobs", "day", datetime(2026, 2, 1), now=NOW)
+    assert len(statements) == 1
+    assert _values(again) == {**_values(first), datetime(2026, 3, 18, tzinfo=timezone.utc): 3}
+
+    # Once the day is over, the current month's completed days are queried again
+    tomorrow = timeseries.series(db, user_id, "jobs", "day", datetime(2026, 2, 1), now=NOW + timedelta(days=1))
+    assert _values(tomorrow)[datetime(2026, 3, 17, tzinfo=timezone.utc)] == 2
+    assert _values(tomorrow)[datetime(2026, 2, 10, tzinfo=timezone.utc)] == 1
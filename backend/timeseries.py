@@ -0,0 +1,182 @@
+"""
+Bucketed time series for LeadTap Platform
+Per-user counts (jobs, leads, completed jobs, results) in hour, day, week or month
+buckets, downsampled server side to at most max_points points. Counts are grouped by
+hour or by day in SQL and cached a block at a time (a day of hours, a month of days):
+blocks that ended before the current bucket are cached for TIMESERIES_BLOCK_TTL_SECONDS
+and never recomputed, the current block's completed buckets are cached until the next
+bucket starts, and only the current bucket is queried on every request. Week and month
+buckets are summed from days.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from cache import CacheKeys, cache_manager
+from config import settings
+from models import JobStatus, Jobs, Leads
+
+logger = logging.getLogger("timeseries")
+
+INTERVALS = ("hour", "day", "week", "month")
+
+DEFAULT_MAX_POINTS = 200
+
+# metric: (owner column, timestamp column, aggregate, filters)
+METRICS = {
+    "jobs": (Jobs.user_id, Jobs.created_at, func.count(Jobs.id), ()),
+    "leads": (Leads.user_id, Leads.created_at, func.count(Leads.id), ()),
+    "completed_jobs": (Jobs.user_id, Jobs.completed_at, func.count(Jobs.id), (Jobs.status == JobStatus.COMPLETED,)),
+    "results": (Jobs.user_id, Jobs.completed_at, func.sum(Jobs.results_count), (Jobs.status == JobStatus.COMPLETED,)),
+}
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+def floor(moment: datetime, interval: str) -> datetime:
+    """Start of the UTC bucket containing moment (weeks start on Monday)"""
+    moment = _utc(moment)
+    if interval == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+def step(moment: datetime, interval: str) -> datetime:
+    """Start of the bucket after the one starting at moment"""
+    if interval == "hour":
+        return moment + timedelta(hours=1)
+    if interval == "day":
+        return moment + timedelta(days=1)
+    if interval == "week":
+        return moment + timedelta(weeks=1)
+    return moment.replace(year=moment.year + moment.month // 12, month=moment.month % 12 + 1)
+
+def plan(start: datetime, end: datetime, interval: str, max_points: int) -> Tuple[str, int]:
+    """(interval, buckets per point) for at most max_points points: the requested interval,
+    else the finest coarser one that fits, else months summed in groups"""
+    for candidate in INTERVALS[INTERVALS.index(interval):]:
+        buckets, moment = 0, floor(start, candidate)
+        while moment < end and buckets <= max_points:
+            buckets, moment = buckets + 1, step(moment, candidate)
+        if buckets <= max_points:
+            return candidate, 1
+    start, end = _utc(start), _utc(end)
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    return "month", -(-months // max_points)
+
+# --- Base counts: hour or day buckets, cached by block ---
+
+def _truncate(column, resolution: str, dialect: str):
+    if dialect == "postgresql":
+        return func.date_trunc(resolution, column)
+    pattern = "%Y-%m-%d %H:00:00" if resolution == "hour" else "%Y-%m-%d"
+    if dialect == "mysql":
+        return func.date_format(column, pattern)
+    return func.strftime(pattern, column)
+
+def _bucket_start(value: Any) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):  # a date
+        value = datetime(value.year, value.month, value.day)
+    return _utc(value)
+
+def count_buckets(db: Session, user_id: int, metric: str, resolution: str, start: datetime, end: Optional[datetime] = None) -> Dict[datetime, int]:
+    """Uncached: {bucket start: value} for the non-empty hour or day buckets in [start, end)"""
+    owner, column, aggregate, filters = METRICS[metric]
+    bucket = _truncate(column, resolution, db.get_bind().dialect.name)
+    stmt = select(bucket, aggregate).where(owner == user_id, column >= start, *filters)
+    if end is not None:
+        stmt = stmt.where(column < end)
+    rows = db.execute(stmt.group_by(bucket)).all()
+    return {_bucket_start(moment): int(value or 0) for moment, value in rows if moment is not None}
+
+def _base_counts(db: Session, user_id: int, metric: str, resolution: str, start: datetime, end: datetime, now: datetime) -> Dict[datetime, int]:
+    block_interval = "day" if resolution == "hour" else "month"
+    current = floor(now, resolution)
+    counts: Dict[datetime, int] = {}
+    missing = []
+    block = floor(start, block_interval)
+    while block < end and block <= current:
+        block_end = step(block, block_interval)
+        # Past blocks never change; the current block's completed buckets change once per bucket
+        done = min(block_end, current)
+        if done > block:
+            key = CacheKeys.timeseries_block(user_id, metric, resolution, block.isoformat(), done.isoformat())
+            cached = cache_manager.get(key)
+            if cached is None:
+                ttl = settings.TIMESERIES_BLOCK_TTL_SECONDS if done == block_end else int((step(current, resolution) - now).total_seconds()) + 1
+                missing.append((block, done, key, ttl))
+            else:
+                counts.update({_bucket_start(moment): value for moment, value in cached.items()})
+        block = block_end
+
+    if missing:
+        fetched = count_buckets(db, user_id, metric, resolution, missing[0][0], missing[-1][1])
+        for block, done, key, ttl in missing:
+            values = {moment: value for moment, value in fetched.items() if block <= moment < done}
+            cache_manager.set(key, {moment.isoformat(): value for moment, value in values.items()}, ttl)
+            counts.update(values)
+    if end > current:
+        counts.update(count_buckets(db, user_id, metric, resolution, current))
+    return counts
+
+# --- Series ---
+
+def series(
+    db: Session,
+    user_id: int,
+    metric: str,
+    interval: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """A user's metric over the whole buckets overlapping [start, end), at most max_points points.
+
+    Defaults to the last 30 days; end is capped at now. Each point is
+    {"start", "end", "value"}, empty buckets included."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+    now = _utc(now or datetime.now(timezone.utc))
+    end = min(_utc(end), now) if end else now
+    start = _utc(start) if start else end - timedelta(days=30)
+
+    effective, group = plan(start, end, interval, max(max_points, 1))
+    first = floor(start, effective)
+    resolution = "hour" if effective == "hour" else "day"
+    totals: Dict[datetime, int] = defaultdict(int)
+    if first < end:
+        for moment, value in _base_counts(db, user_id, metric, resolution, first, end, now).items():
+            if first <= moment < end:
+                totals[floor(moment, effective)] += value
+
+    points: List[Dict[str, Any]] = []
+    moment = first
+    while moment < end:
+        point_start, value = moment, 0
+        for _ in range(group):
+            if moment >= end:
+                break
+            value += totals.get(moment, 0)
+            moment = step(moment, effective)
+        points.append({"start": point_start, "end": moment, "value": value})
+    return {
+        "metric": metric,
+        "interval": effective,
+        "requested_interval": interval,
+        "buckets_per_point": group,
+        "points": points,
+    }
@@ -0,0 +1,62 @@
+"""
+Per-user metrics snapshot for LeadTap Platform
+Every job-status and lead-status count for a user from one grouped query per table,
+shared by the export, funnel, insights and realtime endpoints. Snapshots are memoised
+on the request's session and cached for METRICS_SNAPSHOT_TTL_SECONDS under the user's
+cache tag, so committed job and lead writes invalidate them.
+"""
+
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import CacheKeys, CacheTags, cache_manager
+from cache_invalidation import pending_tags
+from config import settings
+from models import JobStatus, LeadStatus
+from queries import job_status_groups, lead_status_counts
+
+_MEMO = "metrics_snapshots"
+
+def compute_snapshot(db: Session, user_id: int) -> Dict[str, Any]:
+    """Query a user's snapshot (two grouped queries, uncached).
+
+    jobs / leads map every status to its count; job_results and average_job_duration_ms
+    cover completed jobs (the average is None until one has a duration)."""
+    groups = job_status_groups(db, user_id)
+    jobs = {status.value: 0 for status in JobStatus}
+    jobs.update({status: group["count"] for status, group in groups.items() if status is not None})
+    leads = {status.value: 0 for status in LeadStatus}
+    leads.update({status: count for status, count in lead_status_counts(db, user_id).items() if status is not None})
+    completed = groups.get(JobStatus.COMPLETED.value, {"results": 0, "duration_ms": 0, "timed": 0})
+    return {
+        "jobs": jobs,
+        "leads": leads,
+        "total_jobs": sum(group["count"] for group in groups.values()),
+        "total_leads": sum(leads.values()),
+        "active_jobs": jobs[JobStatus.PENDING.value] + jobs[JobStatus.RUNNING.value],
+        "job_results": completed["results"],
+        "average_job_duration_ms": completed["duration_ms"] / completed["timed"] if completed["timed"] else None,
+    }
+
+def metrics_snapshot(db: Session, user_id: int) -> Dict[str, Any]:
+    """A user's snapshot: memoised for the session, then cached briefly"""
+    memo = db.info.setdefault(_MEMO, {})
+    if user_id in memo:
+        return memo[user_id]
+    key, tags = CacheKeys.metrics_snapshot(user_id), [CacheTags.user(user_id)]
+    if tags[0] in pending_tags(db):
+        # Uncommitted writes: the cached snapshot doesn't see them, and must not store them
+        return compute_snapshot(db, user_id)
+    snapshot = cache_manager.get(key, tags=tags)
+    if snapshot is None:
+        snapshot = compute_snapshot(db, user_id)
+        cache_manager.set(key, snapshot, settings.METRICS_SNAPSHOT_TTL_SECONDS, tags=tags)
+    memo[user_id] = snapshot
+    return snapshot
+
+@event.listens_for(Session, "after_flush")
+def _forget_snapshots(session, flush_context):
+    # The session's own writes make its memoised snapshots stale
+    session.info.pop(_MEMO, None)
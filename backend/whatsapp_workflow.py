@@ -10,6 +10,8 @@ from database import get_db
 from auth import get_current_user
 from whatsapp_automation import whatsapp_api
 from models import Leads
+from lead_ingest import ingest_leads
+from response_cache import cached_response
 import logging
 import secrets
 import os
@@ -183,10 +185,9 @@ def trigger_workflow(
 
 async def send_whatsapp_messages(workflow_id: int):
     """Background task to send WhatsApp messages"""
+    from database import SessionLocal
+    db = SessionLocal()
     try:
-        from database import SessionLocal
-        db = SessionLocal()
-        
         workflow = db.query(WhatsAppWorkflows).filter(WhatsAppWorkflows.id == workflow_id).first()
         if not workflow:
             return
@@ -199,10 +200,10 @@ async def send_whatsapp_messages(workflow_id: int):
         for recipient in recipients:
             logger.info(f"Sending WhatsApp message to {recipient}: {message}")
         
-        db.close()
-        
     except Exception as e:
         logger.exception(f"Error sending WhatsApp messages for workflow {workflow_id}")
+    finally:
+        db.close()
 
 # WhatsApp Workflow Engine
 class WhatsAppWorkflowEngine:
@@ -378,26 +379,25 @@ class WhatsAppWorkflowEngine:
     async def add_lead_to_crm(self, lead_data: Dict, db: Session):
         """Add lead to CRM"""
         
-        # Check if lead already exists
-        existing_lead = db.query(Leads).filter(
-            Leads.email == lead_data.get("email"),
-            Leads.user_id == lead_data["user_id"]
-        ).first()
-        
-        if not existing_lead:
-            lead = Leads(
-                user_id=lead_data["user_id"],
-                name=lead_data.get("display_name", ""),
-                email=lead_data.get("email"),
-                phone=lead_data.get("phone"),
-                company=lead_data.get("business_category", ""),
-                website=lead_data.get("website"),
-                source="social_media",
-                status="new",
-                notes=f"Imported from {lead_data.get('platform', 'social media')} workflow"
-            )
-            db.add(lead)
-            db.commit()
+        # Existing leads (same user and email) are skipped by the unique index.
+        # Name is required, so fall back to the handle, profile or email when there is no display name.
+        name = next(
+            (lead_data.get(key) for key in ("display_name", "username", "profile_url", "email") if lead_data.get(key)),
+            f"{lead_data.get('platform', 'Social media')} lead"
+        )
+        result = ingest_leads(db, lead_data["user_id"], [{
+            "name": name,
+            "email": lead_data.get("email"),
+            "phone": lead_data.get("phone"),
+            "company": lead_data.get("business_category", ""),
+            "website": lead_data.get("website"),
+            "source": "social_media",
+            "status": "new",
+            "notes": f"Imported from {lead_data.get('platform', 'social media')} workflow"
+        }], on_conflict="ignore")
+        outcome = result["outcomes"][0]
+        if outcome["status"] in ("invalid", "failed"):
+            logger.warning(f"Could not add social lead {name!r} to CRM: {outcome.get('error')}")
     
     async def send_follow_up_message(self, lead_data: Dict, db: Session):
         """Send follow-up message"""
@@ -703,6 +703,7 @@ async def execute_workflow(
     summary="Get workflow templates",
     description="Get predefined WhatsApp workflow templates."
 )
+@cached_response(ttl=3600, max_age=300)
 async def get_workflow_templates(
     current_user: Users = Depends(get_current_user)
 ):
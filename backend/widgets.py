@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, Request, Path
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
@@ -114,5 +115,9 @@ async def submit_lead(request: Request, widget_id: int = Path(..., description="
         source="widget"
     )
     db.add(lead)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A lead with this email already exists")
     return {"success": True, "message": "Lead submitted!"} 
\ No newline at end of file
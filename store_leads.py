@@ -13,6 +13,21 @@ sys.path.append(os.path.join(os.getcwd(), 'backend'))
 
 from database import SessionLocal
 from models import SocialMediaLeads, LeadSources, LeadCollections
+from lead_ingest import ingest_social_leads
+
+def csv_rows(reader):
+    """Yield CSV rows as social lead dicts"""
+    for row in reader:
+        yield {
+            "platform": "linkedin",
+            "display_name": row.get("Name"),
+            "email": row.get("Email"),
+            "phone": row.get("Phone"),
+            "bio": row.get("Snippet"),
+            "profile_url": row.get("Profile Link"),
+            "tags": [row.get("Query")],
+            "notes": f"Source Query: {row.get('Query')}",
+        }
 
 def import_leads():
     csv_file = "sri_lanka_ict_students_final.csv"
@@ -54,42 +69,16 @@ def import_leads():
 
         # 3. Import Leads
         print(f"🚀 Importing leads from {csv_file}...")
-        count = 0
-        duplicates = 0
-        
         with open(csv_file, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
-            for row in reader:
-                # Check for duplicate by profile link
-                profile_url = row.get("Profile Link")
-                existing = db.query(SocialMediaLeads).filter(SocialMediaLeads.profile_url == profile_url).first()
-                if existing:
-                    duplicates += 1
-                    continue
-
-                lead = SocialMediaLeads(
-                    user_id=1,
-                    platform="linkedin",
-                    display_name=row.get("Name"),
-                    email=row.get("Email") if row.get("Email") != "N/A" else None,
-                    phone=row.get("Phone") if row.get("Phone") != "N/A" else None,
-                    bio=row.get("Snippet"),
-                    profile_url=profile_url,
-                    collection_id=collection_id if 'collection_id' in locals() else collection.id,
-                    status="new",
-                    tags=json.dumps([row.get("Query")]),
-                    notes=f"Source Query: {row.get('Query')}"
-                )
-                db.add(lead)
-                count += 1
-                
-                # Commit in batches
-                if count % 50 == 0:
-                    db.commit()
-                    print(f"  Processed {count} leads...")
+            # Duplicates are skipped by the (user_id, profile_url) unique index
+            result = ingest_social_leads(
+                db, 1, csv_rows(reader),  # Default user
+                defaults={"collection_id": collection.id, "status": "new"},
+                on_conflict="ignore"
+            )
 
-        db.commit()
-        print(f"✅ Final Result: {count} new leads imported, {duplicates} duplicates skipped.")
+        print(f"✅ Final Result: {result['inserted']} new leads imported, {result['duplicate']} duplicates skipped, {result['invalid'] + result['failed']} rejected.")
 
     except Exception as e:
         db.rollback()